@@ -1,18 +1,50 @@
 # Standard
 import io
 import sys
+import copy
+import asyncio
+import hashlib
+import inspect
+import functools
 from pathlib import Path
 from collections.abc import Callable
+from concurrent.futures import Future, Executor, CancelledError
+from concurrent.futures import wait as futures_wait
+from threading import Event, Lock
 # Third party
 import xarray as xr
 import numpy as np
 import matplotlib.pyplot as plt
 from PIL import Image
 # Own
+from siaplotlib.charts import base_chart
 from siaplotlib.charts.interfaces import ChartInterface
+from siaplotlib.charts import raw_image
+from siaplotlib.charts import encoders
 from siaplotlib.chart_building.interfaces import ChartBuilderInterface
-from siaplotlib.processing.parallelism import AsyncRunner, AsyncRunnerManager
+from siaplotlib.processing import parallelism
+from siaplotlib.processing import caching
+from siaplotlib.processing import fingerprint
+from siaplotlib.processing.caching import ChartCache
+from siaplotlib.processing.stats_index import StatsIndex
+from siaplotlib.processing.derived_fields import DerivedFieldStore
+from siaplotlib.processing import wrangling
+from siaplotlib.processing.parallelism import AsyncRunner, AsyncRunnerManager, BuildScheduler
 from siaplotlib.utils.log import LoggingFeatures, LogStream
+from siaplotlib.utils.exceptions import BuildCancelledException
+from siaplotlib.utils.progress import ProgressTracker, BuildProgress
+from siaplotlib.utils.buffers import SpillableBuffer
+
+# Builds running with coalesce=True, by build key, with the callbacks of
+# the builds attached to them.
+_in_flight_builds: dict[str, list[Callable]] = {}
+_in_flight_lock = Lock()
+# Constructor parameters that do not change the built chart.
+_KEY_EXCLUDED_PARAMS = [
+  'self', 'dataset', 'log_stream', 'verbose', 'lazy', 'scheduler',
+  'progress_callback', 'priority', 'submitter', 'cache', 'strict_fingerprint', 'stats_index',
+  'derived_fields', 'encoder']
+
 
 # TODO: Analysis if should I make clasess for a single type of graphic and have
 # a single method ".build()". It would mean that will have separated clases for static
@@ -20,27 +52,207 @@ from siaplotlib.utils.log import LoggingFeatures, LogStream
 
 
 class ChartBuilder(ChartBuilderInterface, LoggingFeatures):
+  """
+  Base class for the chart builders. Builders take the parameters of their
+  chart and pass the options below (lazy, scheduler, cache, encoder...) on
+  to this constructor as keyword arguments.
+
+  When lazy is True (the default), sync_build only prepares the data and
+  parameters of the chart, and the pyplot figure is built the first time
+  the chart is saved, plotted or its buffer requested. Set it to False to
+  build the figure inside sync_build.
+
+  Builds run on a new thread each, unless a BuildScheduler is set in
+  scheduler or as the default one (see parallelism.set_default_scheduler).
+  With a process-based scheduler, the builder is sent to the worker and
+  the built chart is adopted by this instance when it comes back. The
+  scheduler queues the build by priority ('HIGH', 'NORMAL' or 'LOW') and
+  shares the workers fairly between submitters (see BuildScheduler). If
+  the scheduler has a memory budget, the build is admitted with the
+  footprint given by estimate_memory.
+
+  A build can be cancelled with cancel(). Queued builds are dropped, and
+  running ones stop at the next call to check_cancelled (e.g. before each
+  frame of an animation), raising BuildCancelledException. Builds running
+  on a worker process can only be cancelled while queued.
+
+  Identical builds can share one run with build(coalesce=True). Builds are
+  identical when they have the same build key (see get_build_key), which
+  identifies the dataset by a sampled fingerprint of its content, or by a
+  full one if strict_fingerprint is True.
+
+  With a ChartCache in cache (or a default one, see
+  caching.set_default_cache), builds are looked up by get_cache_key before
+  running sync_build. A hit sets the chart to a raw_image.ChartImage with
+  the cached image and returns (builder, None), with no subsetting or
+  rendering; saving it in a vector format builds the figure. On a miss,
+  the chart is stored once save or get_buffer render it as PNG, it is
+  never rendered only to fill the cache. Builders whose output is not a
+  single image set CACHEABLE to False.
+
+  progress_callback receives a BuildProgress with the stage of the build
+  (e.g. 'PREPARING_DATA', 'RENDERING_FRAMES', 'ENCODING_GIF', 'DONE'),
+  the steps done out of the total, and the elapsed and estimated remaining
+  seconds. Progress is not reported from worker processes.
+
+  With a StatsIndex of the dataset in stats_index, the color limits of
+  heat maps and contours are taken from the index instead of scanning the
+  subset (see aggregation.min_max). With a DerivedFieldStore in
+  derived_fields, the speed and direction of wind roses and arrow charts are
+  memory-mapped from the store instead of computed on every build.
+
+  encoder sets the raster format and compression used by save (e.g.
+  'PNG_FAST' for previews or 'PNG_MAX' for archives, see encoders). export
+  writes several outputs (formats, sizes) from a single render.
+  """
+  CACHEABLE = True
+  # Size (inches) of the figure drawn, None for the matplotlib default.
+  FIGSIZE: tuple[float, float] = None
+
   def __init__(
     self,
     dataset: xr.DataArray,
     log_stream = sys.stderr,
-    verbose: bool = False
+    verbose: bool = False,
+    lazy: bool = True,
+    scheduler: BuildScheduler = None,
+    progress_callback: Callable[[BuildProgress], None] = None,
+    priority: str = 'NORMAL',
+    submitter: str = None,
+    cache: ChartCache = None,
+    strict_fingerprint: bool = False,
+    stats_index: StatsIndex = None,
+    derived_fields: DerivedFieldStore = None,
+    encoder: str | encoders.RasterEncoder = None
   ) -> None:
     # Super class constructors.
     LoggingFeatures.__init__(self, log_stream=log_stream, verbose=verbose)
     # Own attributes.
     self._chart: ChartInterface = None
     self.dataset = dataset
+    self.lazy = lazy
+    self.scheduler = scheduler
+    self.priority = priority
+    self.submitter = submitter
+    self.cache = cache
+    self.strict_fingerprint = strict_fingerprint
+    self.stats_index = stats_index
+    self.derived_fields = derived_fields
+    self.encoder = encoder
+    self._cancel_event = Event()
+    self._build_future: Future = None
+    self._coalesce_key: str = None
+    # PNG of the figure, rendered once and shared (see _get_rendered_png).
+    self._rendered_png: bytes = None
+    # Whether the chart is an image standing for the figure of this builder
+    # (shared by a coalesced build), so vector outputs need to build it.
+    self._chart_is_image = False
+    # Key under which the chart is cached once rendered (see _fill_cache).
+    self._pending_cache_key: str = None
+    self.progress = ProgressTracker(callback=progress_callback)
     # Async processes
     self.async_runner_manager = AsyncRunnerManager()
-    self.async_runner_manager.add_runner('build', AsyncRunner(sync_fn=self.sync_build))
+    self.async_runner_manager.add_runner('build', AsyncRunner(sync_fn=self.cached_sync_build))
 
 
   def save(
     self,
-    filepath: str | Path
+    filepath: str | Path,
+    encoder: str | encoders.RasterEncoder = None
   ) -> None:
+    """
+    Save the chart, with encoder or else the encoder of the builder (see
+    encoders.ENCODERS) for raster outputs. If the chart is an image shared
+    by another build, the figure is built for vector outputs.
+    """
+    encoder = encoder if encoder is not None else self.encoder
+    is_vector = base_chart.is_vector_path(filepath)
+    if self._chart_is_image and is_vector:
+      self.log('Building the figure for a vector output.')
+      self.sync_build()
+      self._chart_is_image = False
+    if encoders.get_encoder(encoder) is not None or is_vector:
+      self._chart.save(filepath, encoder=encoder)
+      return
+    if isinstance(self._chart, base_chart.Chart) and base_chart.get_output_format(filepath) == 'png':
+      # The same image as get_buffer, rendered once.
+      Path(filepath).write_bytes(self._get_rendered_png())
+      self.log(f'Image saved in: {filepath}')
+      self._fill_cache()
+      return
     self._chart.save(filepath)
+    if not isinstance(self._chart, base_chart.Chart):
+      # Written as it is.
+      self._fill_cache()
+
+
+  def get_buffer(
+    self,
+    encoder: str | encoders.RasterEncoder = None
+  ) -> io.BytesIO:
+    """
+    Get the chart as an image, with encoder or else the encoder of the
+    builder, PNG by default.
+    """
+    encoder = encoder if encoder is not None else self.encoder
+    if encoders.get_encoder(encoder) is not None:
+      return self._chart.get_buffer(encoder=encoder)
+    if isinstance(self._chart, base_chart.Chart):
+      img_buff = io.BytesIO(self._get_rendered_png())
+    else:
+      img_buff = self._chart.get_buffer()
+    self._fill_cache()
+    return img_buff
+
+
+  def _fill_cache(self) -> None:
+    """
+    Puts the chart in the cache if the build missed it. Called once the
+    figure has been rendered as PNG, or for charts that are images already.
+    """
+    if self._pending_cache_key is None:
+      return
+    cache = self.cache or caching.get_default_cache()
+    if cache is not None:
+      if isinstance(self._chart, base_chart.Chart):
+        img_bytes = self._get_rendered_png()
+      else:
+        img_bytes = self._chart.get_buffer().getvalue()
+      cache.put(self._pending_cache_key, img_bytes)
+    self._pending_cache_key = None
+
+
+  def _get_rendered_png(self) -> bytes:
+    """
+    Get the PNG of the figure, as get_buffer gives it. It is rendered once
+    and kept, so saving it again does not render the figure again.
+    """
+    if self._rendered_png is None:
+      self._rendered_png = self._chart.get_buffer().getvalue()
+    return self._rendered_png
+
+
+  def _set_image_chart(self, img_source) -> None:
+    """
+    Sets the chart to an image that stands for the figure of this builder.
+    """
+    self.close()
+    self._chart = raw_image.ChartImage(
+      img_source=img_source,
+      var_name=getattr(self, 'var_name', ''),
+      title=getattr(self, 'title', ''),
+      var_label=getattr(self, 'var_label', None),
+      log_stream=self.log_stream,
+      verbose=self.verbose)
+    self._chart_is_image = True
+
+
+  def export(self, outputs: list[dict]) -> list[io.BytesIO]:
+    """
+    Render the chart once and encode it into several outputs (see
+    Chart.export and encoders.encode_many).
+    """
+    return self._chart.export(outputs)
 
 
   def _make_gif(
@@ -48,7 +260,11 @@ class ChartBuilder(ChartBuilderInterface, LoggingFeatures):
     charts: list,
     duration: float = 0.5,
     duration_unit: str = 'SECONDS_PER_FRAME'
-  ) -> io.BytesIO:
+  ) -> SpillableBuffer:
+    """
+    Encode the charts as the frames of a GIF. Long animations are spilled
+    to a temporary file instead of kept in memory (see SpillableBuffer).
+    """
     self.log('Making gif.')
     
     frame_duration = None
@@ -59,42 +275,430 @@ class ChartBuilder(ChartBuilderInterface, LoggingFeatures):
     else:
       raise RuntimeError(f'Unit "{duration_unit}" is not supported.')
     
-    img_buff = io.BytesIO()
-    frames = [Image.open(chart.get_buffer()) for chart in charts]
-    frame_one = frames.pop(0)
-    frames.append(frames[-1]) # Duplicate last frame to simulate a small stop at the end.
-    # Image docs: https://pillow.readthedocs.io/en/stable/reference/Image.html#PIL.Image.Image.save
-    # GIF docs: https://pillow.readthedocs.io/en/stable/handbook/image-file-formats.html#gif
-    # Durations is defined in milliseconds.
-    frame_one.save(
-      img_buff, format='GIF', append_images=frames,
-      save_all=True, duration=frame_duration, loop=0)
-    # Closes all file and destroys the core images object.
-    frame_one.close()
-    for frame in frames:
+    img_buff = SpillableBuffer()
+    frames = []
+    try:
+      self.progress.start_stage('RENDERING_FRAMES', total=len(charts))
+      for chart in charts:
+        self.check_cancelled()
+        frames.append(Image.open(chart.get_buffer()))
+        # The frame is already rendered, free its figure.
+        chart.close()
+        self.progress.advance()
+      self.check_cancelled()
+      self.progress.start_stage('ENCODING_GIF')
+      frame_one = frames.pop(0)
+      frames.append(frames[-1]) # Duplicate last frame to simulate a small stop at the end.
+      # Image docs: https://pillow.readthedocs.io/en/stable/reference/Image.html#PIL.Image.Image.save
+      # GIF docs: https://pillow.readthedocs.io/en/stable/handbook/image-file-formats.html#gif
+      # Durations is defined in milliseconds.
+      frame_one.save(
+        img_buff, format='GIF', append_images=frames,
+        save_all=True, duration=frame_duration, loop=0)
+      frames.append(frame_one)
+    finally:
+      # Closes all file and destroys the core images object.
+      for frame in frames:
         frame.close()
     self.log('Gif created.')
     return img_buff
   
 
+  def get_dataset_fingerprint(self) -> str | None:
+    """
+    Get the fingerprint of the dataset (see fingerprint.fingerprint_dataset),
+    hashing all its values if strict_fingerprint is True.
+    """
+    return fingerprint.fingerprint_dataset(self.dataset, strict=self.strict_fingerprint)
+
+
+  def get_build_key(self) -> str | None:
+    """
+    Get a key that identifies the chart this builder makes: the dataset
+    fingerprint, the builder class and the values of all its constructor
+    parameters (dim_constraints included). Returns None if a parameter has
+    no canonical form, so the build is never shared.
+    """
+    dataset_fingerprint = self.get_dataset_fingerprint()
+    if dataset_fingerprint is None:
+      # Unknown dataset types are only identical to themselves.
+      return self._make_key(dataset_identity=('id', id(self.dataset)))
+    return self._make_key(dataset_identity=dataset_fingerprint)
+
+
+  def get_cache_key(self) -> str | None:
+    """
+    Like get_build_key, but None for datasets without a fingerprint, since
+    cached charts outlive the dataset objects.
+    """
+    dataset_fingerprint = self.get_dataset_fingerprint()
+    if dataset_fingerprint is None:
+      return None
+    return self._make_key(dataset_identity=dataset_fingerprint)
+
+
+  def _make_key(self, dataset_identity) -> str | None:
+    params = inspect.signature(type(self).__init__).parameters
+    try:
+      values = tuple(
+        (name, fingerprint.canonicalize(getattr(self, name)))
+        for name, param in params.items()
+        if name not in _KEY_EXCLUDED_PARAMS and param.kind is not param.VAR_KEYWORD)
+    except (TypeError, AttributeError):
+      return None
+    key_source = repr((
+      dataset_identity,
+      type(self).__module__,
+      type(self).__qualname__,
+      values))
+    return hashlib.sha256(key_source.encode()).hexdigest()
+
+
+  def cached_sync_build(self):
+    """
+    Runs sync_build behind the chart cache, if there is one.
+    """
+    self._rendered_png = None
+    self._chart_is_image = False
+    self._pending_cache_key = None
+    cache = self.cache or caching.get_default_cache()
+    cache_key = None
+    if cache is not None and self.CACHEABLE:
+      cache_key = self.get_cache_key()
+    if cache_key is None:
+      return self.sync_build()
+    img_bytes = cache.get(cache_key)
+    if img_bytes is not None:
+      self.log('Chart found in cache.')
+      self._set_image_chart(io.BytesIO(img_bytes))
+      return self, None
+    result = self.sync_build()
+    # Stored when first rendered, see _fill_cache.
+    self._pending_cache_key = cache_key
+    return result
+
+
+  def count_frames(self, subset_sizes: dict[str, int]) -> int:
+    """
+    Get the number of images rendered for a subset with the given dimension
+    lengths. Animated builders override it.
+    """
+    return 1
+
+
+  def estimate_memory(self) -> int:
+    """
+    Estimate the peak memory of the build in bytes: the subset, given by the
+    dim_constraints and var_name of the builder, plus the figure being drawn
+    and a decoded image (RGBA at DEFAULT_DPI) per frame. It only reads the
+    coordinates of the dataset.
+    """
+    subset_bytes = 0
+    subset_sizes = {}
+    if isinstance(self.dataset, (xr.Dataset, xr.DataArray)):
+      dim_constraints = getattr(self, 'dim_constraints', None) or {}
+      var_name = getattr(self, 'var_name', None)
+      subset_sizes = wrangling.get_subset_sizes(
+        dataset=self.dataset,
+        dim_constraints=dim_constraints,
+        var=var_name)
+      subset_bytes = wrangling.estimate_subset_nbytes(
+        dataset=self.dataset,
+        dim_constraints=dim_constraints,
+        var=var_name)
+    elif self.dataset is not None:
+      subset_bytes = getattr(self.dataset, 'nbytes', 0)
+    image_bytes = self.estimate_image_bytes()
+    num_frames = self.count_frames(subset_sizes)
+    return subset_bytes + image_bytes + num_frames * image_bytes
+
+
+  def estimate_image_bytes(self) -> int:
+    """
+    Estimate the bytes of a decoded image of the chart: RGBA at DEFAULT_DPI
+    with the FIGSIZE of the builder. Builders that draw other images
+    override it.
+    """
+    fig_width, fig_height = self.FIGSIZE or plt.rcParams['figure.figsize']
+    return int(fig_width * fig_height * base_chart.DEFAULT_DPI ** 2 * 4)
+
+
+  def _get_memory_estimate(self, scheduler) -> int:
+    # Estimated only when the scheduler enforces a budget.
+    if isinstance(scheduler, BuildScheduler) and scheduler.memory_budget is not None:
+      return self.estimate_memory()
+    return 0
+
+
   def build(
     self,
-    success_callback: Callable[[], None],
-    failure_callback: Callable[[Exception], None]
-  ):
+    success_callback: Callable[..., None] = None,
+    failure_callback: Callable[[Exception], None] = None,
+    coalesce: bool = False
+  ) -> Future:
+    """
+    Runs sync_build asynchronously. The callbacks are optional. Returns a
+    Future that resolves to the values returned by sync_build, usually
+    (builder, subset), once the success callback has been called. It can be
+    combined with concurrent.futures.wait or as_completed. Builds served by
+    the chart cache make no subset, and give (builder, None) to the success
+    callback and the Future.
+
+    With coalesce=True, if an identical build is already running this one
+    attaches to it: no work is done and, when it ends, this builder gets
+    the same subset, or the same exception, and its chart rendered once as
+    an image (see save for vector outputs). If the running build is
+    cancelled, the attached ones run on their own.
+    """
     # Links about whis statement:
     # 1: https://stackoverflow.com/questions/49921721/runtimeerror-main-thread-is-not-in-main-loop-with-matplotlib-and-flask
     # 2: https://stackoverflow.com/questions/14694408/runtimeerror-main-thread-is-not-in-main-loop
     # 3: https://stackoverflow.com/questions/10556479/running-a-tkinter-form-in-a-separate-thread/10556698#10556698
     # 4: https://stackoverflow.com/questions/27147300/matplotlib-tcl-asyncdelete-async-handler-deleted-by-the-wrong-thread
     plt.switch_backend('agg')
+    self._cancel_event.clear()
+    self.progress.reset()
+    build_future = Future()
+    build_future.set_running_or_notify_cancel()
+    self._build_future = build_future
+    self._submit_build(build_future, success_callback, failure_callback, coalesce)
+    return build_future
+
+
+  def _submit_build(
+    self,
+    build_future: Future,
+    success_callback: Callable[..., None],
+    failure_callback: Callable[[Exception], None],
+    coalesce: bool
+  ) -> None:
+    """
+    Runs the build, or attaches it to an identical one in progress.
+    """
+    build_key = self.get_build_key() if coalesce else None
+    if build_key is not None:
+      with _in_flight_lock:
+        followers = _in_flight_builds.get(build_key)
+        if followers is not None:
+          followers.append(functools.partial(
+            self._on_leader_done, build_future, success_callback, failure_callback))
+        else:
+          _in_flight_builds[build_key] = []
+      if followers is not None:
+        self.log('Attaching to an identical build in progress.')
+        return
+      self._coalesce_key = build_key
     runner = self.async_runner_manager.get_runner('build')
-    runner.success_callback = success_callback
-    runner.failure_callback = failure_callback
-    runner.run()
+    runner.scheduler = self.scheduler or parallelism.get_default_scheduler()
+    runner.priority = self.priority
+    runner.submitter = self.submitter
+    runner.memory_estimate = self._get_memory_estimate(runner.scheduler)
+    runner.success_callback = functools.partial(self._on_build_success, build_future, success_callback)
+    runner.failure_callback = functools.partial(self._on_build_failure, build_future, failure_callback)
+    try:
+      runner.run()
+    except BaseException as e:
+      self._release_followers(err=e)
+      raise
+
+
+  async def build_async(
+    self,
+    executor: Executor | BuildScheduler = None,
+    timeout: float = None
+  ) -> tuple:
+    """
+    Runs sync_build on an executor without blocking the event loop and
+    returns its values, usually (builder, subset). The executor can be a
+    concurrent.futures.Executor or a BuildScheduler. By default the builder
+    scheduler, the default scheduler or the event loop executor are used.
+
+    Raises asyncio.TimeoutError after timeout seconds. If the task is
+    cancelled or times out, the build is cancelled as with cancel().
+    """
+    plt.switch_backend('agg')
+    self._cancel_event.clear()
+    self.progress.reset()
+    if executor is None:
+      executor = self.scheduler or parallelism.get_default_scheduler()
+    if isinstance(executor, BuildScheduler):
+      task_future = asyncio.wrap_future(executor.submit(
+        self.cached_sync_build,
+        priority=self.priority,
+        submitter=self.submitter,
+        memory_estimate=self._get_memory_estimate(executor)))
+    else:
+      task_future = asyncio.get_running_loop().run_in_executor(executor, self.cached_sync_build)
+    try:
+      result = await asyncio.wait_for(task_future, timeout=timeout)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+      # Stops the build if it is already running.
+      self._cancel_event.set()
+      raise
+    result = self._adopt_result(result)
+    self.progress.start_stage('DONE')
+    return result
+
+
+  def _adopt_result(self, result) -> tuple:
+    """
+    Casts the values returned by sync_build to a tuple. If they come from a
+    copy of this builder (built on a worker process), the chart of the copy
+    is moved to this instance, which replaces the copy in the result.
+    """
+    if result is None:
+      return tuple()
+    if type(result) is not tuple:
+      result = tuple([result])
+    if len(result) > 0 and isinstance(result[0], ChartBuilder) and result[0] is not self:
+      self._adopt_charts(result[0])
+      result = (self,) + result[1:]
+    return result
+
+
+  def _adopt_charts(self, worker_copy: 'ChartBuilder') -> None:
+    """
+    Moves the built chart of a worker copy to this instance. Builders that
+    keep more charts extend it.
+    """
+    self._chart = worker_copy._chart
+    self._chart_is_image = worker_copy._chart_is_image
+    self._pending_cache_key = worker_copy._pending_cache_key
+    worker_copy._chart = None
+
+
+  def _release_followers(self, result: tuple = None, err: BaseException = None) -> None:
+    """
+    Passes the outcome of a coalesced build to the builds attached to it,
+    before the callbacks of this one can close the chart.
+    """
+    if self._coalesce_key is None:
+      return
+    with _in_flight_lock:
+      followers = _in_flight_builds.pop(self._coalesce_key, [])
+    self._coalesce_key = None
+    for on_leader_done in followers:
+      on_leader_done(result, err)
+
+
+  def _on_leader_done(
+    self,
+    build_future: Future,
+    success_callback: Callable[..., None],
+    failure_callback: Callable[[Exception], None],
+    result: tuple,
+    err: BaseException
+  ) -> None:
+    """
+    Takes the outcome of the build this one was attached to. If that build
+    was cancelled, this one runs on its own (attached again to any other
+    identical build), unless it was cancelled as well.
+    """
+    leader_cancelled = isinstance(err, (BuildCancelledException, CancelledError))
+    if leader_cancelled and not self.is_cancelled():
+      self.log('The identical build was cancelled, building.')
+      try:
+        self._submit_build(build_future, success_callback, failure_callback, coalesce=True)
+      except BaseException as e:
+        self._on_build_failure(build_future, failure_callback, e)
+      return
+    if err is not None:
+      self._on_build_failure(build_future, failure_callback, err)
+      return
+    if len(result) > 0 and isinstance(result[0], ChartBuilder):
+      try:
+        self._share_chart(result[0])
+      except BaseException as e:
+        self._on_build_failure(build_future, failure_callback, e)
+        return
+      result = (self,) + result[1:]
+    self._on_build_success(build_future, success_callback, *result)
+
+
+  def _share_chart(self, leader: 'ChartBuilder') -> None:
+    """
+    Takes the chart of the build this one was attached to. Figures are
+    rendered once by the leader and shared as an image, never the figure
+    itself. Images are shared as they are.
+    """
+    if isinstance(leader._chart, base_chart.Chart):
+      rendered_png = leader._get_rendered_png()
+      leader._fill_cache()
+      self._set_image_chart(io.BytesIO(rendered_png))
+      self._rendered_png = rendered_png
+    else:
+      self.close()
+      self._chart = copy.copy(leader._chart)
+
+
+  def _on_build_success(
+    self,
+    build_future: Future,
+    success_callback: Callable[..., None],
+    *result
+  ):
+    result = self._adopt_result(result)
+    self._release_followers(result=result)
+    self.progress.start_stage('DONE')
+    if success_callback is not None:
+      success_callback(*result)
+    build_future.set_result(result)
+
+
+  def _on_build_failure(
+    self,
+    build_future: Future,
+    failure_callback: Callable[[Exception], None],
+    err: BaseException
+  ):
+    self._release_followers(err=err)
+    try:
+      if failure_callback is not None:
+        failure_callback(err)
+    finally:
+      if not build_future.done():
+        build_future.set_exception(err)
   
 
+  def set_progress_callback(
+    self,
+    callback: Callable[[BuildProgress], None],
+    min_interval: float = 0
+  ) -> None:
+    """
+    Sets the progress callback. min_interval (seconds) limits how often
+    the progress of the steps of a stage is reported.
+    """
+    self.progress.callback = callback
+    self.progress.min_interval = min_interval
+
+
+  def cancel(self) -> None:
+    """
+    Requests the cancellation of the build in progress.
+    """
+    self.log('Cancelling build.')
+    self._cancel_event.set()
+    self.async_runner_manager.get_runner('build').cancel()
+
+
+  def is_cancelled(self) -> bool:
+    return self._cancel_event.is_set()
+
+
+  def check_cancelled(self) -> None:
+    """
+    Raises BuildCancelledException if the build has been cancelled. Builders
+    call it at the points where it is safe to stop.
+    """
+    if self._cancel_event.is_set():
+      raise BuildCancelledException(messages=f'{self.__class__.__name__}: Build cancelled.')
+
+
   def close(self):
+    self._rendered_png = None
+    self._chart_is_image = False
+    self._pending_cache_key = None
     if self._chart is not None:
       self.log('Closing builder.')
       self._chart.close()
@@ -102,13 +706,37 @@ class ChartBuilder(ChartBuilderInterface, LoggingFeatures):
   
 
   def wait(self, seconds: float = None):
-    self.async_runner_manager.get_runner('build').wait(seconds=seconds)
+    if self._build_future is not None:
+      futures_wait([self._build_future], timeout=seconds)
+    else:
+      self.async_runner_manager.get_runner('build').wait(seconds=seconds)
   
 
   def still_working(self):
     return self.async_runner_manager.get_runner('build').still_working()
   
 
+  def __getstate__(self):
+    # The runners and the scheduler stay in the process that owns the builder.
+    state = LoggingFeatures.__getstate__(self)
+    del state['async_runner_manager']
+    del state['_cancel_event']
+    state['_build_future'] = None
+    # Neither the lock of the tracker nor the callback can be sent to a worker process.
+    state['progress'] = None
+    state['scheduler'] = None
+    return state
+
+
+  def __setstate__(self, state):
+    LoggingFeatures.__setstate__(self, state)
+    self._cancel_event = Event()
+    if self.progress is None:
+      self.progress = ProgressTracker()
+    self.async_runner_manager = AsyncRunnerManager()
+    self.async_runner_manager.add_runner('build', AsyncRunner(sync_fn=self.cached_sync_build))
+
+
   def __del__(self):
     self.log('Free builder.')
     self.close()
@@ -0,0 +1,246 @@
+# Standard
+import sys
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+# Third party
+import xarray as xr
+# Own
+from siaplotlib.charts import basemap
+from siaplotlib.charts import level_chart
+from siaplotlib.charts import raw_image
+from siaplotlib.charts import encoders
+from siaplotlib.processing import wrangling
+from siaplotlib.processing import aggregation
+from siaplotlib.chart_building.base_builder import ChartBuilder
+
+
+class BatchHeatMapBuilder(ChartBuilder):
+  """
+  Build many heat maps from one dataset. Each spec is a dict with:
+    name: key of the chart and name of its file when saved.
+    var_name: variable to plot.
+    dim_constraints: optional constraints applied over the shared subset
+      (e.g. {'depth': 5.0}). Latitude and longitude cannot be constrained.
+    title, var_label, color_palette: optional, as in StaticHeatMapBuilder.
+
+  The plan is made once for the batch: a single subset with all the
+  variables and the batch dim_constraints is loaded in memory, the min/max
+  of every chart come from one reduction per variable, and all the charts
+  share the coordinate arrays and the basemap caches. The charts are then
+  rendered in parallel on max_workers threads and kept as images encoded
+  with the encoder of the builder (PNG by default). Saving the builder
+  writes them in a directory.
+  """
+  # The output is not a single image.
+  CACHEABLE = False
+
+  def __init__(
+    self,
+    dataset: xr.Dataset,
+    lat_dim_name: str,
+    lon_dim_name: str,
+    specs: list[dict],
+    dim_constraints: dict = {},
+    max_workers: int = 4,
+    rasterize_data: bool = True,
+    log_stream = sys.stderr,
+    verbose: bool = False,
+    **kwargs
+  ) -> None:
+    super().__init__(
+      dataset=dataset,
+      log_stream=log_stream,
+      verbose=verbose,
+      **kwargs)
+    self.lat_dim_name = lat_dim_name
+    self.lon_dim_name = lon_dim_name
+    self.specs = specs
+    self.dim_constraints = dim_constraints
+    self.max_workers = max_workers
+    self.rasterize_data = rasterize_data
+    self.charts: dict[str, raw_image.ChartImage] = {}
+    self.validate_specs()
+
+
+  def count_frames(self, subset_sizes: dict[str, int]) -> int:
+    return len(self.specs)
+
+
+  def validate_specs(self) -> None:
+    names = set()
+    for spec in self.specs:
+      if 'name' not in spec or 'var_name' not in spec:
+        raise RuntimeError('Every spec must have a "name" and a "var_name".')
+      if spec['name'] in names:
+        raise RuntimeError(f'Spec name "{spec["name"]}" is repeated.')
+      names.add(spec['name'])
+      spec_dims = spec.get('dim_constraints', {}).keys()
+      if self.lat_dim_name in spec_dims or self.lon_dim_name in spec_dims:
+        raise RuntimeError(f'Spec "{spec["name"]}" cannot constrain latitude or longitude, they are shared by the batch.')
+
+
+  def _make_shared_subset(self) -> xr.Dataset:
+    var_names = list(dict.fromkeys([spec['var_name'] for spec in self.specs]))
+    if self.dim_constraints:
+      subset = wrangling.slice_dice(
+        dataset=self.dataset,
+        dim_constraints=self.dim_constraints,
+        var=var_names)
+    else:
+      subset = self.dataset[var_names]
+    # Read once from the source, every chart takes its data from memory.
+    return subset.load()
+
+
+  def _get_limits(self, shared_subset: xr.Dataset) -> dict[str, tuple[float, float]]:
+    """
+    Computes (vmin, vmax) of each spec. The variables are reduced over the
+    map once, so a spec only selects among the reduced values.
+    """
+    map_dims = [self.lat_dim_name, self.lon_dim_name]
+    reduced = {}
+    for var_name in dict.fromkeys([spec['var_name'] for spec in self.specs]):
+      reduced[var_name] = (
+        shared_subset[var_name].min(dim=map_dims),
+        shared_subset[var_name].max(dim=map_dims))
+    limits = {}
+    for spec in self.specs:
+      var_min, var_max = reduced[spec['var_name']]
+      spec_constraints = spec.get('dim_constraints', {})
+      if spec_constraints:
+        var_min = wrangling.slice_dice(dataset=var_min, dim_constraints=spec_constraints)
+        var_max = wrangling.slice_dice(dataset=var_max, dim_constraints=spec_constraints)
+      limits[spec['name']] = (
+        aggregation.min(dataset=var_min, rounding_precision=3),
+        aggregation.max(dataset=var_max, rounding_precision=3))
+    return limits
+
+
+  def _render(self, spec: dict, chart: level_chart.HeatMap) -> raw_image.ChartImage:
+    try:
+      self.check_cancelled()
+      img_buff = chart.get_buffer(encoder=self.encoder)
+    finally:
+      chart.close()
+    self.progress.advance()
+    self.log(f'Chart "{spec["name"]}" rendered.')
+    return raw_image.ChartImage(
+      img_source=img_buff,
+      var_name=spec['var_name'],
+      title=chart.title,
+      lon_interval=chart.lon_interval,
+      lat_interval=chart.lat_interval,
+      var_label=chart.data_label,
+      log_stream=self.log_stream,
+      verbose=self.verbose)
+
+
+  def sync_build(self):
+    self.close()
+    self.progress.start_stage('PREPARING_DATA')
+    shared_subset = self._make_shared_subset()
+    limits = self._get_limits(shared_subset)
+    lon_data, lat_data, lon_interval, lat_interval = wrangling.get_coords(
+      dataset=shared_subset,
+      lon_dim_name=self.lon_dim_name,
+      lat_dim_name=self.lat_dim_name)
+
+    chart_list = []
+    for spec in self.specs:
+      spec_constraints = spec.get('dim_constraints', {})
+      if spec_constraints:
+        data = wrangling.slice_dice(
+          dataset=shared_subset,
+          dim_constraints=spec_constraints,
+          var=spec['var_name'])
+      else:
+        data = shared_subset[spec['var_name']]
+      # Every dimension but the map ones must be reduced to one frame.
+      other_dims = [dim for dim in data.dims if dim not in [self.lat_dim_name, self.lon_dim_name]]
+      unconstrained_dims = [dim for dim in other_dims if data.sizes[dim] > 1]
+      if unconstrained_dims:
+        raise RuntimeError(
+          f'Spec "{spec["name"]}" must constrain the dimensions {unconstrained_dims} to a single value.')
+      data = data.squeeze(other_dims, drop=True).transpose(self.lat_dim_name, self.lon_dim_name)
+      vmin, vmax = limits[spec['name']]
+      chart_list.append(level_chart.HeatMap(
+        data=data.data,
+        data_label=spec.get('var_label'),
+        title=spec.get('title', spec['name']),
+        lon_interval=lon_interval,
+        lat_interval=lat_interval,
+        lat_data=lat_data,
+        lon_data=lon_data,
+        vmax=vmax,
+        vmin=vmin,
+        color_palette=spec.get('color_palette'),
+        rasterize_data=self.rasterize_data,
+        build_on_create=False,
+        log_stream=self.log_stream,
+        verbose=self.verbose))
+
+    basemap.prime_feature_caches(
+      lon_interval=lon_interval,
+      lat_interval=lat_interval)
+    self.log(f'Rendering {len(chart_list)} charts.')
+    self.progress.start_stage('RENDERING_CHARTS', total=len(chart_list))
+    try:
+      with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        chart_images = list(executor.map(self._render, self.specs, chart_list))
+    finally:
+      for chart in chart_list:
+        chart.close()
+    self.charts = {spec['name']: img for spec, img in zip(self.specs, chart_images)}
+
+    return self,shared_subset
+
+
+  def _adopt_charts(self, worker_copy: 'BatchHeatMapBuilder') -> None:
+    super()._adopt_charts(worker_copy)
+    self.charts = worker_copy.charts
+    worker_copy.charts = {}
+
+
+  def get_chart(self, name: str) -> raw_image.ChartImage:
+    return self.charts[name]
+
+
+  def save(
+    self,
+    filepath: str | Path,
+    encoder: str | encoders.RasterEncoder = None
+  ) -> None:
+    """
+    A batch has several charts, so filepath is the directory where they are
+    written, as save_all does.
+    """
+    self.save_all(dirpath=filepath, encoder=encoder)
+
+
+  def save_all(
+    self,
+    dirpath: str | Path,
+    encoder: str | encoders.RasterEncoder = None
+  ) -> None:
+    """
+    Writes every chart as <name>.<format> in the directory. The charts are
+    written as they were rendered, with the encoder of the builder (PNG by
+    default), or encoded again if another encoder is given.
+    """
+    encoder = encoders.get_encoder(encoder)
+    rendered_encoder = encoders.get_encoder(self.encoder)
+    if encoder is rendered_encoder:
+      encoder = None
+    output_encoder = encoder or rendered_encoder
+    file_format = 'png' if output_encoder is None else output_encoder.format
+    dirpath = Path(dirpath)
+    dirpath.mkdir(parents=True, exist_ok=True)
+    for name, chart in self.charts.items():
+      chart.save(Path(dirpath, f'{name}.{file_format}'), encoder=encoder)
+
+
+  def close(self):
+    for chart in self.charts.values():
+      chart.close()
+    self.charts = {}
+    super().close()
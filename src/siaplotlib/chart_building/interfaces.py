@@ -1,6 +1,7 @@
 # Standard.
 from pathlib import Path
 from collections.abc import Callable
+from concurrent.futures import Future
 
 
 class ChartBuilderInterface:
@@ -12,9 +13,9 @@ class ChartBuilderInterface:
 
   def build(
     self,
-    success_callback: Callable[[], None],
-    failure_callback: Callable[[Exception], None]
-  ):
+    success_callback: Callable[[], None] = None,
+    failure_callback: Callable[[Exception], None] = None
+  ) -> Future:
     raise NotImplementedError(f'{self.__class__.__name__}: This is a virtual method. Must be implemented.')
 
 
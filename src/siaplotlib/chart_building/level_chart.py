@@ -1,8 +1,11 @@
+import os
 import sys
 import numpy as np
 import xarray as xr
+from siaplotlib.charts import base_chart
 from siaplotlib.charts import level_chart
 from siaplotlib.charts import raw_image
+from siaplotlib.charts import tile_pyramid
 from siaplotlib.processing import wrangling
 from siaplotlib.processing import aggregation
 from siaplotlib.processing import computations
@@ -27,12 +30,14 @@ class StaticWindRoseBuilder(ChartBuilder):
     log_stream = sys.stderr,
     verbose: bool = False,
     dim_constraints: dict = {},
-    color_palette: str = None
+    color_palette: str = None,
+    **kwargs
   ) -> None:
      super().__init__(
       dataset=dataset,
       log_stream=log_stream,
-      verbose=verbose)
+      verbose=verbose,
+      **kwargs)
      self.eastward_var_name = eastward_var_name
      self.northward_var_name = northward_var_name
      self.lat_dim_name  = lat_dim_name 
@@ -67,10 +72,20 @@ class StaticWindRoseBuilder(ChartBuilder):
 
     title =  self.title + f'\n Depth: {depth} \n Lat: ({lat_min},{lat_max}), Lon: ({lon_min},{lon_max})'
 
-    speed, direction = computations.calc_uniqueDir(
-      dataset = subset,
-      eastward_var_name = self.eastward_var_name,
-      northward_var_name = self.northward_var_name)
+    if self.derived_fields is not None:
+      speed, direction = [
+        self.derived_fields.get_subset(
+          dataset=self.dataset,
+          eastward_var_name=self.eastward_var_name,
+          northward_var_name=self.northward_var_name,
+          field=field,
+          dim_constraints=self.dim_constraints)
+        for field in ['SPEED', 'DIRECTION']]
+    else:
+      speed, direction = computations.calc_uniqueDir(
+        dataset = subset,
+        eastward_var_name = self.eastward_var_name,
+        northward_var_name = self.northward_var_name)
     
   
     directionUp = computations.corr_cord(dataset = direction) 
@@ -92,7 +107,9 @@ class StaticWindRoseBuilder(ChartBuilder):
       verbose=self.verbose,
       bin_range = bin_range,
       nsector = self.nsector,
-      color_palette = self.color_palette)
+      color_palette = self.color_palette,
+      build_on_create = not self.lazy,
+      log_stream = self.log_stream)
     
     return self,subset
 
@@ -110,13 +127,17 @@ class StaticHeatMapBuilder(ChartBuilder):
     var_name: str = None,
     var_label: str = None,
     color_palette: str = None,
+    rasterize_data: bool = True,
+    raster_dpi: int = base_chart.DEFAULT_DPI,
     log_stream = sys.stderr,
-    verbose: bool = False
+    verbose: bool = False,
+    **kwargs
   ) -> None:
     super().__init__(
       dataset=dataset,
       log_stream=log_stream,
-      verbose=verbose)
+      verbose=verbose,
+      **kwargs)
     self.var_name = var_name
     self.lat_dim_name = lat_dim_name
     self.lon_dim_name = lon_dim_name
@@ -124,6 +145,8 @@ class StaticHeatMapBuilder(ChartBuilder):
     self.dim_constraints = dim_constraints
     self.var_label = var_label
     self.color_palette = color_palette
+    self.rasterize_data = rasterize_data
+    self.raster_dpi = raster_dpi
 
 
   def sync_build(self):
@@ -138,13 +161,12 @@ class StaticHeatMapBuilder(ChartBuilder):
     else:
       subset = self.dataset
     
-    vmin = aggregation.min(
+    vmin, vmax = aggregation.min_max(
       dataset=subset,
-      rounding_precision=3)
-    
-    vmax = aggregation.max(
-      dataset=subset,
-      rounding_precision=3)
+      rounding_precision=3,
+      stats_index=self.stats_index,
+      var=self.var_name,
+      dim_constraints=self.dim_constraints)
     
     lon_data, lat_data, lon_interval, lat_interval = wrangling.get_coords(
       dataset=subset,
@@ -162,12 +184,125 @@ class StaticHeatMapBuilder(ChartBuilder):
       vmax=vmax,
       vmin=vmin,
       color_palette=self.color_palette,
+      rasterize_data=self.rasterize_data,
+      raster_dpi=self.raster_dpi,
+      build_on_create=not self.lazy,
       log_stream=self.log_stream,
       verbose=self.verbose)
     
     return self,subset
   
+class HeatMapTilesBuilder(ChartBuilder):
+  """
+  Build a heat map as a pyramid of Web-Mercator XYZ tiles for the given zoom
+  levels. Saving the builder writes the pyramid in a directory, skipping
+  the tiles a previous save of the same data already wrote. If vmin or vmax
+  are not given, they are taken from the subset.
+  """
+  # The output is not a single image.
+  CACHEABLE = False
+
+  # Public methods.
+
+  def __init__(
+    self,
+    dataset: xr.DataArray,
+    lat_dim_name: str,
+    lon_dim_name: str,
+    zoom_levels: list[int],
+    dim_constraints: dict = {},
+    var_name: str = None,
+    color_palette: str = None,
+    vmin: float = None,
+    vmax: float = None,
+    tile_size: int = 256,
+    max_workers: int = None,
+    skip_existing: bool = True,
+    log_stream = sys.stderr,
+    verbose: bool = False,
+    **kwargs
+  ) -> None:
+    super().__init__(
+      dataset=dataset,
+      log_stream=log_stream,
+      verbose=verbose,
+      **kwargs)
+    self.var_name = var_name
+    self.lat_dim_name = lat_dim_name
+    self.lon_dim_name = lon_dim_name
+    self.zoom_levels = zoom_levels
+    self.dim_constraints = dim_constraints
+    self.color_palette = color_palette
+    self.vmin = vmin
+    self.vmax = vmax
+    self.tile_size = tile_size
+    self.max_workers = max_workers
+    self.skip_existing = skip_existing
+
+
+  def sync_build(self):
+    subset = None
+    if self.dim_constraints:
+      subset = wrangling.slice_dice(
+        dataset=self.dataset,
+        dim_constraints=self.dim_constraints,
+        var=self.var_name)
+    elif self.var_name:
+      subset = self.dataset[self.var_name]
+    else:
+      subset = self.dataset
+    # Every dimension but the map ones must be reduced to one frame.
+    other_dims = [dim for dim in subset.dims if dim not in [self.lat_dim_name, self.lon_dim_name]]
+    unconstrained_dims = [dim for dim in other_dims if subset.sizes[dim] > 1]
+    if unconstrained_dims:
+      raise RuntimeError(
+        f'The dimensions {unconstrained_dims} must be constrained to a single value.')
+    subset = subset.squeeze(other_dims, drop=True).transpose(self.lat_dim_name, self.lon_dim_name)
+
+    vmin, vmax = self.vmin, self.vmax
+    if vmin is None or vmax is None:
+      data_min, data_max = aggregation.min_max(
+        dataset=subset,
+        rounding_precision=3,
+        stats_index=self.stats_index,
+        var=self.var_name,
+        dim_constraints=self.dim_constraints)
+      vmin = data_min if vmin is None else vmin
+      vmax = data_max if vmax is None else vmax
+
+    lon_data, lat_data, lon_interval, lat_interval = wrangling.get_coords(
+      dataset=subset,
+      lon_dim_name=self.lon_dim_name,
+      lat_dim_name=self.lat_dim_name)
+
+    self._chart = tile_pyramid.HeatMapTiles(
+      data=subset.data,
+      lon_data=lon_data,
+      lat_data=lat_data,
+      vmin=vmin,
+      vmax=vmax,
+      zoom_levels=self.zoom_levels,
+      color_palette=self.color_palette,
+      tile_size=self.tile_size,
+      max_workers=self.max_workers,
+      skip_existing=self.skip_existing,
+      log_stream=self.log_stream,
+      verbose=self.verbose)
+
+    return self,subset
+
+
+  def estimate_image_bytes(self) -> int:
+    # Tiles are rendered max_workers at a time (the ThreadPoolExecutor
+    # default if None), each one as RGBA plus its values as floats.
+    max_workers = self.max_workers or min(32, (os.cpu_count() or 1) + 4)
+    return max_workers * self.tile_size ** 2 * (4 + 8)
+
+
 class AnimatedHeatMapBuilder(ChartBuilder):
+  # Animations can be large and are not kept in the chart cache.
+  CACHEABLE = False
+
   def __init__(
     self,
     dataset: xr.DataArray,
@@ -182,9 +317,14 @@ class AnimatedHeatMapBuilder(ChartBuilder):
     duration: int = 0.5,
     duration_unit: str = 'SECONDS_PER_FRAME',
     log_stream = sys.stderr,
-    verbose: bool = False
+    verbose: bool = False,
+    **kwargs
   ) -> None:
-    super().__init__(dataset=dataset, verbose=verbose, log_stream=log_stream)
+    super().__init__(
+      dataset=dataset,
+      log_stream=log_stream,
+      verbose=verbose,
+      **kwargs)
     self.var_name = var_name
     self.lat_dim_name = lat_dim_name
     self.lon_dim_name = lon_dim_name
@@ -197,7 +337,12 @@ class AnimatedHeatMapBuilder(ChartBuilder):
     self.duration_unit = duration_unit
 
 
+  def count_frames(self, subset_sizes: dict[str, int]) -> int:
+    return subset_sizes.get(self.time_dim_name, 1)
+
+
   def sync_build(self):
+    self.progress.start_stage('PREPARING_DATA')
     subset = None
     if self.dim_constraints:
       subset = wrangling.slice_dice(
@@ -209,13 +354,12 @@ class AnimatedHeatMapBuilder(ChartBuilder):
     else:
       subset = self.dataset
     
-    vmin = aggregation.min(
+    vmin, vmax = aggregation.min_max(
       dataset=subset,
-      rounding_precision=3)
-    
-    vmax = aggregation.max(
-      dataset=subset,
-      rounding_precision=3)
+      rounding_precision=3,
+      stats_index=self.stats_index,
+      var=self.var_name,
+      dim_constraints=self.dim_constraints)
     
     lon_data, lat_data, lon_interval, lat_interval = wrangling.get_coords(
       dataset=subset,
@@ -225,36 +369,39 @@ class AnimatedHeatMapBuilder(ChartBuilder):
     self.log('Creating images (frames) to create gif.')
     
     chart_list = []
-    for  i in range(len(subset[self.time_dim_name])):
-      time_constraint = {}
-      time_constraint[self.time_dim_name] = [i]
-      date_subset = subset.isel(time_constraint).squeeze()
-      date = np.datetime_as_string(date_subset[self.time_dim_name].data, unit='D')
-
-      chart = level_chart.HeatMap(
-        data=date_subset.data,
-        data_label=self.var_label,
-        title=f'{self.title} {date}',
-        lon_interval=lon_interval,
-        lat_interval=lat_interval,
-        lat_data=lat_data,
-        lon_data=lon_data,
-        vmax=vmax,
-        vmin=vmin,
-        color_palette=self.color_palette,
-        log_stream=self.log_stream,
-        verbose=self.verbose)
+    try:
+      for  i in range(len(subset[self.time_dim_name])):
+        self.check_cancelled()
+        time_constraint = {}
+        time_constraint[self.time_dim_name] = [i]
+        date_subset = subset.isel(time_constraint).squeeze()
+        date = np.datetime_as_string(date_subset[self.time_dim_name].data, unit='D')
+
+        chart = level_chart.HeatMap(
+          data=date_subset.data,
+          data_label=self.var_label,
+          title=f'{self.title} {date}',
+          lon_interval=lon_interval,
+          lat_interval=lat_interval,
+          lat_data=lat_data,
+          lon_data=lon_data,
+          vmax=vmax,
+          vmin=vmin,
+          color_palette=self.color_palette,
+          build_on_create=False,
+          log_stream=self.log_stream,
+          verbose=self.verbose)
       
-      chart_list.append(chart)
-    
-    img_buff = self._make_gif(
-      chart_list,
-      duration=self.duration,
-      duration_unit=self.duration_unit)
+        chart_list.append(chart)
     
-    self.log('Closing intermediate figures')
-    for chart in chart_list:
-      chart.close()
+      img_buff = self._make_gif(
+        chart_list,
+        duration=self.duration,
+        duration_unit=self.duration_unit)
+    finally:
+      self.log('Closing intermediate figures')
+      for chart in chart_list:
+        chart.close()
 
     self._chart = raw_image.ChartImage(
       img_source=img_buff,
@@ -280,10 +427,17 @@ class StaticContourMapBuilder(ChartBuilder):
     var_name: str = None,
     var_label: str = None,
     color_palette: str = None,
+    rasterize_data: bool = True,
+    raster_dpi: int = base_chart.DEFAULT_DPI,
     log_stream = sys.stderr,
-    verbose: bool = False
+    verbose: bool = False,
+    **kwargs
   ) -> None:
-    super().__init__(dataset=dataset, verbose=verbose, log_stream=log_stream)
+    super().__init__(
+      dataset=dataset,
+      log_stream=log_stream,
+      verbose=verbose,
+      **kwargs)
     self.var_name = var_name
     self.lat_dim_name = lat_dim_name
     self.lon_dim_name = lon_dim_name
@@ -292,6 +446,8 @@ class StaticContourMapBuilder(ChartBuilder):
     self.dim_constraints = dim_constraints
     self.var_label = var_label
     self.color_palette = color_palette
+    self.rasterize_data = rasterize_data
+    self.raster_dpi = raster_dpi
 
   
   def sync_build(self):
@@ -306,13 +462,12 @@ class StaticContourMapBuilder(ChartBuilder):
     else:
       subset = self.dataset
     
-    vmin = aggregation.min(
-      dataset=subset,
-      rounding_precision=3)
-    
-    vmax = aggregation.max(
+    vmin, vmax = aggregation.min_max(
       dataset=subset,
-      rounding_precision=3)
+      rounding_precision=3,
+      stats_index=self.stats_index,
+      var=self.var_name,
+      dim_constraints=self.dim_constraints)
     
     lon_data, lat_data, lon_interval, lat_interval = wrangling.get_coords(
       dataset=subset,
@@ -331,6 +486,9 @@ class StaticContourMapBuilder(ChartBuilder):
       vmin=vmin,
       num_levels=self.num_levels,
       color_palette=self.color_palette,
+      rasterize_data=self.rasterize_data,
+      raster_dpi=self.raster_dpi,
+      build_on_create=not self.lazy,
       log_stream=self.log_stream,
       verbose=self.verbose)
     
@@ -338,6 +496,9 @@ class StaticContourMapBuilder(ChartBuilder):
 
 
 class AnimatedContourMapBuilder(ChartBuilder):
+  # Animations can be large and are not kept in the chart cache.
+  CACHEABLE = False
+
   def __init__(
     self,
     dataset: xr.DataArray,
@@ -353,9 +514,14 @@ class AnimatedContourMapBuilder(ChartBuilder):
     duration: int = 0.5,
     duration_unit: str = 'SECONDS_PER_FRAME',
     log_stream=sys.stderr,
-    verbose: bool = False
+    verbose: bool = False,
+    **kwargs
   ) -> None:
-    super().__init__(dataset=dataset, log_stream=log_stream, verbose=verbose)
+    super().__init__(
+      dataset=dataset,
+      log_stream=log_stream,
+      verbose=verbose,
+      **kwargs)
     self.var_name = var_name
     self.lat_dim_name = lat_dim_name
     self.lon_dim_name = lon_dim_name
@@ -369,7 +535,12 @@ class AnimatedContourMapBuilder(ChartBuilder):
     self.duration_unit = duration_unit
   
   
+  def count_frames(self, subset_sizes: dict[str, int]) -> int:
+    return subset_sizes.get(self.time_dim_name, 1)
+
+
   def sync_build(self):
+    self.progress.start_stage('PREPARING_DATA')
     subset = None
     if self.dim_constraints:
       subset = wrangling.slice_dice(
@@ -381,13 +552,12 @@ class AnimatedContourMapBuilder(ChartBuilder):
     else:
       subset = self.dataset
     
-    vmin = aggregation.min(
-      dataset=subset,
-      rounding_precision=3)
-    
-    vmax = aggregation.max(
+    vmin, vmax = aggregation.min_max(
       dataset=subset,
-      rounding_precision=3)
+      rounding_precision=3,
+      stats_index=self.stats_index,
+      var=self.var_name,
+      dim_constraints=self.dim_constraints)
     
     lon_data, lat_data, lon_interval, lat_interval = wrangling.get_coords(
       dataset=subset,
@@ -397,37 +567,40 @@ class AnimatedContourMapBuilder(ChartBuilder):
     self.log('Creating images (frames) to create gif.')
     
     chart_list = []
-    for  i in range(len(subset[self.time_dim_name])):
-      time_constraint = {}
-      time_constraint[self.time_dim_name] = [i]
-      date_subset = subset.isel(time_constraint).squeeze()
-      date = np.datetime_as_string(date_subset[self.time_dim_name].data, unit='D')
-
-      chart = level_chart.ContourMap(
-        data=date_subset.data,
-        data_label=self.var_label,
-        title=f'{self.title} {date}',
-        lon_interval=lon_interval,
-        lat_interval=lat_interval,
-        lat_data=lat_data,
-        lon_data=lon_data,
-        vmax=vmax,
-        vmin=vmin,
-        color_palette=self.color_palette,
-        num_levels=self.num_levels,
-        log_stream=self.log_stream,
-        verbose=self.verbose)
+    try:
+      for  i in range(len(subset[self.time_dim_name])):
+        self.check_cancelled()
+        time_constraint = {}
+        time_constraint[self.time_dim_name] = [i]
+        date_subset = subset.isel(time_constraint).squeeze()
+        date = np.datetime_as_string(date_subset[self.time_dim_name].data, unit='D')
+
+        chart = level_chart.ContourMap(
+          data=date_subset.data,
+          data_label=self.var_label,
+          title=f'{self.title} {date}',
+          lon_interval=lon_interval,
+          lat_interval=lat_interval,
+          lat_data=lat_data,
+          lon_data=lon_data,
+          vmax=vmax,
+          vmin=vmin,
+          color_palette=self.color_palette,
+          num_levels=self.num_levels,
+          build_on_create=False,
+          log_stream=self.log_stream,
+          verbose=self.verbose)
       
-      chart_list.append(chart)
-    
-    img_buff = self._make_gif(
-      chart_list,
-      duration=self.duration,
-      duration_unit=self.duration_unit)
+        chart_list.append(chart)
     
-    self.log('Closing intermediate figures.')
-    for chart in chart_list:
-      chart.close()
+      img_buff = self._make_gif(
+        chart_list,
+        duration=self.duration,
+        duration_unit=self.duration_unit)
+    finally:
+      self.log('Closing intermediate figures.')
+      for chart in chart_list:
+        chart.close()
 
     self._chart = raw_image.ChartImage(
       img_source=img_buff,
@@ -459,13 +632,17 @@ class StaticVerticalSliceBuilder(ChartBuilder):
     dim_constraints: dict = {},
     var_name: str = None,
     color_palette: str = None,
+    rasterize_data: bool = True,
+    raster_dpi: int = base_chart.DEFAULT_DPI,
     log_stream = sys.stderr,
-    verbose: bool = False
+    verbose: bool = False,
+    **kwargs
   ) -> None:
     super().__init__(
       dataset=dataset,
       log_stream=log_stream,
-      verbose=verbose)
+      verbose=verbose,
+      **kwargs)
     self.var_name = var_name
     self.x_dim_name = x_dim_name
     self.y_dim_name = y_dim_name
@@ -477,6 +654,8 @@ class StaticVerticalSliceBuilder(ChartBuilder):
     self.x_label = x_label
     self.dim_constraints = dim_constraints
     self.color_palette = color_palette
+    self.rasterize_data = rasterize_data
+    self.raster_dpi = raster_dpi
 
 
   def sync_build(self):
@@ -491,13 +670,12 @@ class StaticVerticalSliceBuilder(ChartBuilder):
     else:
       subset = self.dataset
     
-    vmin = aggregation.min(
+    vmin, vmax = aggregation.min_max(
       dataset=subset,
-      rounding_precision=3)
-    
-    vmax = aggregation.max(
-      dataset=subset,
-      rounding_precision=3)
+      rounding_precision=3,
+      stats_index=self.stats_index,
+      var=self.var_name,
+      dim_constraints=self.dim_constraints)
     
     lon_data, lat_data, lon_interval, lat_interval = wrangling.get_coords(
       dataset=subset,
@@ -534,6 +712,9 @@ class StaticVerticalSliceBuilder(ChartBuilder):
       y_label=self.y_label,
       x_label=self.x_label,
       color_palette=self.color_palette,
+      rasterize_data=self.rasterize_data,
+      raster_dpi=self.raster_dpi,
+      build_on_create=not self.lazy,
       log_stream=self.log_stream,
       verbose=self.verbose
     )
@@ -541,7 +722,175 @@ class StaticVerticalSliceBuilder(ChartBuilder):
     return self,subset
   
 
+class StaticTransectBuilder(ChartBuilder):
+  """
+  Build a vertical section along an arbitrary path given as a list of
+  (lat, lon) waypoints. The field is sampled at num_points equally spaced
+  points along the path with bilinear interpolation over all the values of
+  y_dim_name (e.g. depth) at once. The interpolation weights are kept in
+  interpolation_weights and reused while the grid does not change.
+  """
+  # Public methods.
+
+  def __init__(
+    self,
+    dataset: xr.DataArray,
+    waypoints: list[tuple[float, float]],
+    y_dim_name: str,
+    lat_dim_name: str,
+    lon_dim_name: str,
+    title: str,
+    var_label: str,
+    y_label: str,
+    x_label: str = 'Distance (km)',
+    num_points: int = 200,
+    dim_constraints: dict = {},
+    var_name: str = None,
+    color_palette: str = None,
+    rasterize_data: bool = True,
+    raster_dpi: int = base_chart.DEFAULT_DPI,
+    log_stream = sys.stderr,
+    verbose: bool = False,
+    **kwargs
+  ) -> None:
+    super().__init__(
+      dataset=dataset,
+      log_stream=log_stream,
+      verbose=verbose,
+      **kwargs)
+    self.waypoints = waypoints
+    self.var_name = var_name
+    self.y_dim_name = y_dim_name
+    self.lat_dim_name = lat_dim_name
+    self.lon_dim_name = lon_dim_name
+    self.title = title
+    self.var_label = var_label
+    self.y_label = y_label
+    self.x_label = x_label
+    self.num_points = num_points
+    self.dim_constraints = dim_constraints
+    self.color_palette = color_palette
+    self.rasterize_data = rasterize_data
+    self.raster_dpi = raster_dpi
+    self.interpolation_weights = None
+    self._weights_grid_key = None
+
+
+  def get_interpolation_weights(
+    self,
+    lat_data: np.ndarray,
+    lon_data: np.ndarray
+  ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Get the path points and their bilinear weights over the given grid,
+    reusing the ones from the previous build if the grid is the same.
+
+    It returns: lat_points, lon_points, distance, lat_indices, lon_indices, weights
+    """
+    grid_key = (
+      lat_data.shape, float(lat_data[0]), float(lat_data[-1]),
+      lon_data.shape, float(lon_data[0]), float(lon_data[-1]),
+      tuple(map(tuple, self.waypoints)), self.num_points)
+    if self.interpolation_weights is None or self._weights_grid_key != grid_key:
+      self.log('Computing interpolation weights.')
+      # Unwrapped so paths across the antimeridian take the short way. The
+      # points are wrapped back into the range of the grid to interpolate.
+      waypoints = np.array(self.waypoints, dtype=float)
+      waypoints[:, 1] = computations.unwrap_longitudes(waypoints[:, 1])
+      lat_points, lon_points, distance = computations.calc_path_points(
+        waypoints=waypoints,
+        num_points=self.num_points)
+      lat_indices, lon_indices, weights = computations.calc_bilinear_weights(
+        lat_data=lat_data,
+        lon_data=lon_data,
+        lat_points=lat_points,
+        lon_points=computations.wrap_longitudes(lon_points, float(lon_data.min())))
+      self.interpolation_weights = (lat_points, lon_points, distance, lat_indices, lon_indices, weights)
+      self._weights_grid_key = grid_key
+    return self.interpolation_weights
+
+
+  def sync_build(self):
+    subset = None
+    if self.dim_constraints:
+      subset = wrangling.slice_dice(
+        dataset=self.dataset,
+        dim_constraints=self.dim_constraints,
+        var=self.var_name)
+    elif self.var_name:
+      subset = self.dataset[self.var_name]
+    else:
+      subset = self.dataset
+
+    # Every other dimension (e.g. time) must be reduced to a single value.
+    other_dims = [
+      dim for dim in subset.dims
+      if dim not in [self.y_dim_name, self.lat_dim_name, self.lon_dim_name]]
+    unconstrained_dims = [dim for dim in other_dims if subset.sizes[dim] > 1]
+    if unconstrained_dims:
+      raise RuntimeError(
+        f'Dimensions {unconstrained_dims} must be constrained to a single value for a transect.')
+    subset = subset.squeeze(other_dims, drop=True)
+    # Keep (y, lat, lon) as the axes.
+    subset = subset.transpose(self.y_dim_name, self.lat_dim_name, self.lon_dim_name)
+    lat_data = subset[self.lat_dim_name].data
+    lon_data = subset[self.lon_dim_name].data
+    lat_points, lon_points, distance, lat_indices, lon_indices, weights = self.get_interpolation_weights(
+      lat_data=lat_data,
+      lon_data=lon_data)
+
+    # Only load the block of the grid touched by the path.
+    lat_start, lat_stop = int(lat_indices.min()), int(lat_indices.max()) + 1
+    lon_start, lon_stop = int(lon_indices.min()), int(lon_indices.max()) + 1
+    block = subset.isel({
+      self.lat_dim_name: slice(lat_start, lat_stop),
+      self.lon_dim_name: slice(lon_start, lon_stop)
+    })
+    z_values = computations.bilinear_interpolate(
+      data=block.data,
+      lat_indices=lat_indices - lat_start,
+      lon_indices=lon_indices - lon_start,
+      weights=weights)
+
+    vmin = float(np.round(np.nanmin(z_values), 3))
+    vmax = float(np.round(np.nanmax(z_values), 3))
+    lon_interval = [float(np.round(lon_points.min() - 1, 3)), float(np.round(lon_points.max() + 1, 3))]
+    lat_interval = [float(np.round(lat_points.min() - 1, 3)), float(np.round(lat_points.max() + 1, 3))]
+
+    self.log(f'vmin: {vmin}')
+    self.log(f'vmax: {vmax}')
+    self.log(f'lon_interval: {lon_interval}')
+    self.log(f'lat_interval: {lat_interval}')
+
+    self._chart = level_chart.VerticalSlice(
+      x_values=distance,
+      y_values=subset[self.y_dim_name].data,
+      z_values=z_values,
+      vmin=vmin,
+      vmax=vmax,
+      lon_interval=lon_interval,
+      lat_interval=lat_interval,
+      path_lon=lon_points,
+      path_lat=lat_points,
+      title=self.title,
+      z_label=self.var_label,
+      y_label=self.y_label,
+      x_label=self.x_label,
+      color_palette=self.color_palette,
+      rasterize_data=self.rasterize_data,
+      raster_dpi=self.raster_dpi,
+      build_on_create=not self.lazy,
+      log_stream=self.log_stream,
+      verbose=self.verbose
+    )
+
+    return self,subset
+
+
 class AnimatedVerticalSliceBuilder(ChartBuilder):
+  # Animations can be large and are not kept in the chart cache.
+  CACHEABLE = False
+
   def __init__(
     self,
     dataset: xr.DataArray,
@@ -560,9 +909,14 @@ class AnimatedVerticalSliceBuilder(ChartBuilder):
     duration: int = 0.5,
     duration_unit: str = 'SECONDS_PER_FRAME',
     log_stream=sys.stderr,
-    verbose: bool = False
+    verbose: bool = False,
+    **kwargs
   ) -> None:
-    super().__init__(dataset=dataset, log_stream=log_stream, verbose=verbose)
+    super().__init__(
+      dataset=dataset,
+      log_stream=log_stream,
+      verbose=verbose,
+      **kwargs)
     self.var_name = var_name
     self.x_dim_name = x_dim_name
     self.y_dim_name = y_dim_name
@@ -579,7 +933,12 @@ class AnimatedVerticalSliceBuilder(ChartBuilder):
     self.duration_unit = duration_unit
 
 
+  def count_frames(self, subset_sizes: dict[str, int]) -> int:
+    return subset_sizes.get(self.time_dim_name, 1)
+
+
   def sync_build(self):
+    self.progress.start_stage('PREPARING_DATA')
     subset = None
     if self.dim_constraints:
       subset = wrangling.slice_dice(
@@ -591,13 +950,12 @@ class AnimatedVerticalSliceBuilder(ChartBuilder):
     else:
       subset = self.dataset
     
-    vmin = aggregation.min(
+    vmin, vmax = aggregation.min_max(
       dataset=subset,
-      rounding_precision=3)
-    
-    vmax = aggregation.max(
-      dataset=subset,
-      rounding_precision=3)
+      rounding_precision=3,
+      stats_index=self.stats_index,
+      var=self.var_name,
+      dim_constraints=self.dim_constraints)
     
     lon_data, lat_data, lon_interval, lat_interval = wrangling.get_coords(
       dataset=subset,
@@ -623,38 +981,41 @@ class AnimatedVerticalSliceBuilder(ChartBuilder):
     self.log('Creating images (frames) to create gif.')
     
     chart_list = []
-    for date in subset[self.time_dim_name]:
-      date_subset = subset.sel({
-        self.time_dim_name: date.data
-      }).squeeze()
-      date = np.datetime_as_string(date.data, unit='D')
-      chart = level_chart.VerticalSlice(
-        x_values=x_values,
-        y_values=date_subset[self.y_dim_name].data,
-        z_values=date_subset.data,
-        vmin=vmin,
-        vmax=vmax,
-        lon_interval=lon_interval,
-        lat_interval=lat_interval,
-        title=f'{self.title} - {date}',
-        z_label=self.var_label,
-        y_label=self.y_label,
-        x_label=self.x_label,
-        color_palette=self.color_palette,
-        log_stream=self.log_stream,
-        verbose=self.verbose
-      )
+    try:
+      for date in subset[self.time_dim_name]:
+        self.check_cancelled()
+        date_subset = subset.sel({
+          self.time_dim_name: date.data
+        }).squeeze()
+        date = np.datetime_as_string(date.data, unit='D')
+        chart = level_chart.VerticalSlice(
+          x_values=x_values,
+          y_values=date_subset[self.y_dim_name].data,
+          z_values=date_subset.data,
+          vmin=vmin,
+          vmax=vmax,
+          lon_interval=lon_interval,
+          lat_interval=lat_interval,
+          title=f'{self.title} - {date}',
+          z_label=self.var_label,
+          y_label=self.y_label,
+          x_label=self.x_label,
+          color_palette=self.color_palette,
+          build_on_create=False,
+          log_stream=self.log_stream,
+          verbose=self.verbose
+        )
       
-      chart_list.append(chart)
-    
-    img_buff = self._make_gif(
-      chart_list,
-      duration=self.duration,
-      duration_unit=self.duration_unit)
+        chart_list.append(chart)
     
-    self.log('Closing intermediate figures.')
-    for chart in chart_list:
-      chart.close()
+      img_buff = self._make_gif(
+        chart_list,
+        duration=self.duration,
+        duration_unit=self.duration_unit)
+    finally:
+      self.log('Closing intermediate figures.')
+      for chart in chart_list:
+        chart.close()
 
     self._chart = raw_image.ChartImage(
       img_source=img_buff,
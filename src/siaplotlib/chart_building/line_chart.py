@@ -10,13 +10,15 @@ from siaplotlib.processing import computations
 
 
 class StaticArrowChartBuilder(ChartBuilder):
+  FIGSIZE = line_chart.ArrowChart.FIGSIZE
+
   # Public methods.
   def __init__(
     self, 
     dataset: xr.DataArray,
     eastward_var_name: str,
     northward_var_name: str,
-    grouping_level,
+    grouping_level: int | str,
     title: str,
     var_label: str,
     time_dim_name: str,
@@ -24,13 +26,17 @@ class StaticArrowChartBuilder(ChartBuilder):
     lat_dim_name: str,
     depth_dim_name: str,
     dim_constraints: dict = {},
+    target_arrows: int = None,
+    block_average: bool = False,
     log_stream = sys.stderr,
-    verbose: bool = False
+    verbose: bool = False,
+    **kwargs
   ) -> None:
      super().__init__(
       dataset=dataset,
       log_stream=log_stream,
-      verbose=verbose)
+      verbose=verbose,
+      **kwargs)
      self.eastward_var_name = eastward_var_name
      self.northward_var_name = northward_var_name
      self.lat_dim_name  = lat_dim_name 
@@ -41,6 +47,8 @@ class StaticArrowChartBuilder(ChartBuilder):
      self.grouping_level = grouping_level
      self.dim_constraints = dim_constraints
      self.var_label = var_label
+     self.target_arrows = target_arrows
+     self.block_average = block_average
     
   def sync_build(self):
       
@@ -52,10 +60,18 @@ class StaticArrowChartBuilder(ChartBuilder):
     else:
       subset = self.dataset
     
-    speed = computations.calc_spd(
-      dataset=subset,
-      eastward_var_name= self.eastward_var_name,
-      northward_var_name= self.northward_var_name)
+    if self.derived_fields is not None:
+      speed = self.derived_fields.get_subset(
+        dataset=self.dataset,
+        eastward_var_name=self.eastward_var_name,
+        northward_var_name=self.northward_var_name,
+        field='SPEED',
+        dim_constraints=self.dim_constraints)
+    else:
+      speed = computations.calc_spd(
+        dataset=subset,
+        eastward_var_name= self.eastward_var_name,
+        northward_var_name= self.northward_var_name)
     
     dp_nm = self.depth_dim_name
     depth = subset[dp_nm].values.max()
@@ -77,12 +93,18 @@ class StaticArrowChartBuilder(ChartBuilder):
       lat_dim_name=self.lat_dim_name,
       lon_dim_name=self.lon_dim_name,
       grouping_level=self.grouping_level,
+      target_arrows=self.target_arrows,
+      block_average=self.block_average,
+      build_on_create=not self.lazy,
+      log_stream=self.log_stream,
       verbose=self.verbose)
     
     return self,subset
 
 
 class StaticRegionMapBuilder(ChartBuilder):
+  FIGSIZE = line_chart.RegionMap.FIGSIZE
+
   # Public methods.
 
   def __init__(
@@ -93,12 +115,14 @@ class StaticRegionMapBuilder(ChartBuilder):
     lat_dim_min: float,
     lat_dim_max: float,
     log_stream = sys.stderr,
-    verbose: bool = False
+    verbose: bool = False,
+    **kwargs
   ) -> None:
     super().__init__(
       dataset=None,
       log_stream=log_stream,
-      verbose=verbose)
+      verbose=verbose,
+      **kwargs)
     self.amplitude = amplitude
     self.lon_dim_min = lon_dim_min
     self.lon_dim_max = lon_dim_max
@@ -111,7 +135,10 @@ class StaticRegionMapBuilder(ChartBuilder):
         lon_dim_min = self.lon_dim_min,
         lon_dim_max = self.lon_dim_max,
         lat_dim_min = self.lat_dim_min,
-        lat_dim_max = self.lat_dim_max)
+        lat_dim_max = self.lat_dim_max,
+        build_on_create = not self.lazy,
+        log_stream = self.log_stream,
+        verbose = self.verbose)
 
       return self
 
@@ -133,12 +160,14 @@ class SinglePointTimeSeriesBuilder(ChartBuilder):
     time_dim_label: str = None,
     dim_constraints: dict[str, list] = {},
     log_stream = sys.stderr,
-    verbose: bool = False
+    verbose: bool = False,
+    **kwargs
   ) -> None:
     super().__init__(
       dataset=dataset,
       log_stream=log_stream,
-      verbose=verbose)
+      verbose=verbose,
+      **kwargs)
     self.var_name = var_name
     self.lat_dim_name = lat_dim_name
     self.lon_dim_name = lon_dim_name
@@ -170,7 +199,8 @@ class SinglePointTimeSeriesBuilder(ChartBuilder):
     series_list = wrangling.group_into_series(
       dataset=subset,
       x_dim_name=self.time_dim_name,
-      grouping_dim_name=self.grouping_dim_name)
+      grouping_dim_name=self.grouping_dim_name,
+      check_cancelled=self.check_cancelled)
 
     lon_interval[0] -= 3
     lon_interval[1] += 3
@@ -187,6 +217,7 @@ class SinglePointTimeSeriesBuilder(ChartBuilder):
       y_label=self.var_label,
       x_label=self.time_dim_label,
       show_series_names=show_series_names,
+      build_on_create=not self.lazy,
       log_stream=self.log_stream,
       verbose=self.verbose)
     
@@ -210,12 +241,14 @@ class SinglePointVerticalProfileBuilder(ChartBuilder):
     var_label: str = None,
     dim_constraints: dict[str, list] = {},
     log_stream = sys.stderr,
-    verbose: bool = False
+    verbose: bool = False,
+    **kwargs
   ) -> None:
     super().__init__(
       dataset=dataset,
       log_stream=log_stream,
-      verbose=verbose)
+      verbose=verbose,
+      **kwargs)
     self.var_name = var_name
     self.lat_dim_name = lat_dim_name
     self.lon_dim_name = lon_dim_name
@@ -247,7 +280,8 @@ class SinglePointVerticalProfileBuilder(ChartBuilder):
       dataset=subset,
       x_dim_name=self.y_dim_name,
       grouping_dim_name=self.grouping_dim_name,
-      reverse_axis=True)
+      reverse_axis=True,
+      check_cancelled=self.check_cancelled)
 
     lon_interval[0] -= 3
     lon_interval[1] += 3
@@ -264,6 +298,7 @@ class SinglePointVerticalProfileBuilder(ChartBuilder):
       y_label=self.y_dim_label,
       x_label=self.var_label,
       show_series_names=show_series_names,
+      build_on_create=not self.lazy,
       log_stream=self.log_stream,
       verbose=self.verbose)
     
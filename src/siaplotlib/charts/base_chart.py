@@ -2,14 +2,52 @@
 import sys
 import io
 import pathlib
+from threading import RLock
 # Third party
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgba
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
 # Own
 from siaplotlib.charts.interfaces import ChartInterface
+from siaplotlib.charts import encoders
 from siaplotlib.utils.log import LoggingFeatures
 
+# Resolution used when the figure is rendered to a file or a buffer.
+DEFAULT_DPI = 300
+# Formats where the artists are written as vectors, except the rasterized ones.
+VECTOR_FORMATS = ['svg', 'svgz', 'pdf', 'eps', 'ps']
+# pyplot keeps the current figure and axes as global state, so figures are
+# created one at a time when charts are built from several threads. Drawing
+# them (savefig) does not touch that state and can run in parallel.
+PYPLOT_LOCK = RLock()
+
+
+def get_output_format(filepath: str | pathlib.Path) -> str:
+  """
+  Get the format savefig writes to filepath: its extension or, if it has
+  none, the default format of matplotlib.
+  """
+  return pathlib.Path(filepath).suffix.lower().lstrip('.') or plt.rcParams['savefig.format']
+
+
+def is_vector_path(filepath: str | pathlib.Path) -> bool:
+  return pathlib.Path(filepath).suffix.lower().lstrip('.') in VECTOR_FORMATS
+
 
 class Chart(ChartInterface, LoggingFeatures):
+  """
+  Base class for the charts drawn with pyplot. Subclasses keep the data and
+  parameters they need and create the figure in build(). If they are created
+  with build_on_create=False, the figure is built the first time it is needed
+  by plot(), save() or get_buffer().
+
+  Rasterized artists (e.g. the data layer of the level charts created with
+  rasterize_data=True) are embedded as images of raster_dpi resolution in
+  vector outputs (SVG, PDF, EPS), while coastlines, text and axes stay as
+  vectors.
+  """
   def __init__(
     self,
     fig = None,
@@ -22,24 +60,47 @@ class Chart(ChartInterface, LoggingFeatures):
     # Own members.
     self._fig = fig
     self._fig_path = fig_path
+    # Resolution of the rasterized artists in vector outputs.
+    self.raster_dpi = DEFAULT_DPI
 
 
-  def plot(self) -> None:
+  def is_built(self) -> bool:
+    return self._fig is not None
+
+
+  def ensure_built(self) -> None:
+    """
+    Build the figure if it has not been created yet.
+    """
     if self._fig is None:
-      # TODO: Raise and appropriate exception class.
-      raise RuntimeError('Pyplot figure has not been created.')
+      self.log('Building figure on demand.')
+      with PYPLOT_LOCK:
+        self.build()
+
+
+  def plot(self) -> None:
+    self.ensure_built()
     self._fig.show()
   
 
   def save(
     self,
-    filepath: str | pathlib.Path
+    filepath: str | pathlib.Path,
+    encoder: str | encoders.RasterEncoder = None
   ) -> None:
-    if self._fig is None:
-      # TODO: Raise and appropriate exception class.
-      raise RuntimeError('Pyplot figure has not been created.')
-  
-    self._fig.savefig(filepath, dpi=300, bbox_inches='tight')
+    """
+    Save the figure in the format given by the extension of filepath or, if
+    an encoder is given (by name, see encoders.ENCODERS), in its raster
+    format and options. Files with a vector format extension ignore it.
+    """
+    self.ensure_built()
+    encoder = encoders.get_encoder(encoder)
+    is_vector = is_vector_path(filepath)
+    if encoder is not None and not is_vector:
+      self._fig.savefig(filepath, dpi=DEFAULT_DPI, bbox_inches='tight', **encoder.get_savefig_kwargs())
+    else:
+      dpi = self.raster_dpi if is_vector else DEFAULT_DPI
+      self._fig.savefig(filepath, dpi=dpi, bbox_inches='tight')
     self._fig_path = filepath
     self.log(f'Image saved in: {filepath}')
   
@@ -51,12 +112,102 @@ class Chart(ChartInterface, LoggingFeatures):
       self._fig = None
   
 
-  def get_buffer(self) -> io.BytesIO:
+  def get_buffer(
+    self,
+    encoder: str | encoders.RasterEncoder = None
+  ) -> io.BytesIO:
+    """
+    Get the figure as a PNG image or, if an encoder is given, in its format.
+    """
+    self.ensure_built()
+    encoder = encoders.get_encoder(encoder)
+    savefig_kwargs = {} if encoder is None else encoder.get_savefig_kwargs()
     img_buff = io.BytesIO()
-    self._fig.savefig(img_buff, dpi=300, bbox_inches='tight')
+    self._fig.savefig(img_buff, dpi=DEFAULT_DPI, bbox_inches='tight', **savefig_kwargs)
     return img_buff
+
+
+  def export(self, outputs: list[dict]) -> list[io.BytesIO]:
+    """
+    Draw the figure once and encode it into several outputs, e.g. a PNG, a
+    WebP and a thumbnail (see encoders.encode_many for the keys of each
+    output). Raster outputs are encoded from the same pixels, drawn once
+    and framed as get_buffer frames them; outputs with a vector format
+    extension and no encoder are saved as save() does.
+    """
+    self.ensure_built()
+    buffers = [None] * len(outputs)
+    raster_outputs = []
+    for i, output in enumerate(outputs):
+      filepath = output.get('filepath')
+      if filepath is not None and is_vector_path(filepath) and output.get('encoder') is None:
+        img_buff = io.BytesIO()
+        self._fig.savefig(
+          img_buff,
+          format=get_output_format(filepath),
+          dpi=self.raster_dpi,
+          bbox_inches='tight')
+        pathlib.Path(filepath).write_bytes(img_buff.getbuffer())
+        img_buff.seek(0)
+        buffers[i] = img_buff
+      else:
+        raster_outputs.append((i, output))
+    if raster_outputs:
+      img = self._draw_tight_image()
+      try:
+        raster_buffers = encoders.encode_many(img, [output for _, output in raster_outputs])
+      finally:
+        img.close()
+      for (i, _), raster_buffer in zip(raster_outputs, raster_buffers):
+        buffers[i] = raster_buffer
+    self.log(f'Chart exported to {len(outputs)} outputs.')
+    return buffers
   
 
+  def _draw_tight_image(self) -> Image.Image:
+    """
+    Draw the figure once at DEFAULT_DPI and crop its pixels to the tight
+    bounding box, as savefig(bbox_inches='tight') frames it. The padding
+    past the figure edges takes the figure background. Figures with artists
+    past their edges (e.g. a legend outside the axes) are rendered by
+    savefig, which extends the canvas to include them.
+    """
+    fig = self._fig
+    original_canvas = fig.canvas
+    original_dpi = fig.dpi
+    canvas = original_canvas if isinstance(original_canvas, FigureCanvasAgg) else FigureCanvasAgg(fig)
+    try:
+      fig.dpi = DEFAULT_DPI
+      canvas.draw()
+      tight_bbox = fig.get_tightbbox(canvas.get_renderer())
+      fig_width, fig_height = fig.get_size_inches()
+      if tight_bbox.x0 >= 0 and tight_bbox.y0 >= 0 and tight_bbox.x1 <= fig_width and tight_bbox.y1 <= fig_height:
+        bbox = tight_bbox.padded(plt.rcParams['savefig.pad_inches'])
+        pixels = np.asarray(canvas.buffer_rgba())
+        # Same size as savefig gives, rows go from the top of the figure.
+        width = int(bbox.width * DEFAULT_DPI)
+        height = int(bbox.height * DEFAULT_DPI)
+        left = int(round(bbox.x0 * DEFAULT_DPI))
+        top = int(round(pixels.shape[0] - bbox.y0 * DEFAULT_DPI)) - height
+        background = np.array(to_rgba(fig.get_facecolor())) * 255
+        cropped = np.empty((height, width, 4), dtype=np.uint8)
+        cropped[:] = background.round().astype(np.uint8)
+        rows = slice(max(top, 0), min(top + height, pixels.shape[0]))
+        cols = slice(max(left, 0), min(left + width, pixels.shape[1]))
+        cropped[rows.start - top:rows.stop - top, cols.start - left:cols.stop - left] = pixels[rows, cols]
+        return Image.fromarray(cropped)
+    finally:
+      fig.dpi = original_dpi
+      if canvas is not original_canvas:
+        fig.set_canvas(original_canvas)
+    # An uncompressed PNG, the cheapest way to get the pixels savefig frames.
+    img_buff = io.BytesIO()
+    fig.savefig(img_buff, format='png', dpi=DEFAULT_DPI, bbox_inches='tight', pil_kwargs={'compress_level': 0})
+    img = Image.open(img_buff)
+    img.load()
+    return img
+
+
   def __del__(self):
     self.log('Free chart.')
     self.close()
@@ -0,0 +1,25 @@
+# Third party
+import cartopy.feature as cfeature
+
+
+def prime_feature_caches(
+  lon_interval: list,
+  lat_interval: list,
+  features: list = None
+) -> None:
+  """
+  Loads the Natural Earth geometries drawn in maps of the given extent, so
+  that charts rendered in parallel share the cached geometries instead of
+  reading (or downloading) the shapefiles at the same time. By default the
+  coastlines and land features are loaded, at the scale that cartopy picks
+  for the extent.
+  """
+  if features is None:
+    features = [cfeature.COASTLINE, cfeature.LAND]
+  extent = list(lon_interval) + list(lat_interval)
+  for feature in features:
+    scaler = getattr(feature, 'scaler', None)
+    if scaler is not None:
+      scaler.scale_from_extent(extent)
+    # cartopy caches the geometries on the first read.
+    feature.geometries()
@@ -0,0 +1,170 @@
+# Standard
+import io
+from pathlib import Path
+# Third party
+from PIL import Image
+
+# zlib strategies for PNG (compress_type). DEFAULT is the choice of Pillow.
+# FILTERED suits images with smooth gradients, RLE and HUFFMAN_ONLY are
+# faster and compress less.
+PNG_STRATEGIES = {
+  'DEFAULT': -1,
+  'FILTERED': 1,
+  'HUFFMAN_ONLY': 2,
+  'RLE': 3,
+  'FIXED': 4
+}
+
+
+class RasterEncoder:
+  """
+  Format and PIL options of a raster output. Charts give the options to
+  savefig as pil_kwargs, so the figure is encoded once with them.
+  """
+  def __init__(self, format: str, **options) -> None:
+    self.format = format.lower()
+    self.options = options
+
+
+  def get_savefig_kwargs(self) -> dict:
+    return {'format': self.format, 'pil_kwargs': dict(self.options)}
+
+
+  def encode(self, img: Image.Image, fp) -> None:
+    """
+    Encode a PIL image (e.g. an already rendered chart) into fp.
+    """
+    if self.format in ['jpeg', 'jpg'] and img.mode not in ['RGB', 'L']:
+      img = img.convert('RGB')
+    img.save(fp, format=self.format.upper().replace('JPG', 'JPEG'), **self.options)
+
+
+  def __repr__(self) -> str:
+    return f'RasterEncoder({self.format!r}, {self.options!r})'
+
+
+def png_encoder(
+  compress_level: int = 6,
+  optimize: bool = False,
+  strategy: str = 'DEFAULT'
+) -> RasterEncoder:
+  """
+  PNG with a zlib compress_level from 0 (none, fastest) to 9 (smallest).
+  optimize=True searches for the smallest output, at a high cost. The
+  strategy is one of PNG_STRATEGIES.
+  """
+  if strategy not in PNG_STRATEGIES:
+    raise RuntimeError(f'PNG strategy "{strategy}" is not supported.')
+  return RasterEncoder(
+    'png',
+    compress_level=compress_level,
+    optimize=optimize,
+    compress_type=PNG_STRATEGIES[strategy])
+
+
+def webp_encoder(
+  quality: int = 80,
+  lossless: bool = False,
+  method: int = 4
+) -> RasterEncoder:
+  """
+  WebP, lossy by default. method goes from 0 (fastest) to 6 (smallest).
+  """
+  return RasterEncoder('webp', quality=quality, lossless=lossless, method=method)
+
+
+def jpeg_encoder(
+  quality: int = 90,
+  optimize: bool = False,
+  progressive: bool = False
+) -> RasterEncoder:
+  """
+  JPEG with quality from 1 to 95. Transparency is lost.
+  """
+  return RasterEncoder('jpeg', quality=quality, optimize=optimize, progressive=progressive)
+
+
+# Encoders by name. PNG is the same output as savefig with no options.
+ENCODERS = {
+  'PNG': png_encoder(),
+  'PNG_FAST': png_encoder(compress_level=1, strategy='RLE'),
+  'PNG_MAX': png_encoder(compress_level=9, optimize=True),
+  'WEBP': webp_encoder(),
+  'WEBP_LOSSLESS': webp_encoder(lossless=True),
+  'JPEG': jpeg_encoder()
+}
+
+
+def get_encoder(encoder: str | RasterEncoder | None) -> RasterEncoder | None:
+  """
+  Resolve an encoder given by name (see ENCODERS). None is kept as None.
+  """
+  if encoder is None or isinstance(encoder, RasterEncoder):
+    return encoder
+  if encoder not in ENCODERS:
+    raise RuntimeError(f'Encoder "{encoder}" is not supported.')
+  return ENCODERS[encoder]
+
+
+def reencode(img_buff: io.BytesIO, encoder: RasterEncoder) -> io.BytesIO:
+  """
+  Decode an image and encode it again with encoder.
+  """
+  out_buff = io.BytesIO()
+  with Image.open(img_buff) as img:
+    encoder.encode(img, out_buff)
+  out_buff.seek(0)
+  return out_buff
+
+
+# Encoders picked by file extension when an output has none.
+EXTENSION_ENCODERS = {
+  'png': 'PNG',
+  'webp': 'WEBP',
+  'jpg': 'JPEG',
+  'jpeg': 'JPEG'
+}
+
+
+def get_encoder_for_path(filepath: str | Path) -> RasterEncoder:
+  extension = Path(filepath).suffix.lower().lstrip('.')
+  if extension not in EXTENSION_ENCODERS:
+    raise RuntimeError(f'No raster encoder for the extension "{extension}".')
+  return ENCODERS[EXTENSION_ENCODERS[extension]]
+
+
+def encode_many(
+  img: Image.Image,
+  outputs: list[dict]
+) -> list[io.BytesIO]:
+  """
+  Encode one image into several outputs. Each output is a dict with:
+    filepath: optional, file where the output is written.
+    encoder: optional, by name or RasterEncoder. By default it is picked
+      by the extension of filepath, or PNG.
+    max_size: optional (width, height) in pixels the image is downscaled
+      to fit in, keeping its aspect ratio.
+
+  Returns a buffer with each output. Every size is resampled once, however
+  many outputs use it.
+  """
+  resized = {None: img}
+  buffers = []
+  for output in outputs:
+    encoder = get_encoder(output.get('encoder'))
+    filepath = output.get('filepath')
+    if encoder is None:
+      encoder = get_encoder_for_path(filepath) if filepath is not None else ENCODERS['PNG']
+    max_size = output.get('max_size')
+    max_size = None if max_size is None else tuple(max_size)
+    if max_size not in resized:
+      thumbnail = img.copy()
+      thumbnail.thumbnail(max_size, Image.Resampling.LANCZOS)
+      resized[max_size] = thumbnail
+    img_buff = io.BytesIO()
+    encoder.encode(resized[max_size], img_buff)
+    img_buff.seek(0)
+    if filepath is not None:
+      Path(filepath).write_bytes(img_buff.getbuffer())
+    buffers.append(img_buff)
+  return buffers
@@ -7,7 +7,7 @@ class ChartInterface:
     raise NotImplementedError('ChartInterface: This is a virtual method.')
 
 
-  def save(self, filepath: str | pathlib.Path) -> None:
+  def save(self, filepath: str | pathlib.Path, encoder = None) -> None:
     raise NotImplementedError('ChartInterface: This is a virtual method.')
 
 
@@ -15,9 +15,13 @@ class ChartInterface:
     raise NotImplementedError('ChartInterface: This is a virtual method.')
 
 
-  def get_buffer(self) -> io.BytesIO:
+  def get_buffer(self, encoder = None) -> io.BytesIO:
     raise NotImplementedError('ChartInterface: This is a virtual method.')
   
 
+  def export(self, outputs: list[dict]) -> list[io.BytesIO]:
+    raise NotImplementedError('ChartInterface: This is a virtual method.')
+
+
   def build(self):
     raise NotImplementedError('ChartInterface: This is a virtual method.')
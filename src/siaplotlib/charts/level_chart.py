@@ -2,9 +2,10 @@ import sys
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 import matplotlib.pyplot as plt
+from matplotlib.artist import Artist
 from siaplotlib.charts import base_chart
+from siaplotlib.charts import resources
 import numpy as np
-import matplotlib.cm as cm
 from windrose import WindroseAxes
 
 
@@ -42,7 +43,7 @@ class WindRose(base_chart.Chart):
 
     ax = WindroseAxes.from_ax()
     ax.bar(self.direction,self.speed, normed=True, opening=1, 
-           edgecolor='white', cmap=getattr(cm, self.color_palette),
+           edgecolor='white', cmap=resources.get_colormap(self.color_palette),
            bins=self.bin_range, nsector = self.nsector)
     ax.set_yticklabels(ax.get_yticklabels(), color='r',fontsize=12)
     ax.set_title(self.title,fontsize = 15)
@@ -76,6 +77,8 @@ class HeatMap(base_chart.Chart):
     title: str, 
     data_label: str = None,
     color_palette: str = 'viridis',
+    rasterize_data: bool = True,
+    raster_dpi: int = base_chart.DEFAULT_DPI,
     build_on_create: bool = True,
     log_stream = sys.stderr,
     verbose: bool = False
@@ -91,6 +94,8 @@ class HeatMap(base_chart.Chart):
     self.vmin = vmin
     self.vmax = vmax
     self.color_palette = color_palette
+    self.rasterize_data = rasterize_data
+    self.raster_dpi = raster_dpi
 
     if build_on_create:
       self.build()
@@ -115,9 +120,9 @@ class HeatMap(base_chart.Chart):
       self.lon_data,
       self.lat_data,
       self.data,
-      vmin=self.vmin,
-      vmax=self.vmax,
-      cmap=self.color_palette)
+      norm=resources.get_norm(vmin=self.vmin, vmax=self.vmax),
+      cmap=resources.get_colormap(self.color_palette),
+      rasterized=self.rasterize_data)
 
     cbar = f.colorbar(im, ax=ax)
     if self.data_label is not None:
@@ -151,6 +156,8 @@ class ContourMap(base_chart.Chart):
     title: str, 
     data_label: str = None,
     color_palette: str = 'viridis', # Not in use.
+    rasterize_data: bool = True,
+    raster_dpi: int = base_chart.DEFAULT_DPI,
     build_on_create: bool =True,
     log_stream = sys.stderr,
     verbose: bool = False
@@ -167,6 +174,8 @@ class ContourMap(base_chart.Chart):
     self.vmax = vmax
     self.num_levels = num_levels
     self.color_palette = color_palette
+    self.rasterize_data = rasterize_data
+    self.raster_dpi = raster_dpi
 
     if build_on_create:
       self.build()
@@ -197,9 +206,14 @@ class ContourMap(base_chart.Chart):
       x, y, z, 
       transform=ccrs.PlateCarree(), 
       levels=np.linspace(self.vmin, self.vmax, self.num_levels), 
-      vmin=self.vmin, 
-      vmax=self.vmax,
-      cmap=self.color_palette)
+      norm=resources.get_norm(vmin=self.vmin, vmax=self.vmax),
+      cmap=resources.get_colormap(self.color_palette))
+    if isinstance(filled_c, Artist):
+      filled_c.set_rasterized(self.rasterize_data)
+    else:
+      # Before matplotlib 3.8 a ContourSet is not an Artist, but a collection per level.
+      for collection in filled_c.collections:
+        collection.set_rasterized(self.rasterize_data)
 
     # Add a colorbar for the filled contour.
     cbar = fig.colorbar(filled_c, ax=ax)
@@ -225,6 +239,8 @@ class VerticalSlice(base_chart.Chart):
 
   lon_interval is a list with [west coord, east coord]
   lat_interval is a list with [south coord, north coord]
+  path_lon and path_lat are the coordinates of the section line drawn on the
+  mini map. If not given, the line goes through lon_interval and lat_interval.
   """
   def __init__(
     self,
@@ -240,6 +256,10 @@ class VerticalSlice(base_chart.Chart):
     y_label: str,
     x_label: str = None,
     color_palette: str = 'plasma',
+    path_lon: np.ndarray = None,
+    path_lat: np.ndarray = None,
+    rasterize_data: bool = True,
+    raster_dpi: int = base_chart.DEFAULT_DPI,
     build_on_create: bool = True,
     log_stream = sys.stderr,
     verbose=False
@@ -257,6 +277,10 @@ class VerticalSlice(base_chart.Chart):
     self.y_label = y_label
     self.x_label = x_label
     self.color_palette = color_palette
+    self.path_lon = path_lon
+    self.path_lat = path_lat
+    self.rasterize_data = rasterize_data
+    self.raster_dpi = raster_dpi
 
     if build_on_create:
       self.build()
@@ -275,9 +299,9 @@ class VerticalSlice(base_chart.Chart):
       self.x_values,
       self.y_values,
       self.z_values,
-      vmin=self.vmin,
-      vmax=self.vmax,
-      cmap=self.color_palette)                                            # display the temperature
+      norm=resources.get_norm(vmin=self.vmin, vmax=self.vmax),
+      cmap=resources.get_colormap(self.color_palette),
+      rasterized=self.rasterize_data)                                     # display the temperature
     cbar = f.colorbar(im,ax=ax)                                           # add the colorbar
     cbar.set_label(self.z_label)                                    # add the title of the colorbar
 
@@ -290,7 +314,10 @@ class VerticalSlice(base_chart.Chart):
     ax_mini_map.set_extent(
       self.lon_interval + self.lat_interval,
       crs=ccrs.PlateCarree())                                                        # define the extent of the map [lon_min,lon_max,lat_min,lat_max]
-    ax_mini_map.plot(self.lon_interval,self.lat_interval,'r')                        # add the location of the line on the mini map
+    if self.path_lon is not None and self.path_lat is not None:
+      ax_mini_map.plot(self.path_lon, self.path_lat, 'r')                            # add the path of the section on the mini map
+    else:
+      ax_mini_map.plot(self.lon_interval,self.lat_interval,'r')                      # add the location of the line on the mini map
     self._fig = f
 
     self.log('Image created.')
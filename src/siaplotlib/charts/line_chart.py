@@ -9,12 +9,23 @@ import xarray as xr
 import numpy as np
 # Own
 from siaplotlib.charts import base_chart
+from siaplotlib.charts import resources
+from siaplotlib.processing import computations
+from siaplotlib.processing import wrangling
 
 
 class ArrowChart(base_chart.Chart):
   """
   Create an ArrowChart.
+
+  grouping_level is the stride used to thin the vectors. When it is 'AUTO',
+  the stride is picked from the figure size and the rendering DPI so that
+  arrows are at least min_arrow_spacing_px pixels apart and, if given, no more
+  than target_arrows are drawn. With block_average=True, the vectors are
+  averaged over each block instead of being sub-sampled.
   """
+  FIGSIZE = (4, 6)
+
   def __init__(
     self,
     dataset: xr.Dataset, 
@@ -25,7 +36,10 @@ class ArrowChart(base_chart.Chart):
     northward_var_name: str,
     lat_dim_name: str,
     lon_dim_name: str,
-    grouping_level: str,
+    grouping_level: int | str,
+    target_arrows: int = None,
+    min_arrow_spacing_px: float = 60,
+    block_average: bool = False,
     build_on_create: bool = True,
     log_stream = sys.stderr,
     verbose: bool = False
@@ -38,6 +52,9 @@ class ArrowChart(base_chart.Chart):
     self.lat_dim_name = lat_dim_name
     self.lon_dim_name = lon_dim_name
     self.grouping_level = grouping_level
+    self.target_arrows = target_arrows
+    self.min_arrow_spacing_px = min_arrow_spacing_px
+    self.block_average = block_average
     self.data_label = data_label
 
 
@@ -47,23 +64,54 @@ class ArrowChart(base_chart.Chart):
       self.build()
 
 
+  def get_strides(self) -> tuple[int, int]:
+    """
+    Get the (lat, lon) strides used to thin the vectors.
+    """
+    if self.grouping_level != 'AUTO':
+      return self.grouping_level, self.grouping_level
+    grid_shape = (
+      len(self.dataset[self.lat_dim_name]),
+      len(self.dataset[self.lon_dim_name]))
+    return computations.calc_arrow_strides(
+      grid_shape=grid_shape,
+      figsize=self.FIGSIZE,
+      dpi=base_chart.DEFAULT_DPI,
+      min_arrow_spacing_px=self.min_arrow_spacing_px,
+      target_arrows=self.target_arrows)
+
+
   def build(self):
     self.close()
 
     data = self.dataset
-    grp = self.grouping_level
-
-    vo = data[self.northward_var_name]
-    uo = data[self.eastward_var_name]
-
-    lon = data[self.lon_dim_name][::grp]
-    lat = data[self.lat_dim_name][::grp]
-
-    fig = plt.figure(figsize=(4, 6))
+    lat_grp, lon_grp = self.get_strides()
+    self.log(f'Arrow strides (lat, lon): ({lat_grp}, {lon_grp})')
+
+    vo = data[self.northward_var_name].data
+    uo = data[self.eastward_var_name].data
+    speed = self.speed
+
+    if self.block_average:
+      lon = wrangling.block_average(
+        data[self.lon_dim_name].data[np.newaxis, :], 1, lon_grp)[0]
+      lat = wrangling.block_average(
+        data[self.lat_dim_name].data[:, np.newaxis], lat_grp, 1)[:, 0]
+      uo = wrangling.block_average(uo, lat_grp, lon_grp)
+      vo = wrangling.block_average(vo, lat_grp, lon_grp)
+      speed = wrangling.block_average(speed, lat_grp, lon_grp)
+    else:
+      lon = data[self.lon_dim_name].data[::lon_grp]
+      lat = data[self.lat_dim_name].data[::lat_grp]
+      uo = uo[::lat_grp, ::lon_grp]
+      vo = vo[::lat_grp, ::lon_grp]
+      speed = speed[::lat_grp, ::lon_grp]
+
+    fig = plt.figure(figsize=self.FIGSIZE)
     ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
 
-    cmap = plt.cm.rainbow
-    im = ax.quiver(lon,lat, uo[::grp,::grp], vo[::grp,::grp], self.speed[::grp,::grp], cmap=cmap, transform=ccrs.PlateCarree(), pivot='tail')
+    cmap = resources.get_colormap('rainbow')
+    im = ax.quiver(lon, lat, uo, vo, speed, cmap=cmap, transform=ccrs.PlateCarree(), pivot='tail')
 
     ax.coastlines()
     ax.add_feature(cfeature.LAND, facecolor='lightgray')
@@ -82,6 +130,8 @@ class RegionMap(base_chart.Chart):
   """
   Create the region map.
   """
+  FIGSIZE = (10, 6)
+
   def __init__(
     self,
     amplitude: float,
@@ -107,7 +157,7 @@ class RegionMap(base_chart.Chart):
     self.close()
 
     # Crear una figura y un objeto de proyección del mapa
-    fig = plt.figure(figsize=(10, 6))
+    fig = plt.figure(figsize=self.FIGSIZE)
     ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
 
     amp = self.amplitude
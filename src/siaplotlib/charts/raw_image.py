@@ -1,61 +1,183 @@
 # Standard
 import io
 import sys
+import shutil
 from pathlib import Path
 # Third party
 from PIL import Image
 # Own
 import siaplotlib.charts.interfaces as chart_interfaces
 from siaplotlib.utils.log import LoggingFeatures
+from siaplotlib.utils.buffers import SpillableBuffer, ReadOnlyBuffer
+from siaplotlib.charts import encoders
 
 
 class RawImage(chart_interfaces.ChartInterface, LoggingFeatures):
+  """
+  An already rendered image, from a buffer or a file.
+
+  Files are decoded and encoded again in the format given by their
+  extension. With passthrough=True they are used as they are instead: the
+  buffer is a memory map of the file, save() is a file copy, and
+  get_image() gives a lazy PIL view that decodes the pixels when they are
+  accessed.
+  """
   def __init__(
     self,
     img_source,
+    passthrough: bool = False,
     log_stream = sys.stderr,
     verbose: bool = False
   ) -> None:
     LoggingFeatures.__init__(self, log_stream=log_stream, verbose=verbose)
     self._img_buff = None
     self._img_path = None
-    if type(img_source) is io.BytesIO:
+    self._img = None
+    if isinstance(img_source, (io.BytesIO, SpillableBuffer)):
       # Just asign the buffer
       self._img_buff = img_source
       self.log('Setting image buffer')
     elif type(img_source) is str or type(img_source) is Path or issubclass(type(img_source), Path):
-      # Read from disk and convert to a buffered stream.
-      filepath = img_source
-      self._img_buff = io.BytesIO()
-      fname_splited = str(filepath).split('.')
-      file_format = fname_splited[-1].lower()
-      if len(fname_splited) == 1:
-        self.log(f'No extension found when trying to load image: {filepath}')
-        file_format = 'png'
-        self.log(f'Using defaul format: {file_format}')
-      img = Image.open(filepath)
-      img.save(self._img_buff, format=file_format.upper())
-      img.close()
+      if passthrough:
+        # Read from disk when needed, as it is.
+        self._img_path = Path(img_source)
+        if not self._img_path.is_file():
+          raise FileNotFoundError(f'No such image file: {self._img_path}')
+        self.log(f'Using image file: {self._img_path}')
+      else:
+        # Read from disk and convert to a buffered stream.
+        filepath = img_source
+        self._img_buff = io.BytesIO()
+        fname_splited = str(filepath).split('.')
+        file_format = fname_splited[-1].lower()
+        if len(fname_splited) == 1:
+          self.log(f'No extension found when trying to load image: {filepath}')
+          file_format = 'png'
+          self.log(f'Using defaul format: {file_format}')
+        img = Image.open(filepath)
+        img.save(self._img_buff, format=file_format.upper())
+        img.close()
     else:
-      raise RuntimeError(f'img_source is {type(img_source)} and must be: BytesIO | Path | str')
+      raise RuntimeError(f'img_source is {type(img_source)} and must be: BytesIO | SpillableBuffer | Path | str')
   
 
-  def get_buffer(self):
+  def get_buffer(self, encoder: str | encoders.RasterEncoder = None):
+    """
+    Get the image as it is or, if an encoder is given, encoded again with it
+    (animations are always kept as they are). Images used from a file give
+    a new reader over its memory map on each call, owned by the caller: it
+    stays valid after the image is closed.
+    """
+    encoder = encoders.get_encoder(encoder)
+    if encoder is not None and not self.is_animated():
+      return encoders.reencode(self._open_stream(), encoder)
+    img_buff = self._get_source_buffer()
+    if isinstance(img_buff, ReadOnlyBuffer):
+      return ReadOnlyBuffer(img_buff.getbuffer())
+    return img_buff
+
+
+  def _get_source_buffer(self) -> io.BytesIO | SpillableBuffer | ReadOnlyBuffer:
+    if self._img_buff is None and self._img_path is not None:
+      # The original bytes, read from the file as they are used.
+      self._img_buff = ReadOnlyBuffer.map_file(self._img_path)
     return self._img_buff
+
+
+  def _open_stream(self) -> io.BytesIO | ReadOnlyBuffer:
+    """
+    Get a stream of its own over the image, so reading it does not move the
+    position of the buffer. The content is shared, not copied.
+    """
+    img_buff = self._get_source_buffer()
+    if isinstance(img_buff, io.BytesIO):
+      # Shares the bytes until either one is written.
+      return io.BytesIO(img_buff.getvalue())
+    return ReadOnlyBuffer(img_buff.getbuffer())
+
+
+  def export(self, outputs: list[dict]) -> list[io.BytesIO]:
+    """
+    Decode the image once and encode it into several outputs (see
+    encoders.encode_many). Animations are not supported.
+    """
+    if self.is_animated():
+      raise RuntimeError('Animated images can not be exported, save them instead.')
+    img = self.get_image()
+    img.load()
+    return encoders.encode_many(img, outputs)
+
+
+  def is_animated(self) -> bool:
+    return getattr(self.get_image(), 'n_frames', 1) > 1
+
+
+  def get_image(self) -> Image.Image:
+    """
+    Get a PIL view of the image. Only the header is read until the pixels
+    are accessed. It is closed with the RawImage.
+    """
+    if self._img is None:
+      if self._img_path is not None:
+        self._img = Image.open(self._img_path)
+      else:
+        self._img = Image.open(self._open_stream())
+    return self._img
   
 
   def close(self) -> None:
     self.log('Dropping image buffer reference.')
+    if self._img is not None:
+      self._img.close()
+      self._img = None
+    if isinstance(self._img_buff, ReadOnlyBuffer):
+      # The memory map of the file, kept alive by the readers given by
+      # get_buffer until they are closed.
+      self._img_buff.close()
     self._img_buff = None
+    self._img_path = None
   
 
+  def __copy__(self):
+    # The copies share the image source, each one opens its own PIL view.
+    image_copy = self.__class__.__new__(self.__class__)
+    image_copy.__dict__.update(self.__dict__)
+    image_copy._img = None
+    if isinstance(self._img_buff, ReadOnlyBuffer):
+      # Maps the file again when needed, each image closes its own map.
+      image_copy._img_buff = None
+    return image_copy
+
+
   def save(
     self,
-    filepath: str | Path
+    filepath: str | Path,
+    encoder: str | encoders.RasterEncoder = None
   ) -> None:
+    """
+    Write the image as it is or, if an encoder is given, encoded again with
+    it (animations are always written as they are).
+    """
     self.log('Saving image buffer to a file. Be aware that no extension will be assumed.')
-    with open(filepath, "wb") as f:
-      f.write(self.get_buffer().getbuffer())
+    encoder = encoders.get_encoder(encoder)
+    if encoder is not None and not self.is_animated():
+      with open(filepath, 'wb') as f:
+        encoder.encode(self.get_image(), f)
+      self.log(f'Image saved in: {filepath}')
+      return
+    if self._img_path is not None:
+      # Files are copied as they are.
+      if not (Path(filepath).exists() and Path(filepath).samefile(self._img_path)):
+        shutil.copyfile(self._img_path, filepath)
+      self.log(f'Image saved in: {filepath}')
+      return
+    img_buff = self._get_source_buffer()
+    if isinstance(img_buff, SpillableBuffer):
+      # Spilled buffers are copied file to file.
+      img_buff.save_to(filepath)
+    else:
+      with open(filepath, "wb") as f:
+        f.write(img_buff.getbuffer())
     self.log(f'Image saved in: {filepath}')
 
 
@@ -68,11 +190,13 @@ class ChartImage(RawImage):
     lon_interval=[], 
     lat_interval=[],
     var_label=None,
+    passthrough: bool = False,
     log_stream = sys.stderr,
     verbose=False
   ) -> None:
     super().__init__(
       img_source=img_source,
+      passthrough=passthrough,
       log_stream=log_stream,
       verbose=verbose)
     self.var_name = var_name
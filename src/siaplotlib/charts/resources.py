@@ -0,0 +1,107 @@
+# Standard
+import io
+import functools
+# Third party
+import numpy as np
+import matplotlib
+from matplotlib.cm import ScalarMappable
+from matplotlib.colors import Colormap, Normalize, BoundaryNorm
+from matplotlib.figure import Figure
+# Own
+from siaplotlib.charts import base_chart
+
+# Size in inches of the colorbar images (width, height).
+COLORBAR_FIGSIZE = (1.2, 4.8)
+
+
+@functools.lru_cache(maxsize=64)
+def get_colormap(color_palette: str = None) -> Colormap:
+  """
+  Resolve a colormap by name once. None gives the matplotlib default, as
+  when cmap=None is passed to a plot. The colormap is shared by all the
+  charts that ask for it, so it must not be modified.
+  """
+  if color_palette is None:
+    color_palette = matplotlib.rcParams['image.cmap']
+  return matplotlib.colormaps[color_palette]
+
+
+def _make_norm(vmin: float, vmax: float, levels: tuple[float, ...] | None, ncolors: int) -> Normalize:
+  if levels is None:
+    return Normalize(vmin=vmin, vmax=vmax)
+  return BoundaryNorm(boundaries=list(levels), ncolors=ncolors)
+
+
+_get_norm = functools.lru_cache(maxsize=256)(_make_norm)
+
+
+def get_norm(
+  vmin: float,
+  vmax: float,
+  levels: list[float] | np.ndarray = None,
+  ncolors: int = 256
+) -> Normalize:
+  """
+  Get a Normalize from vmin to vmax or, if levels are given, a BoundaryNorm
+  over them (with ncolors colors). Charts on the same scale (e.g. the
+  frames of an animation) share the same object, so it must not be
+  modified. Colorbars only change the limits of a Normalize when they are
+  missing, equal or not finite, so those scales get a new one each time.
+  """
+  if levels is None:
+    if vmin is None or vmax is None or not np.isfinite([vmin, vmax]).all() or vmin >= vmax:
+      return _make_norm(vmin, vmax, levels, ncolors)
+  if levels is not None:
+    levels = tuple(float(level) for level in levels)
+  return _get_norm(float(vmin), float(vmax), levels, ncolors)
+
+
+@functools.lru_cache(maxsize=64)
+def _render_colorbar(
+  color_palette: str | None,
+  vmin: float,
+  vmax: float,
+  levels: tuple[float, ...] | None,
+  label: str | None,
+  dpi: int
+) -> bytes:
+  cmap = get_colormap(color_palette)
+  # A norm of its own, the colorbar may adjust its limits.
+  norm = _make_norm(vmin, vmax, levels, cmap.N)
+  # A Figure without pyplot, so it can be rendered from any thread.
+  fig = Figure(figsize=COLORBAR_FIGSIZE)
+  cax = fig.add_axes([0.1, 0.05, 0.2, 0.9])
+  cbar = fig.colorbar(ScalarMappable(norm=norm, cmap=cmap), cax=cax)
+  if label is not None:
+    cbar.set_label(label)
+  img_buff = io.BytesIO()
+  fig.savefig(img_buff, format='png', dpi=dpi, bbox_inches='tight', transparent=True)
+  return img_buff.getvalue()
+
+
+def get_colorbar_image(
+  color_palette: str | None,
+  vmin: float,
+  vmax: float,
+  levels: list[float] | np.ndarray = None,
+  label: str = None,
+  dpi: int = base_chart.DEFAULT_DPI
+) -> bytes:
+  """
+  Get a PNG image of a standalone colorbar for the scale, for outputs with
+  no figure of their own (e.g. tile pyramids). It is rendered once for each
+  scale and reused by the outputs that share it.
+  """
+  if levels is not None:
+    levels = tuple(float(level) for level in levels)
+  return _render_colorbar(color_palette, float(vmin), float(vmax), levels, label, dpi)
+
+
+def clear() -> None:
+  """
+  Drop all the cached resources, e.g. after registering a colormap with a
+  name already used.
+  """
+  get_colormap.cache_clear()
+  _get_norm.cache_clear()
+  _render_colorbar.cache_clear()
@@ -0,0 +1,241 @@
+# Standard
+import io
+import os
+import sys
+import json
+import hashlib
+import zipfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+# Third party
+import numpy as np
+from PIL import Image
+# Own
+from siaplotlib.charts.interfaces import ChartInterface
+from siaplotlib.charts import resources
+from siaplotlib.charts import encoders
+from siaplotlib.processing import tiling
+from siaplotlib.utils.log import LoggingFeatures
+
+
+class HeatMapTiles(ChartInterface, LoggingFeatures):
+  """
+  Render a heat map as a pyramid of Web-Mercator XYZ tiles stored as
+  '{zoom}/{x}/{y}.png'. Colours are given by vmin and vmax, so tiles of
+  different zoom levels match. Tiles with no valid values (empty or all-land)
+  are skipped. Tiles are rendered in parallel. The colorbar of the scale is
+  written with them as 'colorbar.png', and a key of the data and options as
+  'pyramid.json'. When saving again over a pyramid with the same key, tiles
+  that already exist are not rendered again (unless skip_existing=False);
+  with a different key, every tile is written again.
+
+  data is a 2-D array with shape (length(lat_data), length(lon_data))
+  """
+  def __init__(
+    self,
+    data: np.ndarray,
+    lon_data: np.ndarray,
+    lat_data: np.ndarray,
+    vmin: float,
+    vmax: float,
+    zoom_levels: list[int],
+    color_palette: str = 'viridis',
+    tile_size: int = 256,
+    max_workers: int = None,
+    skip_existing: bool = True,
+    log_stream = sys.stderr,
+    verbose: bool = False
+  ) -> None:
+    LoggingFeatures.__init__(self, log_stream=log_stream, verbose=verbose)
+    self.data = np.asarray(data)
+    self.lon_data = np.asarray(lon_data)
+    self.lat_data = np.asarray(lat_data)
+    self.vmin = vmin
+    self.vmax = vmax
+    self.zoom_levels = zoom_levels
+    self.color_palette = color_palette
+    self.tile_size = tile_size
+    self.max_workers = max_workers
+    self.skip_existing = skip_existing
+
+
+  def get_tiles(self) -> list[tuple[int, int, int]]:
+    """
+    Get the (zoom, x, y) tiles that intersect the extent of the data.
+    """
+    lon_interval = [float(np.nanmin(self.lon_data)), float(np.nanmax(self.lon_data))]
+    lat_interval = [float(np.nanmin(self.lat_data)), float(np.nanmax(self.lat_data))]
+    tiles = []
+    for zoom in sorted(set(self.zoom_levels)):
+      tiles += tiling.tiles_for_extent(lon_interval, lat_interval, zoom)
+    return tiles
+
+
+  def render_tile(
+    self,
+    zoom: int,
+    x: int,
+    y: int
+  ) -> Image.Image | None:
+    """
+    Render a tile with a nearest-neighbour resampling of the data. Returns
+    None if the tile has no valid values.
+    """
+    lon_pixels, lat_pixels = tiling.tile_pixel_coords(zoom, x, y, self.tile_size)
+    lon_idx, lon_inside = tiling.nearest_indices(self.lon_data, lon_pixels)
+    lat_idx, lat_inside = tiling.nearest_indices(self.lat_data, lat_pixels)
+    if not lon_inside.any() or not lat_inside.any():
+      return None
+    values = self.data[np.ix_(lat_idx, lon_idx)].astype(float)
+    valid = ~np.isnan(values) & lat_inside[:, np.newaxis] & lon_inside[np.newaxis, :]
+    if not valid.any():
+      return None
+    cmap = resources.get_colormap(self.color_palette)
+    norm = resources.get_norm(vmin=self.vmin, vmax=self.vmax)
+    rgba = cmap(norm(np.where(valid, values, self.vmin)), bytes=True)
+    rgba[..., 3] = np.where(valid, rgba[..., 3], 0)
+    return Image.fromarray(rgba)
+
+
+  def get_colorbar(self) -> bytes:
+    """
+    Get a PNG image of the colorbar shared by all the tiles.
+    """
+    return resources.get_colorbar_image(
+      color_palette=self.color_palette,
+      vmin=self.vmin,
+      vmax=self.vmax)
+
+
+  def _get_png_options(self, encoder: str | encoders.RasterEncoder | None) -> dict:
+    # Tiles are always PNG, only its options can be changed.
+    encoder = encoders.get_encoder(encoder)
+    if encoder is None:
+      return {}
+    if encoder.format != 'png':
+      raise RuntimeError(f'Tiles are written as PNG, the encoder format "{encoder.format}" is not supported.')
+    return encoder.options
+
+
+  def get_pyramid_key(self, png_options: dict = {}) -> str:
+    """
+    Get a digest of everything the tiles depend on.
+    """
+    digest = hashlib.sha256()
+    for values in [self.data, self.lon_data, self.lat_data]:
+      values = np.ascontiguousarray(values)
+      digest.update(f'{values.dtype}|{values.shape}'.encode())
+      digest.update(values.tobytes())
+    digest.update(json.dumps([
+      float(self.vmin), float(self.vmax), str(self.color_palette), self.tile_size,
+      sorted((key, repr(value)) for key, value in png_options.items())]).encode())
+    return digest.hexdigest()
+
+
+  def _write_tile(
+    self,
+    dirpath: Path,
+    tile: tuple[int, int, int],
+    png_options: dict = {},
+    skip_existing: bool = False
+  ) -> bool:
+    zoom, x, y = tile
+    tile_path = Path(dirpath, str(zoom), str(x), f'{y}.png')
+    if skip_existing and tile_path.exists():
+      return False
+    img = self.render_tile(zoom, x, y)
+    if img is None:
+      # A tile left by a pyramid of other data.
+      tile_path.unlink(missing_ok=True)
+      return False
+    tile_path.parent.mkdir(parents=True, exist_ok=True)
+    # Written on a temporary file first so readers never see partial tiles.
+    tmp_path = tile_path.with_name(f'.{y}.png.{os.getpid()}.tmp')
+    img.save(tmp_path, format='PNG', **png_options)
+    os.replace(tmp_path, tile_path)
+    return True
+
+
+  def save(
+    self,
+    dirpath: str | Path,
+    encoder: str | encoders.RasterEncoder = None
+  ) -> None:
+    """
+    Write the tile pyramid in the directory as '{zoom}/{x}/{y}.png'. A PNG
+    encoder (see encoders.png_encoder) sets the compression of the tiles.
+    """
+    png_options = self._get_png_options(encoder)
+    Path(dirpath).mkdir(parents=True, exist_ok=True)
+    key_path = Path(dirpath, 'pyramid.json')
+    pyramid_key = self.get_pyramid_key(png_options)
+    skip_existing = False
+    if self.skip_existing and key_path.exists():
+      skip_existing = json.loads(key_path.read_text()).get('key') == pyramid_key
+    # Removed while tiles are replaced, so an interrupted pass is not reused.
+    key_path.unlink(missing_ok=True)
+    tiles = list(dict.fromkeys(self.get_tiles())) # Unique, keeping order.
+    self.log(f'Rendering {len(tiles)} candidate tiles.')
+    with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+      written = list(executor.map(
+        lambda tile: self._write_tile(dirpath, tile, png_options, skip_existing),
+        tiles))
+    self.log(f'Tiles written: {sum(written)}. Tiles skipped: {len(written) - sum(written)}.')
+    Path(dirpath, 'colorbar.png').write_bytes(self.get_colorbar())
+    key_path.write_text(json.dumps({'key': pyramid_key}))
+    self.log(f'Tile pyramid saved in: {dirpath}')
+
+
+  def get_buffer(
+    self,
+    encoder: str | encoders.RasterEncoder = None
+  ) -> io.BytesIO:
+    """
+    Get a zip archive with the tile pyramid.
+    """
+    png_options = self._get_png_options(encoder)
+    tiles = list(dict.fromkeys(self.get_tiles()))
+    with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+      images = list(executor.map(lambda tile: self.render_tile(*tile), tiles))
+    zip_buff = io.BytesIO()
+    with zipfile.ZipFile(zip_buff, 'w', compression=zipfile.ZIP_STORED) as zip_file:
+      for (zoom, x, y), img in zip(tiles, images):
+        if img is None:
+          continue
+        tile_buff = io.BytesIO()
+        img.save(tile_buff, format='PNG', **png_options)
+        zip_file.writestr(f'{zoom}/{x}/{y}.png', tile_buff.getvalue())
+      zip_file.writestr('colorbar.png', self.get_colorbar())
+    zip_buff.seek(0)
+    return zip_buff
+
+
+  def get_preview(self) -> Image.Image:
+    """
+    Get a mosaic of the tiles of the lowest zoom level.
+    """
+    zoom = min(self.zoom_levels)
+    tiles = [tile for tile in dict.fromkeys(self.get_tiles()) if tile[0] == zoom]
+    x_min = min(x for _, x, _ in tiles)
+    y_min = min(y for _, _, y in tiles)
+    width = (max(x for _, x, _ in tiles) - x_min + 1) * self.tile_size
+    height = (max(y for _, _, y in tiles) - y_min + 1) * self.tile_size
+    preview = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    for _, x, y in tiles:
+      img = self.render_tile(zoom, x, y)
+      if img is not None:
+        preview.paste(img, ((x - x_min) * self.tile_size, (y - y_min) * self.tile_size))
+    return preview
+
+
+  def plot(self) -> None:
+    self.get_preview().show()
+
+
+  def close(self) -> None:
+    self.log('Dropping tile data references.')
+    self.data = None
+
+
+  def build(self):
+    return self
@@ -38,3 +38,57 @@ def max(
   except:
     pass
   return vmax
+
+def min_max(
+  dataset: xr.DataArray,
+  rounding_precision: int = -1,
+  stats_index = None,
+  var: str = None,
+  dim_constraints: dict[str, slice|list] = {}
+) -> tuple[float, float]:
+  """
+  Get the valid minimum and maximum values of a variable. If a StatsIndex
+  (see stats_index.StatsIndex) is given, they are taken from the values
+  indexed for var within dim_constraints. If the box cuts index blocks of
+  the map, only the cells of dataset in those blocks are scanned. Otherwise,
+  or if the index cannot answer that query, they are computed from
+  dataset as min and max do.
+  """
+  stats = None
+  if stats_index is not None and var is not None:
+    stats = stats_index.query(var_name=var, dim_constraints=dim_constraints)
+  if stats is not None and not stats['exact']:
+    stats = _min_max_with_edges(dataset, stats_index, var, dim_constraints)
+  if stats is None:
+    return (
+      min(dataset=dataset, rounding_precision=rounding_precision),
+      max(dataset=dataset, rounding_precision=rounding_precision))
+  vmin, vmax = stats['min'], stats['max']
+  if rounding_precision >= 0:
+    vmin = float(np.round(vmin, rounding_precision))
+    vmax = float(np.round(vmax, rounding_precision))
+  return vmin, vmax
+
+def _min_max_with_edges(
+  dataset: xr.DataArray,
+  stats_index,
+  var: str,
+  dim_constraints: dict[str, slice|list]
+) -> dict[str, float] | None:
+  """
+  Combine the indexed min and max of the blocks inside the box with those
+  of the cells of dataset in the blocks it cuts. Returns None if dataset
+  is not the box of dim_constraints (e.g. a map dimension was squeezed).
+  """
+  edge_cells = stats_index.get_edge_cells(dim_constraints)
+  for dim, is_edge in edge_cells.items():
+    if dim not in dataset.dims or dataset.sizes[dim] != is_edge.size:
+      return None
+  stats = stats_index.query(var_name=var, dim_constraints=dim_constraints, whole_blocks_only=True)
+  mins, maxs = [stats['min']], [stats['max']]
+  for dim, is_edge in edge_cells.items():
+    edge = dataset.isel({dim: np.flatnonzero(is_edge)})
+    mins.append(float(edge.min()))
+    maxs.append(float(edge.max()))
+  # NaN (no valid values) only where all the parts have none.
+  return {'min': float(np.fmin.reduce(mins)), 'max': float(np.fmax.reduce(maxs))}
@@ -0,0 +1,202 @@
+# Standard
+import os
+from pathlib import Path
+from collections import OrderedDict
+from threading import Lock, get_ident
+
+
+class MemoryLRU:
+  """
+  Thread-safe LRU mapping bounded by the total bytes of its values, given
+  by nbytes when they are put. Values larger than max_bytes are not kept.
+  """
+  def __init__(self, max_bytes: int) -> None:
+    self.max_bytes = max_bytes
+    self.__lock = Lock()
+    self.__entries: OrderedDict[str, tuple[any, int]] = OrderedDict()
+    self.__total_bytes = 0
+
+
+  def get(self, key: str):
+    with self.__lock:
+      entry = self.__entries.get(key)
+      if entry is None:
+        return None
+      self.__entries.move_to_end(key)
+      return entry[0]
+
+
+  def put(self, key: str, value, nbytes: int) -> None:
+    if nbytes > self.max_bytes:
+      return
+    with self.__lock:
+      previous = self.__entries.pop(key, None)
+      if previous is not None:
+        self.__total_bytes -= previous[1]
+      self.__entries[key] = (value, nbytes)
+      self.__total_bytes += nbytes
+      while self.__total_bytes > self.max_bytes:
+        _, (_, evicted_bytes) = self.__entries.popitem(last=False)
+        self.__total_bytes -= evicted_bytes
+
+
+  def usage(self) -> int:
+    with self.__lock:
+      return self.__total_bytes
+
+
+  def clear(self) -> None:
+    with self.__lock:
+      self.__entries.clear()
+      self.__total_bytes = 0
+
+
+class ChartCache:
+  """
+  Cache of rendered charts (image bytes) by key, with an in-memory LRU tier
+  bounded by memory_max_bytes and an optional on-disk tier in disk_dir
+  bounded by disk_max_bytes, where the least recently used files are
+  removed first. Disk hits are promoted to memory. It is thread-safe, and
+  when sent to a worker process only the disk tier goes with it.
+  """
+  def __init__(
+    self,
+    memory_max_bytes: int = 256 * 1024 ** 2,
+    disk_dir: str | Path = None,
+    disk_max_bytes: int = 2 * 1024 ** 3
+  ) -> None:
+    self.memory_max_bytes = memory_max_bytes
+    self.disk_dir = None if disk_dir is None else Path(disk_dir)
+    self.disk_max_bytes = disk_max_bytes
+    self.__memory = MemoryLRU(max_bytes=memory_max_bytes)
+    if self.disk_dir is not None:
+      self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+
+  def _get_disk_path(self, key: str) -> Path:
+    return Path(self.disk_dir, f'{key}.img')
+
+
+  def get(self, key: str) -> bytes | None:
+    data = self.__memory.get(key)
+    if data is not None:
+      return data
+    if self.disk_dir is None:
+      return None
+    disk_path = self._get_disk_path(key)
+    try:
+      data = disk_path.read_bytes()
+      # Marks the file as recently used.
+      os.utime(disk_path)
+    except FileNotFoundError:
+      return None
+    self.__memory.put(key, data, len(data))
+    return data
+
+
+  def put(self, key: str, data: bytes) -> None:
+    self.__memory.put(key, data, len(data))
+    if self.disk_dir is not None and len(data) <= self.disk_max_bytes:
+      disk_path = self._get_disk_path(key)
+      # Written on a temporary file first so readers never see partial images.
+      tmp_path = disk_path.with_name(f'.{key}.{os.getpid()}.{get_ident()}.tmp')
+      tmp_path.write_bytes(data)
+      os.replace(tmp_path, disk_path)
+      self._evict_from_disk()
+
+
+  def _evict_from_disk(self) -> None:
+    # Listed every time since other processes may share the directory.
+    entries = []
+    for path in self.disk_dir.glob('*.img'):
+      try:
+        stat = path.stat()
+      except FileNotFoundError:
+        continue
+      entries.append((stat.st_mtime, stat.st_size, path))
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+      if total_bytes <= self.disk_max_bytes:
+        break
+      path.unlink(missing_ok=True)
+      total_bytes -= size
+
+
+  def memory_usage(self) -> int:
+    return self.__memory.usage()
+
+
+  def clear(self) -> None:
+    self.__memory.clear()
+    if self.disk_dir is not None:
+      for path in self.disk_dir.glob('*.img'):
+        path.unlink(missing_ok=True)
+
+
+  def __getstate__(self):
+    return {
+      'memory_max_bytes': self.memory_max_bytes,
+      'disk_dir': self.disk_dir,
+      'disk_max_bytes': self.disk_max_bytes
+    }
+
+
+  def __setstate__(self, state):
+    self.__init__(**state)
+
+
+class SubsetCache:
+  """
+  In-memory LRU of the subsets made by wrangling.slice_dice, bounded by
+  their size in bytes (max_bytes). Subsets are stored loaded, so a hit
+  needs no selection nor reading.
+  """
+  def __init__(self, max_bytes: int = 512 * 1024 ** 2) -> None:
+    self.max_bytes = max_bytes
+    self.__memory = MemoryLRU(max_bytes=max_bytes)
+
+
+  def get(self, key: str):
+    return self.__memory.get(key)
+
+
+  def put(self, key: str, subset) -> None:
+    self.__memory.put(key, subset, subset.nbytes)
+
+
+  def memory_usage(self) -> int:
+    return self.__memory.usage()
+
+
+  def clear(self) -> None:
+    self.__memory.clear()
+
+
+_default_cache: ChartCache = None
+_default_subset_cache: SubsetCache = None
+
+
+def set_default_cache(cache: ChartCache | None) -> None:
+  """
+  Set the cache used by the chart builders that have none of their own.
+  Set it to None to disable caching.
+  """
+  global _default_cache
+  _default_cache = cache
+
+
+def get_default_cache() -> ChartCache | None:
+  return _default_cache
+
+
+def set_default_subset_cache(cache: SubsetCache | None) -> None:
+  """
+  Set the cache used by wrangling.slice_dice when none is given.
+  Set it to None to disable it.
+  """
+  global _default_subset_cache
+  _default_subset_cache = cache
+
+
+def get_default_subset_cache() -> SubsetCache | None:
+  return _default_subset_cache
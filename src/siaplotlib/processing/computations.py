@@ -53,3 +53,146 @@ def corr_cord(
     dataset: np.ndarray 
     ) -> np.ndarray :
     return xr.where(dataset < 0, dataset + 360, dataset)
+
+def calc_arrow_strides(
+    grid_shape: tuple[int, int],
+    figsize: tuple[float, float],
+    dpi: float,
+    min_arrow_spacing_px: float = 60,
+    target_arrows: int = None
+    ) -> tuple[int, int] :
+    """
+    Get the (y, x) strides to thin a 2-D grid of vectors so the arrows drawn
+    fit in a figure of size figsize (inches) rendered at dpi. At most one
+    arrow is placed every min_arrow_spacing_px pixels, and the number of
+    arrows is additionally capped by target_arrows, if given.
+    """
+    n_y, n_x = grid_shape
+    width_px = figsize[0] * dpi
+    height_px = figsize[1] * dpi
+    max_cols = max(1, int(width_px // min_arrow_spacing_px))
+    max_rows = max(1, int(height_px // min_arrow_spacing_px))
+    if target_arrows is not None and target_arrows < max_cols * max_rows:
+        # Keep the aspect ratio of the figure.
+        target_arrows = max(1, target_arrows)
+        max_cols = max(1, int(np.sqrt(target_arrows * width_px / height_px)))
+        max_rows = max(1, int(target_arrows // max_cols))
+    x_stride = max(1, int(np.ceil(n_x / max_cols)))
+    y_stride = max(1, int(np.ceil(n_y / max_rows)))
+    return y_stride, x_stride
+
+def calc_path_points(
+    waypoints: list[tuple[float, float]],
+    num_points: int
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray] :
+    """
+    Sample num_points equally spaced points along a polyline given as a list
+    of (lat, lon) waypoints. The distance is measured along great circles and
+    the points are linearly interpolated in lat/lon inside each segment.
+
+    It returns: lat_points, lon_points, distance (in kilometers from the first
+    waypoint).
+    """
+    waypoints = np.asarray(waypoints, dtype=float)
+    if waypoints.ndim != 2 or waypoints.shape[0] < 2 or waypoints.shape[1] != 2:
+        raise ValueError('waypoints must be a list of at least two (lat, lon) pairs.')
+    lat = np.radians(waypoints[:, 0])
+    lon = np.radians(waypoints[:, 1])
+    # Haversine distance for each segment.
+    hav = np.sin(np.diff(lat) / 2)**2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2)**2
+    segment_length = 2 * 6371.0 * np.arcsin(np.sqrt(hav))
+    cumulative = np.concatenate([[0.0], np.cumsum(segment_length)])
+    distance = np.linspace(0, cumulative[-1], num_points)
+    lat_points = np.interp(distance, cumulative, waypoints[:, 0])
+    lon_points = np.interp(distance, cumulative, waypoints[:, 1])
+    return lat_points, lon_points, distance
+
+def unwrap_longitudes(lon: np.ndarray) -> np.ndarray :
+    """
+    Remove the jumps of more than 180 degrees between consecutive longitudes,
+    so a path across the antimeridian goes the short way (e.g. 170, 190
+    instead of 170, -170).
+    """
+    return np.degrees(np.unwrap(np.radians(np.asarray(lon, dtype=float))))
+
+def wrap_longitudes(
+    lon: np.ndarray,
+    lon_min: float
+    ) -> np.ndarray :
+    """
+    Bring longitudes into the 360 degrees range that starts at lon_min, e.g.
+    the first longitude of a grid.
+    """
+    return (np.asarray(lon, dtype=float) - lon_min) % 360 + lon_min
+
+def _calc_axis_neighbours(
+    axis: np.ndarray,
+    points: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] :
+    """
+    Get the indices of the two grid nodes around each point along a 1-D
+    (ascending or descending) axis, the fractional position between them and
+    a mask of the points that are inside the axis range.
+    """
+    descending = axis.size > 1 and axis[0] > axis[-1]
+    ascending_axis = axis[::-1] if descending else axis
+    idx1 = np.clip(np.searchsorted(ascending_axis, points), 1, axis.size - 1)
+    idx0 = idx1 - 1
+    span = ascending_axis[idx1] - ascending_axis[idx0]
+    frac = np.where(span > 0, (points - ascending_axis[idx0]) / np.where(span > 0, span, 1), 0.0)
+    inside = (points >= ascending_axis[0]) & (points <= ascending_axis[-1])
+    if descending:
+        idx0, idx1 = axis.size - 1 - idx0, axis.size - 1 - idx1
+    return idx0, idx1, np.clip(frac, 0, 1), inside
+
+def calc_bilinear_weights(
+    lat_data: np.ndarray,
+    lon_data: np.ndarray,
+    lat_points: np.ndarray,
+    lon_points: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray] :
+    """
+    Get the bilinear interpolation weights of a set of points over a regular
+    lat/lon grid. They can be reused with bilinear_interpolate for any array
+    whose last two axes are (lat, lon) on the same grid.
+
+    It returns: lat_indices, lon_indices, weights. Each one has shape
+    (4, number of points). Points outside the grid have zero weights.
+    """
+    lat_data = np.asarray(lat_data, dtype=float)
+    lon_data = np.asarray(lon_data, dtype=float)
+    y0, y1, fy, inside_y = _calc_axis_neighbours(lat_data, np.asarray(lat_points, dtype=float))
+    x0, x1, fx, inside_x = _calc_axis_neighbours(lon_data, np.asarray(lon_points, dtype=float))
+    lat_indices = np.stack([y0, y0, y1, y1])
+    lon_indices = np.stack([x0, x1, x0, x1])
+    weights = np.stack([
+        (1 - fy) * (1 - fx),
+        (1 - fy) * fx,
+        fy * (1 - fx),
+        fy * fx])
+    weights = weights * (inside_y & inside_x)
+    return lat_indices, lon_indices, weights
+
+def bilinear_interpolate(
+    data: np.ndarray,
+    lat_indices: np.ndarray,
+    lon_indices: np.ndarray,
+    weights: np.ndarray
+    ) -> np.ndarray :
+    """
+    Interpolate an array whose last two axes are (lat, lon) at the points
+    described by the weights from calc_bilinear_weights. All leading axes
+    (e.g. depth) are interpolated at once. NaN neighbours are ignored and
+    the remaining weights renormalized; points with no valid neighbour
+    are NaN.
+
+    It returns an array with shape data.shape[:-2] + (number of points,).
+    """
+    values = np.asarray(data)[..., lat_indices, lon_indices]
+    valid = ~np.isnan(values) & (weights > 0)
+    effective_weights = np.where(valid, weights, 0)
+    weighted_sum = np.where(valid, values, 0) * effective_weights
+    total_weight = effective_weights.sum(axis=-2)
+    result = np.full(total_weight.shape, np.nan)
+    np.divide(weighted_sum.sum(axis=-2), total_weight, out=result, where=total_weight > 0)
+    return result
@@ -0,0 +1,150 @@
+# Standard
+import os
+import hashlib
+from pathlib import Path
+from threading import Lock, get_ident
+# Third party
+import numpy as np
+import xarray as xr
+# Own
+from siaplotlib.processing import wrangling
+from siaplotlib.processing import fingerprint
+from siaplotlib.processing import computations
+
+# Fields derived from an eastward and a northward component, by the
+# computations used when they are not stored.
+DERIVED_FIELDS = {
+  'SPEED': computations.calc_spd,
+  'DIRECTION': computations.calc_dir
+}
+
+
+class DerivedFieldStore:
+  """
+  On-disk store of the fields derived from a pair of velocity components
+  (see DERIVED_FIELDS). Each field is computed once for the whole dataset,
+  one step of its first dimension at a time, and written to root_dir as a
+  .npy file that later builds memory-map, so only the selected parts are
+  read. Entries are keyed by the source file, the variable pair and the
+  fingerprint of those variables; writing a field again for the same
+  source and pair removes the stale entry. Datasets with no source file
+  are keyed by their fingerprint alone, so they never replace each other.
+  """
+  def __init__(self, root_dir: str | Path) -> None:
+    self.root_dir = Path(root_dir)
+    self.root_dir.mkdir(parents=True, exist_ok=True)
+    self.__lock = Lock()
+
+
+  def _get_paths(
+    self,
+    dataset: xr.Dataset,
+    eastward_var_name: str,
+    northward_var_name: str,
+    field: str
+  ) -> tuple[Path, str]:
+    pair = dataset[[eastward_var_name, northward_var_name]]
+    pair_fingerprint = fingerprint.fingerprint_dataset(pair)
+    source = dataset.encoding.get('source')
+    # Entries of datasets with no source are only stale for themselves.
+    source = os.path.abspath(source) if source is not None else f'memory|{pair_fingerprint}'
+    entry_name = hashlib.sha256(
+      f'{source}|{eastward_var_name}|{northward_var_name}|{field}'.encode()).hexdigest()[:32]
+    return Path(self.root_dir, f'{entry_name}.{pair_fingerprint[:32]}.npy'), entry_name
+
+
+  def _write(
+    self,
+    path: Path,
+    entry_name: str,
+    dataset: xr.Dataset,
+    eastward_var_name: str,
+    northward_var_name: str,
+    field: str
+  ) -> None:
+    compute = DERIVED_FIELDS[field]
+    eastward = dataset[eastward_var_name]
+    pair = xr.Dataset({
+      eastward_var_name: eastward,
+      northward_var_name: dataset[northward_var_name].transpose(*eastward.dims)})
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.{get_ident()}.tmp')
+    if eastward.ndim == 0 or eastward.shape[0] == 0:
+      # Nothing to split in steps.
+      with open(tmp_path, 'wb') as f:
+        np.save(f, compute(pair, eastward_var_name, northward_var_name))
+    else:
+      first_dim = eastward.dims[0]
+      values = None
+      for i in range(eastward.shape[0]):
+        block = compute(pair.isel({first_dim: i}), eastward_var_name, northward_var_name)
+        if values is None:
+          values = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype=block.dtype, shape=eastward.shape)
+        values[i] = block
+      values.flush()
+      del values
+    # Written on a temporary file first so readers never see partial fields.
+    os.replace(tmp_path, path)
+    for stale_path in self.root_dir.glob(f'{entry_name}.*.npy'):
+      if stale_path != path:
+        stale_path.unlink(missing_ok=True)
+
+
+  def get_field(
+    self,
+    dataset: xr.Dataset,
+    eastward_var_name: str,
+    northward_var_name: str,
+    field: str
+  ) -> xr.DataArray:
+    """
+    Get a derived field ('SPEED' or 'DIRECTION') of the whole dataset as a
+    DataArray over a memory-mapped file, with the dimensions and coordinates
+    of the eastward variable. It is computed and stored on the first call.
+    """
+    if field not in DERIVED_FIELDS:
+      raise RuntimeError(f'Derived field "{field}" is not supported.')
+    eastward = dataset[eastward_var_name]
+    path, entry_name = self._get_paths(dataset, eastward_var_name, northward_var_name, field)
+    with self.__lock:
+      if not path.exists():
+        self._write(path, entry_name, dataset, eastward_var_name, northward_var_name, field)
+    values = np.load(path, mmap_mode='r')
+    return xr.DataArray(
+      values,
+      dims=eastward.dims,
+      coords=eastward.coords,
+      name=field.lower())
+
+
+  def get_subset(
+    self,
+    dataset: xr.Dataset,
+    eastward_var_name: str,
+    northward_var_name: str,
+    field: str,
+    dim_constraints: dict[str, slice|list] = {}
+  ) -> np.ndarray:
+    """
+    Get the values of a derived field within dim_constraints, selected as
+    wrangling.slice_dice does, so they match the field computed from the
+    subset.
+    """
+    values = self.get_field(dataset, eastward_var_name, northward_var_name, field)
+    if dim_constraints:
+      values = wrangling.slice_dice(dataset=values, dim_constraints=dim_constraints)
+    return np.asarray(values.values)
+
+
+  def clear(self) -> None:
+    with self.__lock:
+      for path in self.root_dir.glob('*.npy'):
+        path.unlink(missing_ok=True)
+
+
+  def __getstate__(self):
+    return {'root_dir': self.root_dir}
+
+
+  def __setstate__(self, state):
+    self.__init__(**state)
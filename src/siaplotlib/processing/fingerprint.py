@@ -0,0 +1,143 @@
+# Standard
+import os
+import hashlib
+from datetime import date, datetime
+# Third party
+import numpy as np
+import xarray as xr
+
+# Number of blocks read from each variable by the sampled digest.
+DEFAULT_NUM_SAMPLES = 16
+# Values per block, taken along the last dimension.
+DEFAULT_SAMPLE_SIZE = 64
+
+
+def _update_with_array(digest, values: np.ndarray) -> None:
+  values = np.ascontiguousarray(values)
+  digest.update(f'{values.dtype}|{values.shape}'.encode())
+  digest.update(values.tobytes())
+
+
+def _update_with_source(digest, dataset: xr.Dataset) -> None:
+  source = dataset.encoding.get('source')
+  if source is None or not os.path.exists(source):
+    return
+  stat = os.stat(source)
+  digest.update(f'source|{os.path.abspath(source)}|{stat.st_size}|{stat.st_mtime_ns}'.encode())
+
+
+def _update_with_structure(digest, dataset: xr.Dataset) -> None:
+  """
+  Hashes the coordinates values, and the names, dimensions, types and
+  encodings of the variables.
+  """
+  for name in sorted(map(str, dataset.coords)):
+    digest.update(f'coord|{name}|{dataset[name].dims}'.encode())
+    _update_with_array(digest, dataset[name].values)
+  for name in sorted(map(str, dataset.data_vars)):
+    variable = dataset[name]
+    encoding = sorted((key, repr(value)) for key, value in variable.encoding.items() if key != 'source')
+    digest.update(f'var|{name}|{variable.dims}|{variable.shape}|{variable.dtype}|{encoding}'.encode())
+
+
+def _update_with_samples(
+  digest,
+  variable: xr.DataArray,
+  num_samples: int,
+  sample_size: int
+) -> None:
+  """
+  Hashes num_samples blocks spread evenly over the variable. Each block is
+  read with plain indexing, so only small parts of lazily loaded files are read.
+  """
+  if variable.size == 0:
+    return
+  if variable.ndim == 0:
+    _update_with_array(digest, variable.values)
+    return
+  num_blocks = int(np.prod(variable.shape[:-1]))
+  last_dim = variable.dims[-1]
+  max_start = max(variable.shape[-1] - sample_size, 0)
+  block_indices = np.linspace(0, num_blocks - 1, num_samples).astype(np.int64)
+  starts = np.linspace(0, max_start, num_samples).astype(np.int64)
+  for block_index, start in zip(block_indices, starts):
+    indexers = dict(zip(variable.dims[:-1], np.unravel_index(block_index, variable.shape[:-1])))
+    indexers[last_dim] = slice(int(start), int(start) + sample_size)
+    # Indexing the Variable skips the coordinates of the DataArray.
+    _update_with_array(digest, variable.variable.isel(indexers).values)
+
+
+def _update_with_content(digest, variable: xr.DataArray) -> None:
+  """
+  Hashes all the values, one step of the first dimension at a time to
+  bound the memory used.
+  """
+  if variable.ndim == 0:
+    _update_with_array(digest, variable.values)
+    return
+  first_dim = variable.dims[0]
+  for i in range(variable.shape[0]):
+    _update_with_array(digest, variable.isel({first_dim: i}).values)
+
+
+def canonicalize(value):
+  """
+  Turns a parameter value into nested tuples of plain values with a stable
+  repr. Raises TypeError for values that cannot be compared this way.
+  """
+  if value is None or type(value) in [bool, int, float, str]:
+    return value
+  if isinstance(value, (np.integer, np.floating, np.bool_)):
+    return value.item()
+  if isinstance(value, np.datetime64):
+    return ('datetime64', str(value))
+  if isinstance(value, (date, datetime)):
+    return ('datetime', value.isoformat())
+  if isinstance(value, np.ndarray):
+    data = np.ascontiguousarray(value)
+    return ('ndarray', str(data.dtype), data.shape, hashlib.sha1(data.tobytes()).hexdigest())
+  if isinstance(value, slice):
+    return ('slice', canonicalize(value.start), canonicalize(value.stop), canonicalize(value.step))
+  if isinstance(value, dict):
+    return ('dict', tuple(sorted((str(k), canonicalize(v)) for k, v in value.items())))
+  if isinstance(value, (list, tuple)):
+    return (type(value).__name__, tuple(canonicalize(v) for v in value))
+  raise TypeError(f'Values of type {type(value)} have no canonical form.')
+
+
+def fingerprint_dataset(
+  dataset: xr.Dataset | xr.DataArray | np.ndarray,
+  strict: bool = False,
+  num_samples: int = DEFAULT_NUM_SAMPLES,
+  sample_size: int = DEFAULT_SAMPLE_SIZE
+) -> str | None:
+  """
+  Get a digest that identifies the content of a dataset. It combines the
+  source file path, size and modification time (if it was opened from a
+  file), the coordinates, the variable encodings and a digest of
+  num_samples blocks of each variable, so it takes milliseconds regardless
+  of the size of the data. Changes to values outside the sampled blocks of
+  in-memory data are not noticed; strict=True hashes all the values instead.
+
+  Returns None for objects that are not datasets or arrays.
+  """
+  if dataset is None:
+    return 'none'
+  if isinstance(dataset, np.ndarray):
+    dataset = xr.DataArray(dataset)
+  if isinstance(dataset, xr.DataArray):
+    encoding = dataset.encoding
+    dataset = dataset.to_dataset(name=dataset.name or '__data__')
+    dataset.encoding = encoding
+  if not isinstance(dataset, xr.Dataset):
+    return None
+  digest = hashlib.sha256()
+  digest.update(f'strict={strict}|samples={num_samples}x{sample_size}'.encode())
+  _update_with_source(digest, dataset)
+  _update_with_structure(digest, dataset)
+  for name in sorted(map(str, dataset.data_vars)):
+    if strict:
+      _update_with_content(digest, dataset[name])
+    else:
+      _update_with_samples(digest, dataset[name], num_samples, sample_size)
+  return digest.hexdigest()
@@ -1,26 +1,460 @@
 # Standard
+import os
+import sys
+import time
+import functools
+import multiprocessing
+from collections import deque
 from collections.abc import Callable
-from threading import Thread
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, CancelledError
+from concurrent.futures import wait as futures_wait
+from threading import Thread, Condition
 # Own
 from siaplotlib.utils.exceptions import AsyncRunnerBusyException, DuplicatedAsyncRunnerException, AsyncRunnerMissingException
+from siaplotlib.utils.exceptions import SchedulerQueueFullException
+from siaplotlib.utils.log import LoggingFeatures
+
+
+# Lower levels are dispatched first.
+PRIORITY_LEVELS = {
+  'HIGH': 0,
+  'NORMAL': 1,
+  'LOW': 2
+}
+
+
+class _ScheduledTask:
+  def __init__(
+    self,
+    fn: Callable[..., any],
+    fn_kwargs: dict[str, any],
+    future: Future,
+    priority: str = 'NORMAL',
+    submitter: str = None,
+    memory_estimate: int = 0
+  ) -> None:
+    self.fn = fn
+    self.fn_kwargs = fn_kwargs
+    self.future = future
+    self.priority = priority
+    self.submitter = submitter
+    self.memory_estimate = memory_estimate
+    self.enqueue_time = time.monotonic()
+    # Since when it has been passed over for not fitting in the budget.
+    self.blocked_time: float = None
+
+
+# Whole world, as [west, east, south, north].
+GLOBAL_EXTENT = [-180, 180, -90, 90]
+
+
+def preload_plotting_stack(
+  extents: list[list[float]] = None,
+  log_stream = sys.stderr,
+  verbose: bool = True
+) -> None:
+  """
+  Worker initializer that pays once per worker what chart tasks would pay
+  on their first run: importing matplotlib, cartopy and the chart modules,
+  switching to the Agg backend, loading the font cache (by drawing a small
+  figure) and reading the Natural Earth geometries used at each extent
+  ([west, east, south, north], GLOBAL_EXTENT by default). Import errors are
+  raised. Failures to load the geometries (e.g. without network) are logged
+  and the worker starts anyway, since the tasks can still run.
+  """
+  logger = LoggingFeatures(log_stream=log_stream, verbose=verbose)
+  import matplotlib
+  matplotlib.use('Agg')
+  import matplotlib.pyplot as plt
+  # Importing the chart modules loads cartopy and windrose as well.
+  from siaplotlib.charts import basemap
+  from siaplotlib.charts import level_chart, line_chart
+  fig = plt.figure(figsize=(1, 1))
+  fig.text(0.5, 0.5, 'Warm up')
+  fig.canvas.draw()
+  plt.close(fig)
+  for extent in extents or [GLOBAL_EXTENT]:
+    try:
+      basemap.prime_feature_caches(
+        lon_interval=extent[:2],
+        lat_interval=extent[2:])
+    except Exception as e:
+      logger.log(f'Natural Earth geometries for extent {extent} could not be loaded: {e!r}')
+
+
+def _hold_worker(seconds: float) -> int:
+  time.sleep(seconds)
+  return os.getpid()
+
+
+class BuildScheduler:
+  """
+  Runs functions on a bounded pool of workers, which can be threads
+  (worker_type='THREAD') or processes (worker_type='PROCESS'). With process
+  workers, the functions, their arguments and return values must be picklable.
+
+  At most max_workers tasks run at the same time and at most max_queue_size
+  tasks wait for a worker. When the queue is full, submit blocks until there
+  is room (full_queue_policy='BLOCK', up to block_timeout seconds if given)
+  or raises SchedulerQueueFullException (full_queue_policy='REJECT').
+
+  Tasks are dispatched by priority ('HIGH', 'NORMAL' or 'LOW'). Waiting
+  tasks climb one level every aging_seconds, so low priority tasks are
+  delayed but not starved. Tasks of the same level are taken in turns from
+  each submitter (e.g. a user or a batch job), the least recently served
+  first, and in submission order for a given submitter.
+
+  With a memory_budget (bytes), a task only starts while the estimates of
+  the running tasks plus its own stay within the budget; otherwise it waits
+  and the next tasks that fit go ahead of it. Once it has waited for memory
+  aging_seconds, no other task starts until it does. A task is always
+  started when nothing else is running, so tasks estimated above the budget
+  still run, one at a time.
+
+  The workers are kept alive between tasks. initializer(*initargs) runs once
+  when each worker starts, e.g. preload_plotting_stack so that chart tasks
+  do not pay for imports and caches, and prestart_workers() starts them
+  before the first task arrives. start_method selects how process workers
+  are created ('spawn', 'forkserver' or 'fork', the platform default if None).
+  """
+  def __init__(
+    self,
+    max_workers: int = 4,
+    max_queue_size: int = 64,
+    worker_type: str = 'THREAD',
+    full_queue_policy: str = 'BLOCK',
+    block_timeout: float = None,
+    initializer: Callable[..., None] = None,
+    initargs: tuple = (),
+    start_method: str = None,
+    aging_seconds: float = 30,
+    memory_budget: int = None
+  ) -> None:
+    if worker_type not in ['THREAD', 'PROCESS']:
+      raise ValueError(f'Worker type "{worker_type}" is not supported.')
+    if full_queue_policy not in ['BLOCK', 'REJECT']:
+      raise ValueError(f'Full queue policy "{full_queue_policy}" is not supported.')
+    if max_workers < 1:
+      raise ValueError('Parameter "max_workers" must be greater than 0.')
+    self.max_workers = max_workers
+    self.max_queue_size = max_queue_size
+    self.worker_type = worker_type
+    self.full_queue_policy = full_queue_policy
+    self.block_timeout = block_timeout
+    self.initializer = initializer
+    self.initargs = initargs
+    self.start_method = start_method
+    self.aging_seconds = aging_seconds
+    self.memory_budget = memory_budget
+    self.__condition = Condition()
+    # A FIFO queue per (submitter, priority).
+    self.__pending: dict[tuple[str, str], deque[_ScheduledTask]] = {}
+    self.__pending_count = 0
+    self.__last_served: dict[str, int] = {}
+    self.__served_count = 0
+    self.__running = 0
+    self.__reserved_memory = 0
+    self.__is_shutdown = False
+    self.__executor = None
+
+
+  def _get_executor(self):
+    if self.__executor is None:
+      if self.worker_type == 'PROCESS':
+        mp_context = None
+        if self.start_method is not None:
+          mp_context = multiprocessing.get_context(self.start_method)
+        self.__executor = ProcessPoolExecutor(
+          max_workers=self.max_workers,
+          mp_context=mp_context,
+          initializer=self.initializer,
+          initargs=self.initargs)
+      else:
+        self.__executor = ThreadPoolExecutor(
+          max_workers=self.max_workers,
+          thread_name_prefix='siaplotlib-worker',
+          initializer=self.initializer,
+          initargs=self.initargs)
+    return self.__executor
+
+
+  def prestart_workers(self, timeout: float = None) -> None:
+    """
+    Starts the workers and waits until they have run the initializer. The
+    executor creates a worker for each task that finds no idle one, so a
+    task per worker that holds it for a moment starts all of them. It should
+    be called before the scheduler gets busy.
+    """
+    with self.__condition:
+      if self.__is_shutdown:
+        raise RuntimeError('Cannot start workers after the scheduler is shut down.')
+    executor = self._get_executor()
+    warm_up_futures = [executor.submit(_hold_worker, 0.1) for _ in range(self.max_workers)]
+    done, not_done = futures_wait(warm_up_futures, timeout=timeout)
+    if not_done:
+      raise TimeoutError(f'Workers were not ready after {timeout} seconds.')
+    for future in done:
+      # Raises the initializer errors, if any.
+      future.result()
+
+
+  def submit(
+    self,
+    fn: Callable[..., any],
+    fn_kwargs: dict[str, any] = {},
+    priority: str = 'NORMAL',
+    submitter: str = None,
+    memory_estimate: int = 0
+  ) -> Future:
+    """
+    Queue a function to be run by a worker. Returns a Future that resolves
+    to its return value. memory_estimate (bytes) is counted against the
+    memory budget while the function runs.
+    """
+    if priority not in PRIORITY_LEVELS:
+      raise ValueError(f'Priority "{priority}" is not supported.')
+    task = _ScheduledTask(
+      fn=fn,
+      fn_kwargs=fn_kwargs,
+      future=Future(),
+      priority=priority,
+      submitter=submitter,
+      memory_estimate=memory_estimate)
+    with self.__condition:
+      if self.__is_shutdown:
+        raise RuntimeError('Cannot submit tasks after the scheduler is shut down.')
+      if self.__pending_count >= self.max_queue_size:
+        if self.full_queue_policy == 'REJECT':
+          raise SchedulerQueueFullException(
+            messages=f'The queue is full ({self.max_queue_size} tasks waiting).')
+        has_room = self.__condition.wait_for(
+          lambda: self.__pending_count < self.max_queue_size or self.__is_shutdown,
+          timeout=self.block_timeout)
+        if not has_room:
+          raise SchedulerQueueFullException(
+            messages=f'The queue is still full after waiting {self.block_timeout} seconds.')
+        if self.__is_shutdown:
+          raise RuntimeError('Cannot submit tasks after the scheduler is shut down.')
+      # The task waits from now on, not from its creation.
+      task.enqueue_time = time.monotonic()
+      self.__pending.setdefault((submitter, priority), deque()).append(task)
+      self.__pending_count += 1
+    # Cancelled tasks leave the queue right away, freeing their place.
+    task.future.add_done_callback(functools.partial(self._on_task_cancelled, task))
+    self._dispatch()
+    return task.future
+
+
+  def _on_task_cancelled(self, task: _ScheduledTask, future: Future) -> None:
+    if not future.cancelled():
+      return
+    with self.__condition:
+      key = (task.submitter, task.priority)
+      queue = self.__pending.get(key, deque())
+      if task not in queue:
+        # Already taken by _dispatch, which drops it.
+        return
+      queue.remove(task)
+      if not queue:
+        del self.__pending[key]
+      self.__pending_count -= 1
+      self.__condition.notify_all()
+    # A task waiting for memory may have been holding the others back.
+    self._dispatch()
+
+
+  def _pop_next_task(self) -> _ScheduledTask | None:
+    """
+    Take the next task that fits in the memory budget: the lowest level
+    after aging, then the submitter served least recently, then the oldest.
+    Tasks that do not fit are passed over, unless one of them has waited
+    for memory aging_seconds. Must be called holding the lock.
+    """
+    now = time.monotonic()
+    candidates = []
+    for key, queue in self.__pending.items():
+      for position, task in enumerate(queue):
+        level = PRIORITY_LEVELS[task.priority]
+        if self.aging_seconds:
+          level -= int((now - task.enqueue_time) // self.aging_seconds)
+        rank = (level, self.__last_served.get(task.submitter, -1), task.enqueue_time)
+        candidates.append((rank, key, position))
+    # Stable, so tasks of a queue keep their order on ties.
+    candidates.sort(key=lambda candidate: candidate[0])
+    for _, key, position in candidates:
+      task = self.__pending[key][position]
+      if self._fits_in_budget(task):
+        break
+      if task.blocked_time is None:
+        task.blocked_time = now
+      if self.aging_seconds and now - task.blocked_time >= self.aging_seconds:
+        # Waits for the running tasks to release memory.
+        return None
+    else:
+      return None
+    queue = self.__pending[key]
+    del queue[position]
+    if not queue:
+      del self.__pending[key]
+    self.__pending_count -= 1
+    self.__served_count += 1
+    self.__last_served[task.submitter] = self.__served_count
+    return task
+
+
+  def _dispatch(self) -> None:
+    """
+    Start queued tasks while there are free workers.
+    """
+    to_start = []
+    with self.__condition:
+      while self.__running < self.max_workers and self.__pending:
+        task = self._pop_next_task()
+        if task is None:
+          # Waits for memory to be released by the running tasks.
+          break
+        # Tasks cancelled while waiting are dropped.
+        if not task.future.set_running_or_notify_cancel():
+          continue
+        self.__running += 1
+        self.__reserved_memory += task.memory_estimate
+        to_start.append(task)
+      self.__condition.notify_all()
+    # Submitted outside the lock since done callbacks may run right away.
+    for task in to_start:
+      try:
+        exec_future = self._get_executor().submit(task.fn, **task.fn_kwargs)
+      except BaseException as e:
+        self._on_task_done(task, None, error=e)
+        continue
+      exec_future.add_done_callback(functools.partial(self._on_task_done, task))
+
+
+  def _on_task_done(
+    self,
+    task: _ScheduledTask,
+    exec_future: Future,
+    error: BaseException = None
+  ) -> None:
+    with self.__condition:
+      self.__running -= 1
+      self.__reserved_memory -= task.memory_estimate
+    if error is None and exec_future.cancelled():
+      # The executor dropped it (e.g. on shutdown). The task future is
+      # already running, so it is resolved with the cancellation.
+      error = CancelledError('The task was cancelled by the executor.')
+    if error is None:
+      error = exec_future.exception()
+    if error is None:
+      task.future.set_result(exec_future.result())
+    else:
+      task.future.set_exception(error)
+    self._dispatch()
+
+
+  def _fits_in_budget(self, task: _ScheduledTask) -> bool:
+    if self.memory_budget is None or self.__running == 0 or task.future.cancelled():
+      return True
+    return self.__reserved_memory + task.memory_estimate <= self.memory_budget
+
+
+  def reserved_memory(self) -> int:
+    """
+    Get the sum of the memory estimates of the running tasks, in bytes.
+    """
+    with self.__condition:
+      return self.__reserved_memory
+
+
+  def queue_depth(self) -> int:
+    """
+    Get the number of tasks waiting for a worker.
+    """
+    with self.__condition:
+      return self.__pending_count
+
+
+  def running_count(self) -> int:
+    """
+    Get the number of tasks being run by the workers.
+    """
+    with self.__condition:
+      return self.__running
+
+
+  def shutdown(
+    self,
+    wait: bool = True,
+    cancel_pending: bool = False
+  ) -> None:
+    """
+    Stop accepting tasks. Queued tasks are still run unless cancel_pending
+    is True.
+    """
+    with self.__condition:
+      self.__is_shutdown = True
+      if cancel_pending:
+        pending_tasks = [task for queue in self.__pending.values() for task in queue]
+        self.__pending.clear()
+        self.__pending_count = 0
+        for task in pending_tasks:
+          task.future.cancel()
+      self.__condition.notify_all()
+    if wait:
+      with self.__condition:
+        self.__condition.wait_for(lambda: not self.__pending and self.__running == 0)
+    if self.__executor is not None:
+      self.__executor.shutdown(wait=wait)
+
+
+_default_scheduler: BuildScheduler = None
+
+
+def set_default_scheduler(scheduler: BuildScheduler | None) -> None:
+  """
+  Set the scheduler used by the chart builders that have none of their own.
+  Set it to None to run each build on its own thread.
+  """
+  global _default_scheduler
+  _default_scheduler = scheduler
+
+
+def get_default_scheduler() -> BuildScheduler | None:
+  return _default_scheduler
 
 
 class AsyncRunner:
   """
   Runs a synchronous function as an asynchronous one on another thread. Its return values are forwared to the callback.
+  If a scheduler is set, the function is submitted to it instead of running on a new thread,
+  with the priority, submitter and memory estimate of the runner.
+
+  The callbacks are optional. run() returns a Future that resolves to the
+  return value of the function once the callbacks have been called, or to
+  the exception raised by the function or by the success callback.
   """
   def __init__(
     self,
     sync_fn: Callable[..., None],
     sync_fn_kwargs: dict[str, any] = {},
     success_callback: Callable[..., None] = None,
-    failure_callback: Callable[[Exception], None] = None
+    failure_callback: Callable[[Exception], None] = None,
+    scheduler: BuildScheduler = None,
+    priority: str = 'NORMAL',
+    submitter: str = None,
+    memory_estimate: int = 0
   ) -> None:
     self.sync_fn = sync_fn
     self.success_callback = success_callback
     self.failure_callback = failure_callback
     self.sync_fn_kwargs = sync_fn_kwargs
+    self.scheduler = scheduler
+    self.priority = priority
+    self.submitter = submitter
+    self.memory_estimate = memory_estimate
     self.__thread: Thread = None
+    self.__result_future: Future = None
+    self.__task_future: Future = None
   
 
   def validate_safe_execution(self):
@@ -29,52 +463,125 @@ class AsyncRunner:
     """
     if not callable(self.sync_fn):
       raise TypeError('Parameter "sync_fn" must be callable.')
-    if not callable(self.success_callback):
+    if self.success_callback is not None and not callable(self.success_callback):
       raise TypeError('Parameter "success_callback" must be callable and take arguments in the same order and type as the return values of "sync_fn".')
-    if not callable(self.failure_callback):
+    if self.failure_callback is not None and not callable(self.failure_callback):
       raise TypeError('Parameter "failure_callback" must be callable and take as argument an instance of a subclass of BaseException')
     if type(self.sync_fn_kwargs) is not dict:
       raise TypeError('Parameter "sync_fn_kwargs" must be a dict[str, any].')
     # Originally placed in "run" method.
-    if self.__thread is not None and self.__thread.is_alive():
+    if self.still_working():
       raise AsyncRunnerBusyException('An asynchronous process is still running. Just one async process is allowed per instance.')
 
 
+  def forward_result(self, result):
+    """
+    Forwards the return value of the synchronous function to the success
+    callback, casted to a tuple if needed in order to pass it as *args.
+    Then resolves the Future of the run.
+    """
+    if self.success_callback is not None:
+      if result is None:
+        self.success_callback()
+      else:
+        args = result if type(result) is tuple else tuple([result])
+        self.success_callback(*args)
+    self.__result_future.set_result(result)
+
+
+  def forward_failure(self, err: BaseException):
+    """
+    Forwards an exception to the failure callback. Then resolves the Future
+    of the run with it.
+    """
+    try:
+      if self.failure_callback is not None:
+        self.failure_callback(err)
+    finally:
+      self.__result_future.set_exception(err)
+
+
   def wrapper_fn(self):
     """
     A wrapper that runs the synchronous function. Its return value is captured
-    and casted to a tuple if needed in order to forward it to the callback
-    as *args.
+    and forwarded to the callback.
     """
     try:
       result = self.sync_fn(**self.sync_fn_kwargs)
-      if result is None:
-        self.success_callback()
-        return
-      if type(result) is not tuple:
-        result = tuple([result])
-      self.success_callback(*result)
+      self.forward_result(result)
+    except BaseException as e:
+      self.forward_failure(e)
+
+
+  def future_done_fn(self, future: Future):
+    """
+    Forwards the result of a task run by the scheduler to the callbacks.
+    """
+    try:
+      self.forward_result(future.result())
     except BaseException as e:
-      self.failure_callback(e)
+      self.forward_failure(e)
 
   
-  def run(self) -> Thread:
+  def run(self) -> Future:
     """
-    Creates the thread and runs the wrapper function there.
+    Creates the thread and runs the wrapper function there. If there is a
+    scheduler, the function is submitted to it instead.
     """
     self.validate_safe_execution()
+    result_future = Future()
+    result_future.set_running_or_notify_cancel()
+    self.__result_future = result_future
+    self.__task_future = None
+    if self.scheduler is not None:
+      self.__thread = None
+      try:
+        task_future = self.scheduler.submit(
+          self.sync_fn,
+          self.sync_fn_kwargs,
+          priority=self.priority,
+          submitter=self.submitter,
+          memory_estimate=self.memory_estimate)
+      except BaseException as e:
+        result_future.set_exception(e)
+        raise
+      self.__task_future = task_future
+      task_future.add_done_callback(self.future_done_fn)
+      return result_future
     th = Thread(target=self.wrapper_fn)
-    th.start()
     self.__thread = th
-    return th
+    th.start()
+    return result_future
+
+
+  def cancel(self) -> bool:
+    """
+    Cancels the task if it is still queued in the scheduler. Returns False
+    if it has already started or it runs on its own thread.
+    """
+    if self.__task_future is None:
+      return False
+    return self.__task_future.cancel()
+
+
+  @property
+  def future(self) -> Future | None:
+    """
+    The Future of the last run.
+    """
+    return self.__result_future
   
 
   def wait(self, seconds: float = None) -> None:
-    self.__thread.join(timeout=seconds)
+    """
+    Waits until the function has finished and the callbacks have been called.
+    """
+    if self.__result_future is not None:
+      futures_wait([self.__result_future], timeout=seconds)
   
 
   def still_working(self) -> bool:
-    return self.__thread.is_alive()
+    return self.__result_future is not None and not self.__result_future.done()
 
 
 class AsyncRunnerManager:
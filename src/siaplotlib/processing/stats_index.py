@@ -0,0 +1,307 @@
+# Standard
+import os
+import json
+from pathlib import Path
+from threading import get_ident
+# Third party
+import numpy as np
+import xarray as xr
+# Own
+from siaplotlib.processing import wrangling
+from siaplotlib.processing import fingerprint
+
+# Bumped when the layout of the sidecar files changes.
+INDEX_VERSION = 2
+SIDECAR_SUFFIX = '.stats.npz'
+STATS = ['min', 'max', 'count', 'mean']
+# Cells of each map dimension per block.
+DEFAULT_BLOCK_SIZE = 32
+
+
+def _get_block_dim(map_dim: str) -> str:
+  return f'{map_dim}_block'
+
+
+def _count_blocks(size: int, block_size: int) -> int:
+  return -(-size // block_size)
+
+
+def _reduce_block(
+  values: np.ndarray,
+  num_map_axes: int,
+  block_size: int
+) -> dict[str, np.ndarray]:
+  """
+  Reduces the last num_map_axes axes of values by blocks of block_size
+  cells along each one (the last block of an axis can be smaller).
+  """
+  num_index_axes = values.ndim - num_map_axes
+  padding = [(0, 0)] * num_index_axes + [
+    (0, -size % block_size) for size in values.shape[num_index_axes:]]
+  values = np.pad(values, padding, constant_values=np.nan)
+  blocks_shape = values.shape[:num_index_axes]
+  for size in values.shape[num_index_axes:]:
+    blocks_shape += (size // block_size, block_size)
+  values = values.reshape(blocks_shape)
+  axes = tuple(range(num_index_axes + 1, values.ndim, 2))
+  valid = ~np.isnan(values)
+  count = valid.sum(axis=axes)
+  # All-NaN blocks get NaN instead of warnings.
+  with np.errstate(invalid='ignore', divide='ignore'):
+    return {
+      'min': np.where(count > 0, np.where(valid, values, np.inf).min(axis=axes), np.nan),
+      'max': np.where(count > 0, np.where(valid, values, -np.inf).max(axis=axes), np.nan),
+      'count': count,
+      'mean': np.where(count > 0, np.where(valid, values, 0).sum(axis=axes) / count, np.nan)
+    }
+
+
+class StatsIndex:
+  """
+  Min, max, count of valid values and mean of each variable, for every
+  step of the dimensions that are not map_dims (e.g. per time step and
+  depth) and every block of block_size x block_size cells of the map.
+  Range queries over dim_constraints combine those values instead of
+  scanning the data.
+
+  It is built once per file with load_or_build, which keeps it in a sidecar
+  NPZ file next to the dataset and rebuilds it when the dataset fingerprint
+  changes.
+  """
+  def __init__(
+    self,
+    stats: dict[str, xr.Dataset],
+    map_dims: list[str],
+    dataset_fingerprint: str = None,
+    map_coords: dict[str, np.ndarray] = {},
+    block_size: int = DEFAULT_BLOCK_SIZE
+  ) -> None:
+    self.stats = stats
+    self.map_dims = map_dims
+    self.dataset_fingerprint = dataset_fingerprint
+    self.map_coords = map_coords
+    self.block_size = block_size
+
+
+  @classmethod
+  def build(
+    cls,
+    dataset: xr.Dataset,
+    map_dims: list[str],
+    block_size: int = DEFAULT_BLOCK_SIZE
+  ) -> 'StatsIndex':
+    """
+    Scans the dataset once, one step of the first index dimension at a time.
+    """
+    stats = {}
+    for var_name in dataset.data_vars:
+      variable = dataset[var_name]
+      index_dims = [dim for dim in variable.dims if dim not in map_dims]
+      var_map_dims = [dim for dim in variable.dims if dim in map_dims]
+      if not var_map_dims or not np.issubdtype(variable.dtype, np.number):
+        continue
+      variable = variable.transpose(*index_dims, *var_map_dims)
+      if index_dims:
+        blocks = [
+          _reduce_block(
+            variable.isel({index_dims[0]: i}).values.astype(np.float64),
+            len(var_map_dims),
+            block_size)
+          for i in range(variable.shape[0])]
+        reduced = {stat: np.stack([block[stat] for block in blocks]) for stat in STATS}
+      else:
+        reduced = _reduce_block(variable.values.astype(np.float64), len(var_map_dims), block_size)
+      stats_dims = index_dims + [_get_block_dim(dim) for dim in var_map_dims]
+      stats[str(var_name)] = xr.Dataset(
+        {stat: (stats_dims, reduced[stat]) for stat in STATS},
+        coords={dim: variable[dim].values for dim in index_dims if dim in variable.coords})
+    return cls(
+      stats=stats,
+      map_dims=list(map_dims),
+      dataset_fingerprint=fingerprint.fingerprint_dataset(dataset),
+      map_coords={dim: dataset[dim].values for dim in map_dims if dim in dataset.coords},
+      block_size=block_size)
+
+
+  @staticmethod
+  def get_sidecar_path(dataset: xr.Dataset) -> Path | None:
+    source = dataset.encoding.get('source')
+    if source is None:
+      return None
+    return Path(f'{source}{SIDECAR_SUFFIX}')
+
+
+  @classmethod
+  def load_or_build(
+    cls,
+    dataset: xr.Dataset,
+    map_dims: list[str],
+    path: str | Path = None,
+    block_size: int = DEFAULT_BLOCK_SIZE
+  ) -> 'StatsIndex':
+    """
+    Loads the index from path (by default, the sidecar of the dataset
+    source file) if it is up to date, otherwise builds it and tries to store
+    it there. Datasets without source file are indexed in memory only.
+    """
+    if path is None:
+      path = cls.get_sidecar_path(dataset)
+    dataset_fingerprint = fingerprint.fingerprint_dataset(dataset)
+    if path is not None and Path(path).exists():
+      index = cls.load(path)
+      if index.dataset_fingerprint == dataset_fingerprint and index.map_dims == list(map_dims) \
+        and index.block_size == block_size:
+        return index
+    index = cls.build(dataset=dataset, map_dims=map_dims, block_size=block_size)
+    if path is not None:
+      try:
+        index.save(path)
+      except OSError:
+        # e.g. a read-only data directory, the index is still usable.
+        pass
+    return index
+
+
+  def save(self, path: str | Path) -> None:
+    path = Path(path)
+    meta = {
+      'version': INDEX_VERSION,
+      'fingerprint': self.dataset_fingerprint,
+      'map_dims': self.map_dims,
+      'block_size': self.block_size,
+      'map_coords': list(self.map_coords),
+      'variables': {var_name: list(stats.dims) for var_name, stats in self.stats.items()}
+    }
+    arrays = {'__meta__': np.array(json.dumps(meta))}
+    for dim_i, coord in enumerate(self.map_coords.values()):
+      arrays[f'__map__{dim_i}'] = coord
+    for var_i, (var_name, stats) in enumerate(self.stats.items()):
+      for stat in STATS:
+        arrays[f'{var_i}__{stat}'] = stats[stat].values
+      for dim in stats.coords:
+        arrays[f'{var_i}__coord__{dim}'] = stats[dim].values
+    # Written on a temporary file first so readers never see partial indexes.
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.{get_ident()}.tmp')
+    with open(tmp_path, 'wb') as f:
+      np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+  @classmethod
+  def load(cls, path: str | Path) -> 'StatsIndex':
+    with np.load(path, allow_pickle=False) as npz:
+      meta = json.loads(str(npz['__meta__']))
+      if meta['version'] != INDEX_VERSION:
+        return cls(stats={}, map_dims=meta['map_dims'])
+      stats = {}
+      for var_i, (var_name, index_dims) in enumerate(meta['variables'].items()):
+        coords = {
+          dim: npz[f'{var_i}__coord__{dim}'] for dim in index_dims
+          if f'{var_i}__coord__{dim}' in npz.files}
+        stats[var_name] = xr.Dataset(
+          {stat: (index_dims, npz[f'{var_i}__{stat}']) for stat in STATS},
+          coords=coords)
+      map_coords = {dim: npz[f'__map__{dim_i}'] for dim_i, dim in enumerate(meta['map_coords'])}
+    return cls(
+      stats=stats,
+      map_dims=meta['map_dims'],
+      dataset_fingerprint=meta['fingerprint'],
+      map_coords=map_coords,
+      block_size=meta['block_size'])
+
+
+  def query(
+    self,
+    var_name: str,
+    dim_constraints: dict[str, slice|list] = {},
+    whole_blocks_only: bool = False
+  ) -> dict[str, float] | None:
+    """
+    Get the min, max, count and mean of a variable over the box given by
+    dim_constraints, selected as wrangling.slice_dice does. Constraints on
+    the map dimensions select the blocks that overlap the box. Blocks partly
+    inside it count as a whole, so min and max are then bounds that contain
+    the values of the box, and count and mean are those of the blocks; the
+    result has 'exact' False. With whole_blocks_only, those blocks are left
+    out instead, and the values of their cells in the box (see
+    get_edge_cells) are not counted. Returns None when the index cannot
+    answer, i.e. the variable or a constrained dimension is not indexed.
+    """
+    if var_name not in self.stats:
+      return None
+    stats = self.stats[var_name]
+    index_constraints = {}
+    block_indices = {}
+    exact = True
+    for dim, constraint in dim_constraints.items():
+      if dim not in self.map_dims:
+        if dim not in stats.dims:
+          return None
+        index_constraints[dim] = constraint
+        continue
+      if _get_block_dim(dim) not in stats.dims or dim not in self.map_coords:
+        return None
+      _, selected_count, block_sizes = self._select_cells(dim, constraint)
+      if whole_blocks_only:
+        blocks = np.flatnonzero(selected_count == block_sizes)
+      else:
+        blocks = np.flatnonzero(selected_count)
+        exact = exact and bool(np.all(selected_count[blocks] == block_sizes[blocks]))
+      block_indices[_get_block_dim(dim)] = blocks
+    if index_constraints:
+      stats = wrangling.slice_dice(
+        dataset=stats,
+        dim_constraints=index_constraints,
+        squeeze=False)
+    if block_indices:
+      stats = stats.isel(block_indices)
+    count = stats['count'].values
+    total_count = int(count.sum())
+    if total_count == 0:
+      return {'min': np.nan, 'max': np.nan, 'count': 0, 'mean': np.nan, 'exact': exact}
+    valid = count > 0
+    return {
+      'min': float(stats['min'].values[valid].min()),
+      'max': float(stats['max'].values[valid].max()),
+      'count': total_count,
+      'mean': float((stats['mean'].values[valid] * count[valid]).sum() / total_count),
+      'exact': exact
+    }
+
+
+  def get_edge_cells(self, dim_constraints: dict[str, slice|list] = {}) -> dict[str, np.ndarray]:
+    """
+    Get, for each map dimension where the box cuts blocks, a boolean mask
+    over the cells it selects (in the order of the data subset) that marks
+    those in blocks partly inside the box.
+    """
+    edge_cells = {}
+    for dim, constraint in dim_constraints.items():
+      if dim not in self.map_dims or dim not in self.map_coords:
+        continue
+      cells, selected_count, block_sizes = self._select_cells(dim, constraint)
+      is_edge = (selected_count != block_sizes)[cells // self.block_size]
+      if is_edge.any():
+        edge_cells[dim] = is_edge
+    return edge_cells
+
+
+  def _select_cells(
+    self,
+    map_dim: str,
+    constraint: slice | list
+  ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Get the cells of a map dimension selected by constraint, and the count
+    of them and the size of every block.
+    """
+    coord = self.map_coords[map_dim]
+    cells = xr.DataArray(np.arange(coord.size), dims=[map_dim], coords={map_dim: coord})
+    selected_cells = wrangling.slice_dice(
+      dataset=cells,
+      dim_constraints={map_dim: constraint},
+      squeeze=False).values
+    num_blocks = _count_blocks(coord.size, self.block_size)
+    selected_count = np.bincount(selected_cells // self.block_size, minlength=num_blocks)
+    block_sizes = np.minimum(self.block_size, coord.size - np.arange(num_blocks) * self.block_size)
+    return selected_cells, selected_count, block_sizes
@@ -0,0 +1,102 @@
+import numpy as np
+
+# Web-Mercator is undefined at the poles, tiles are clipped to this latitude.
+MAX_MERCATOR_LAT = 85.0511287798066
+
+
+def lon_to_tile_x(lon: float, zoom: int) -> int:
+  """
+  Get the column of the XYZ tile containing a longitude.
+  """
+  n = 2 ** zoom
+  x = int(np.floor((lon + 180.0) / 360.0 * n))
+  return int(np.clip(x, 0, n - 1))
+
+
+def lat_to_tile_y(lat: float, zoom: int) -> int:
+  """
+  Get the row of the XYZ tile containing a latitude. Rows grow southward.
+  """
+  n = 2 ** zoom
+  lat_rad = np.radians(np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+  y = int(np.floor((1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n))
+  return int(np.clip(y, 0, n - 1))
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> tuple[float, float, float, float]:
+  """
+  Get the geographic bounds of an XYZ tile.
+
+  It returns: lon_min, lat_min, lon_max, lat_max
+  """
+  n = 2 ** zoom
+  lon_min = x / n * 360.0 - 180.0
+  lon_max = (x + 1) / n * 360.0 - 180.0
+  lat_max = float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y / n)))))
+  lat_min = float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + 1) / n)))))
+  return lon_min, lat_min, lon_max, lat_max
+
+
+def tiles_for_extent(
+  lon_interval: list,
+  lat_interval: list,
+  zoom: int
+) -> list[tuple[int, int, int]]:
+  """
+  Get the (zoom, x, y) XYZ tiles that intersect a lon/lat extent.
+
+  lon_interval is a list with [west coord, east coord]
+  lat_interval is a list with [south coord, north coord]
+  """
+  x_min = lon_to_tile_x(lon_interval[0], zoom)
+  x_max = lon_to_tile_x(lon_interval[1], zoom)
+  y_min = lat_to_tile_y(lat_interval[1], zoom)
+  y_max = lat_to_tile_y(lat_interval[0], zoom)
+  return [
+    (zoom, x, y)
+    for x in range(x_min, x_max + 1)
+    for y in range(y_min, y_max + 1)
+  ]
+
+
+def tile_pixel_coords(
+  zoom: int,
+  x: int,
+  y: int,
+  tile_size: int = 256
+) -> tuple[np.ndarray, np.ndarray]:
+  """
+  Get the longitude of each pixel column and the latitude of each pixel row
+  (at the pixel centers) of an XYZ tile. Rows go from north to south.
+
+  It returns: lon_pixels, lat_pixels
+  """
+  n = 2 ** zoom
+  offsets = (np.arange(tile_size) + 0.5) / tile_size
+  lon_pixels = (x + offsets) / n * 360.0 - 180.0
+  lat_pixels = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+  return lon_pixels, lat_pixels
+
+
+def nearest_indices(
+  axis: np.ndarray,
+  points: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+  """
+  Get the index of the nearest node of a 1-D (ascending or descending)
+  axis for each point, and a mask of the points within half a cell of the
+  axis range.
+  """
+  axis = np.asarray(axis, dtype=float)
+  descending = axis.size > 1 and axis[0] > axis[-1]
+  ascending_axis = axis[::-1] if descending else axis
+  idx = np.clip(np.searchsorted(ascending_axis, points), 1, max(axis.size - 1, 1))
+  left = ascending_axis[idx - 1]
+  right = ascending_axis[np.minimum(idx, axis.size - 1)]
+  idx = np.where(np.abs(points - left) <= np.abs(right - points), idx - 1, idx)
+  idx = np.minimum(idx, axis.size - 1)
+  half_cell = np.abs(np.diff(ascending_axis)).max() / 2 if axis.size > 1 else 0.5
+  inside = (points >= ascending_axis[0] - half_cell) & (points <= ascending_axis[-1] + half_cell)
+  if descending:
+    idx = axis.size - 1 - idx
+  return idx, inside
@@ -1,21 +1,81 @@
+import hashlib
+from collections.abc import Callable
 import numpy as np
 import xarray as xr
 import pandas as pd
 from datetime import datetime
+from siaplotlib.processing import caching
+from siaplotlib.processing import fingerprint
 
 
 def slice_dice(
   dataset: xr.DataArray,
   dim_constraints: dict[str, slice|list],
   var: str | list = None,
-  squeeze = True
+  squeeze = True,
+  cache: caching.SubsetCache = None
 ) -> xr.DataArray:
   """
   Makes a subset by dimension contraints and a selected (and optional)
   list of variables. A single variable name can be passed as a string.
   The dimensions take the nearest values to the specified. Unique values
   in dimensions are warranteed.
+
+  With a SubsetCache (given or set as default with
+  caching.set_default_subset_cache) the subset is loaded and kept by the
+  dataset fingerprint and the arguments, and a repeated call returns it
+  without selecting again.
   """
+  if cache is None:
+    cache = caching.get_default_subset_cache()
+  cache_key = None
+  if cache is not None:
+    cache_key = get_subset_key(
+      dataset=dataset,
+      dim_constraints=dim_constraints,
+      var=var,
+      squeeze=squeeze)
+  if cache_key is not None:
+    subset = cache.get(cache_key)
+    if subset is None:
+      subset = _select_subset(dataset, dim_constraints, var, squeeze).load()
+      cache.put(cache_key, subset)
+    # A shallow copy, so changes to its coordinates or attributes do not reach the cache.
+    return subset.copy(deep=False)
+  return _select_subset(dataset, dim_constraints, var, squeeze)
+
+
+def get_subset_key(
+  dataset: xr.DataArray,
+  dim_constraints: dict[str, slice|list],
+  var: str | list = None,
+  squeeze = True
+) -> str | None:
+  """
+  Get the key of a subset made by slice_dice: the dataset fingerprint, the
+  normalised dimension constraints, the variables and squeeze. Returns None
+  if the arguments have no canonical form.
+  """
+  dataset_fingerprint = fingerprint.fingerprint_dataset(dataset)
+  if dataset_fingerprint is None:
+    return None
+  try:
+    key_source = repr((
+      dataset_fingerprint,
+      fingerprint.canonicalize(dim_constraints),
+      fingerprint.canonicalize(var),
+      bool(squeeze)))
+  except TypeError:
+    return None
+  return hashlib.sha256(key_source.encode()).hexdigest()
+
+
+def _select_subset(
+  dataset: xr.DataArray,
+  dim_constraints: dict[str, slice|list],
+  var: str | list = None,
+  squeeze = True
+) -> xr.DataArray:
   # Initializing.
   subset = dataset
 
@@ -73,6 +133,54 @@ def get_dim_unique_values(dataset: xr.Dataset):
   return dim_values
 
 
+def get_subset_sizes(
+  dataset: xr.Dataset | xr.DataArray,
+  dim_constraints: dict[str, slice|list],
+  var: str | list = None
+) -> dict[str, int]:
+  """
+  Get the length of each dimension of the subset that slice_dice would make,
+  from the coordinates alone, without selecting the data. Lists count their
+  distinct values, so the result is an upper bound when nearest values repeat.
+  """
+  subset = dataset
+  if var is not None:
+    subset = dataset[var]
+  sizes = dict(subset.sizes)
+  for dim_name, constraint in dim_constraints.items():
+    if dim_name not in sizes:
+      continue
+    if type(constraint) is slice:
+      sizes[dim_name] = int(subset[dim_name].sel({dim_name: constraint}).size)
+    elif type(constraint) is list:
+      sizes[dim_name] = len(set(constraint))
+    else:
+      sizes[dim_name] = 1
+  return sizes
+
+
+def estimate_subset_nbytes(
+  dataset: xr.Dataset | xr.DataArray,
+  dim_constraints: dict[str, slice|list],
+  var: str | list = None
+) -> int:
+  """
+  Estimate the bytes the subset made by slice_dice takes once loaded.
+  """
+  subset = dataset
+  if var is not None:
+    subset = dataset[var]
+  sizes = get_subset_sizes(dataset=subset, dim_constraints=dim_constraints)
+  data_arrays = [subset]
+  if isinstance(subset, xr.Dataset):
+    data_arrays = list(subset.data_vars.values())
+  nbytes = 0
+  for data_array in data_arrays:
+    num_values = int(np.prod([sizes[dim_name] for dim_name in data_array.dims]))
+    nbytes += num_values * data_array.dtype.itemsize
+  return nbytes
+
+
 def get_coords(
   dataset: xr.DataArray,
   lon_dim_name: str,
@@ -134,7 +242,8 @@ def group_into_series(
   dataset: xr.DataArray,
   x_dim_name: str,
   grouping_dim_name: str,
-  reverse_axis: bool = False
+  reverse_axis: bool = False,
+  check_cancelled: Callable[[], None] = None
 ) -> list[pd.Series]:
   """
   Generate a list of series from a xarray.DataArray using
@@ -142,6 +251,8 @@ def group_into_series(
   xarray.DataArray as data. The axes can be reversed to use
   the dimension as data and the only variable as index.
   Each series is determined by the grouping variable.
+  check_cancelled, if given, is called before each group so that
+  a cancelled build stops early.
   """
   groups = None
   if grouping_dim_name is not None:
@@ -162,6 +273,8 @@ def group_into_series(
     series_list.append(series)
   else:
     for group in groups:
+      if check_cancelled is not None:
+        check_cancelled()
       data = dataset.sel({
         grouping_dim_name: group
       }).data
@@ -190,7 +303,13 @@ def calc_unique_velocity(
   eastward_var_name: str,
   northward_var_name:str,
   unique_velocity_name: str,
+  store = None
 ) -> xr.Dataset:
+  """
+  Adds the speed from the eastward and northward velocities as
+  unique_velocity_name. With a derived_fields.DerivedFieldStore in store,
+  it is memory-mapped from the store, and computed only the first time.
+  """
   # {'long_name': 'Eastward velocity', 'standard_name': 'eastward_sea_water_velocity', 'units': 'm s-1', 'unit_long': 'Meters per second', 'cell_methods': 'area: mean'}
   attrs = {
     'long_name': 'Current Velocity'
@@ -200,6 +319,40 @@ def calc_unique_velocity(
     attrs['units'] = northward_attrs['units']
   if 'unit_long' in northward_attrs:
     attrs['unit_long'] = northward_attrs['unit_long']
-  dataset[unique_velocity_name] =  np.sqrt(dataset[eastward_var_name]**2 + dataset[northward_var_name]**2)
+  if store is not None:
+    dataset[unique_velocity_name] = store.get_field(
+      dataset=dataset,
+      eastward_var_name=eastward_var_name,
+      northward_var_name=northward_var_name,
+      field='SPEED')
+  else:
+    dataset[unique_velocity_name] =  np.sqrt(dataset[eastward_var_name]**2 + dataset[northward_var_name]**2)
   dataset[unique_velocity_name].attrs.update(attrs)
   return dataset
+
+
+def block_average(
+  data: np.ndarray,
+  y_step: int,
+  x_step: int
+) -> np.ndarray:
+  """
+  Average the last two axes of an array in blocks of shape (y_step, x_step),
+  ignoring NaN values. Trailing blocks smaller than the step are averaged
+  with the values available. Blocks with no valid values are NaN.
+  """
+  data = np.asarray(data, dtype=float)
+  n_y, n_x = data.shape[-2:]
+  pad_y = -n_y % y_step
+  pad_x = -n_x % x_step
+  if pad_y or pad_x:
+    pad_width = [(0, 0)] * (data.ndim - 2) + [(0, pad_y), (0, pad_x)]
+    data = np.pad(data, pad_width, constant_values=np.nan)
+  blocks = data.reshape(
+    data.shape[:-2] + (data.shape[-2] // y_step, y_step, data.shape[-1] // x_step, x_step))
+  valid = ~np.isnan(blocks)
+  sums = np.where(valid, blocks, 0).sum(axis=(-3, -1))
+  counts = valid.sum(axis=(-3, -1))
+  means = np.full(sums.shape, np.nan)
+  np.divide(sums, counts, out=means, where=counts > 0)
+  return means
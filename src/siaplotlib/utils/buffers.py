@@ -0,0 +1,291 @@
+# Standard
+import io
+import os
+import mmap
+import shutil
+import tempfile
+from pathlib import Path
+
+# Size from which a SpillableBuffer moves its content to a temporary file.
+DEFAULT_SPILL_THRESHOLD = 64 * 1024 ** 2
+
+
+class SpillableBuffer(io.IOBase):
+  """
+  A binary buffer with the interface of io.BytesIO that keeps its content in
+  memory until it passes spill_threshold bytes, and from then on in a
+  temporary file in spill_dir (the system temporary directory by default).
+  Once spilled, getbuffer() returns a memory map of the file and save_to()
+  copies the file at the OS level, so the content is not read into Python
+  memory. The file is removed when the buffer is closed or freed.
+  """
+  def __init__(
+    self,
+    initial_bytes: bytes = b'',
+    spill_threshold: int = DEFAULT_SPILL_THRESHOLD,
+    spill_dir: str | Path = None
+  ) -> None:
+    super().__init__()
+    self.spill_threshold = spill_threshold
+    self.spill_dir = spill_dir
+    self._file = io.BytesIO()
+    self._spill_path: Path = None
+    self._mmap: mmap.mmap = None
+    if initial_bytes:
+      self.write(initial_bytes)
+      self.seek(0)
+
+
+  def is_spilled(self) -> bool:
+    return self._spill_path is not None
+
+
+  def _spill(self) -> None:
+    fd, spill_path = tempfile.mkstemp(prefix='siaplotlib-', suffix='.buff', dir=self.spill_dir)
+    spill_file = os.fdopen(fd, 'w+b')
+    position = self._file.tell()
+    spill_file.write(self._file.getbuffer())
+    spill_file.seek(position)
+    self._file = spill_file
+    self._spill_path = Path(spill_path)
+
+
+  def _release_mmap(self) -> None:
+    if self._mmap is not None:
+      try:
+        self._mmap.close()
+      except BufferError:
+        # A view of it is still alive, it is closed when freed.
+        pass
+      self._mmap = None
+
+
+  def write(self, data) -> int:
+    self._release_mmap()
+    if not self.is_spilled() and self._file.tell() + memoryview(data).nbytes > self.spill_threshold:
+      self._spill()
+    return self._file.write(data)
+
+
+  def read(self, size: int = -1) -> bytes:
+    return self._file.read(size)
+
+
+  def readinto(self, buffer) -> int:
+    return self._file.readinto(buffer)
+
+
+  def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+    return self._file.seek(offset, whence)
+
+
+  def tell(self) -> int:
+    return self._file.tell()
+
+
+  def truncate(self, size: int = None) -> int:
+    self._release_mmap()
+    return self._file.truncate(size)
+
+
+  def flush(self) -> None:
+    self._file.flush()
+
+
+  def fileno(self) -> int:
+    # Unsupported while in memory, as in BytesIO.
+    return self._file.fileno()
+
+
+  def readable(self) -> bool:
+    return True
+
+
+  def writable(self) -> bool:
+    return True
+
+
+  def seekable(self) -> bool:
+    return True
+
+
+  def getbuffer(self) -> memoryview:
+    """
+    Get a read-only view of the whole content, over a memory map of the
+    file if it was spilled.
+    """
+    if not self.is_spilled():
+      return self._file.getbuffer()
+    self._file.flush()
+    if os.path.getsize(self._spill_path) == 0:
+      return memoryview(b'')
+    if self._mmap is None:
+      self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(self._mmap)
+
+
+  def getvalue(self) -> bytes:
+    return bytes(self.getbuffer())
+
+
+  def save_to(self, filepath: str | Path) -> None:
+    """
+    Write the whole content to filepath. A spilled buffer is copied file to
+    file by the OS.
+    """
+    if not self.is_spilled():
+      with open(filepath, 'wb') as f:
+        f.write(self._file.getbuffer())
+      return
+    self._file.flush()
+    shutil.copyfile(self._spill_path, filepath)
+
+
+  def close(self) -> None:
+    if self.closed:
+      return
+    # Flushes the buffer before marking it as closed.
+    super().close()
+    self._release_mmap()
+    self._file.close()
+    if self._spill_path is not None:
+      self._spill_path.unlink(missing_ok=True)
+
+
+  def __getstate__(self):
+    # Sent as bytes, the receiver spills them again if they are large.
+    return {
+      'initial_bytes': self.getvalue(),
+      'spill_threshold': self.spill_threshold,
+      'spill_dir': self.spill_dir
+    }
+
+
+  def __setstate__(self, state):
+    self.__init__(**state)
+
+
+  def __del__(self):
+    self.close()
+
+
+class ReadOnlyBuffer(io.IOBase):
+  """
+  A read-only binary buffer with the reading interface of io.BytesIO over
+  bytes-like content that is not copied, e.g. the memory map of a file (see
+  map_file) or the view of another buffer. Each one has its own position,
+  so several readers can share the same content.
+  """
+  def __init__(self, content = b'') -> None:
+    super().__init__()
+    self._view = memoryview(content).cast('B')
+    self._position = 0
+    self._mmap: mmap.mmap = None
+    self._filepath: Path = None
+
+
+  @classmethod
+  def map_file(cls, filepath: str | Path) -> 'ReadOnlyBuffer':
+    """
+    Get a buffer over a memory map of the file, so its pages are only read
+    when used. Closing the buffer leaves the file as it is.
+    """
+    buff = cls()
+    buff._map_file(filepath)
+    return buff
+
+
+  def _map_file(self, filepath: str | Path) -> None:
+    with open(filepath, 'rb') as f:
+      # Empty files can not be mapped.
+      if os.fstat(f.fileno()).st_size > 0:
+        self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap).cast('B')
+    self._filepath = Path(filepath)
+
+
+  def read(self, size: int = -1) -> bytes:
+    end = len(self._view)
+    if size is not None and size >= 0:
+      end = min(end, self._position + size)
+    data = self._view[self._position:end].tobytes()
+    self._position += len(data)
+    return data
+
+
+  def readinto(self, buffer) -> int:
+    target = memoryview(buffer).cast('B')
+    data = self.read(target.nbytes)
+    target[:len(data)] = data
+    return len(data)
+
+
+  def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+    if whence == io.SEEK_SET:
+      position = offset
+    elif whence == io.SEEK_CUR:
+      position = self._position + offset
+    elif whence == io.SEEK_END:
+      position = len(self._view) + offset
+    else:
+      raise ValueError(f'Invalid whence ({whence}).')
+    if position < 0:
+      raise ValueError(f'Negative seek position {position}.')
+    self._position = position
+    return position
+
+
+  def tell(self) -> int:
+    return self._position
+
+
+  def readable(self) -> bool:
+    return True
+
+
+  def seekable(self) -> bool:
+    return True
+
+
+  def getbuffer(self) -> memoryview:
+    return self._view
+
+
+  def getvalue(self) -> bytes:
+    return self._view.tobytes()
+
+
+  def close(self) -> None:
+    if self.closed:
+      return
+    super().close()
+    try:
+      self._view.release()
+    except BufferError:
+      # Shared with another reader.
+      pass
+    self._view = memoryview(b'')
+    if self._mmap is not None:
+      try:
+        self._mmap.close()
+      except BufferError:
+        # A view of it is still alive, it is closed when freed.
+        pass
+      self._mmap = None
+
+
+  def __getstate__(self):
+    # Mapped files are mapped again by the receiver.
+    if self._filepath is not None:
+      return {'filepath': self._filepath}
+    return {'content': self.getvalue()}
+
+
+  def __setstate__(self, state):
+    self.__init__(content=state.get('content', b''))
+    if 'filepath' in state:
+      self._map_file(state['filepath'])
+
+
+  def __del__(self):
+    self.close()
@@ -36,3 +36,13 @@ class DuplicatedAsyncRunnerException(SiaException):
 class AsyncRunnerMissingException(SiaException):
   def __init__(self, **kwargs):
     super().__init__(**kwargs)
+
+
+class SchedulerQueueFullException(SiaException):
+  def __init__(self, **kwargs):
+    super().__init__(**kwargs)
+
+
+class BuildCancelledException(SiaException):
+  def __init__(self, **kwargs):
+    super().__init__(**kwargs)
@@ -11,6 +11,19 @@ class LoggingFeatures:
       print(*args, **kwargs, file=self.log_stream)
 
 
+  def __getstate__(self):
+    # Streams cannot be pickled (e.g. to send the object to a worker process).
+    state = self.__dict__.copy()
+    state['log_stream'] = None
+    return state
+
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    if self.log_stream is None:
+      self.log_stream = sys.stderr
+
+
 class LogStream:
   def __init__(self, callback = None) -> None:
     self.data = []
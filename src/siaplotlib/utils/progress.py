@@ -0,0 +1,115 @@
+# Standard
+import time
+from collections.abc import Callable
+from threading import Lock
+
+
+class BuildProgress:
+  """
+  A snapshot of the progress of a build. Times are in seconds. total and
+  eta are None when the stage has no known number of steps.
+  """
+  __slots__ = ('stage', 'done', 'total', 'elapsed', 'eta')
+
+  def __init__(
+    self,
+    stage: str,
+    done: int,
+    total: int | None,
+    elapsed: float,
+    eta: float | None
+  ) -> None:
+    self.stage = stage
+    self.done = done
+    self.total = total
+    self.elapsed = elapsed
+    self.eta = eta
+
+
+  def __repr__(self) -> str:
+    return (f'BuildProgress(stage={self.stage!r}, done={self.done}, total={self.total}, '
+      f'elapsed={self.elapsed:.2f}, eta={self.eta})')
+
+
+class ProgressTracker:
+  """
+  Keeps track of the stage and steps of a build and reports a BuildProgress
+  to the callback on every change. It is thread-safe, so frames rendered in
+  parallel can advance it. The progress can also be polled with progress().
+
+  min_interval (seconds) throttles the reports of advance(); stage changes
+  and the last step of a stage are always reported.
+  """
+  def __init__(
+    self,
+    callback: Callable[[BuildProgress], None] = None,
+    min_interval: float = 0
+  ) -> None:
+    self.callback = callback
+    self.min_interval = min_interval
+    self.__lock = Lock()
+    self.__start_time = time.monotonic()
+    self.__stage_start_time = self.__start_time
+    self.__last_report_time = 0
+    self.__stage = None
+    self.__done = 0
+    self.__total = None
+
+
+  def reset(self) -> None:
+    """
+    Restarts the clock, e.g. at the beginning of a new build.
+    """
+    with self.__lock:
+      self.__start_time = time.monotonic()
+      self.__stage_start_time = self.__start_time
+      self.__stage = None
+      self.__done = 0
+      self.__total = None
+
+
+  def start_stage(self, stage: str, total: int = None) -> None:
+    with self.__lock:
+      now = time.monotonic()
+      self.__stage = stage
+      self.__done = 0
+      self.__total = total
+      self.__stage_start_time = now
+      self.__last_report_time = now
+      if self.callback is None:
+        return
+      progress = self.__snapshot(now)
+    self.callback(progress)
+
+
+  def advance(self, steps: int = 1) -> None:
+    with self.__lock:
+      now = time.monotonic()
+      self.__done += steps
+      if self.callback is None:
+        return
+      is_last = self.__total is not None and self.__done >= self.__total
+      if not is_last and now - self.__last_report_time < self.min_interval:
+        return
+      self.__last_report_time = now
+      progress = self.__snapshot(now)
+    self.callback(progress)
+
+
+  def progress(self) -> BuildProgress:
+    with self.__lock:
+      return self.__snapshot(time.monotonic())
+
+
+  def __snapshot(self, now: float) -> BuildProgress:
+    # The ETA assumes the remaining steps take as long as the ones done.
+    eta = None
+    if self.__total is not None and self.__done > 0:
+      stage_elapsed = now - self.__stage_start_time
+      eta = stage_elapsed / self.__done * max(self.__total - self.__done, 0)
+    return BuildProgress(
+      stage=self.__stage,
+      done=self.__done,
+      total=self.__total,
+      elapsed=now - self.__start_time,
+      eta=eta)
@@ -1,15 +1,33 @@
 # Standard
+import io
+import copy
 import pathlib
 import sys
+import tempfile
 import unittest
 import time
+import asyncio
+from concurrent.futures import as_completed, ThreadPoolExecutor, CancelledError
 # Third party
 import xarray as xr
+import numpy as np
+from PIL import Image
+import matplotlib.pyplot as plt
 # Own
 from siaplotlib.chart_building import level_chart, line_chart
 from siaplotlib.chart_building.base_builder import ChartBuilder
+from siaplotlib.chart_building.batch import BatchHeatMapBuilder
 from siaplotlib.utils.log import LogStream
 from siaplotlib.charts.raw_image import ChartImage
+from siaplotlib.charts import base_chart
+from siaplotlib.charts import level_chart as level_chart_charts
+from siaplotlib.charts import resources
+from siaplotlib.charts import encoders
+from siaplotlib.charts import tile_pyramid
+from siaplotlib.processing.parallelism import BuildScheduler
+from siaplotlib.processing.caching import ChartCache
+from siaplotlib.utils.exceptions import BuildCancelledException
+from siaplotlib.utils.buffers import ReadOnlyBuffer
 # For testing
 from lib_utils.general_utils import VISUALIZATIONS_DIR, DATA_DIR
 import lib_utils.general_utils as general_utils
@@ -137,6 +155,49 @@ class TestArrowChart(ChartBuilderTestCase):
     time_end = time.time()
     print(f'----> Time elapsed: {time_end - time_start}s.', file=sys.stderr)
 
+   def test_images_auto_density(self):
+     self.process_ok = False
+     print('\n--- Starting ArrowChart static images test with automatic arrow density. ---',
+       file=sys.stderr)
+     time_start = time.time()
+     dataset_path = pathlib.Path(
+       DATA_DIR,
+       DATASET_NAME_1)
+     dataset = xr.open_dataset(dataset_path)
+
+     dim_constraints = {
+         time_dim_name: ['2022-10-11'],
+         depth_name: 0,
+         lat_dim_name : slice(10, 30),
+         lon_dim_name: slice(-90, -80)
+       }
+    
+     for block_average in [False, True]:
+       self.chart_filepath = pathlib.Path(VISUALIZATIONS_DIR, f'ArrowChart-auto-block_average-{block_average}')
+       chart_builder = line_chart.StaticArrowChartBuilder(
+         dataset = dataset,
+         eastward_var_name = 'uo',
+         northward_var_name = 'vo',
+         lat_dim_name = lat_dim_name ,
+         lon_dim_name = lon_dim_name,
+         depth_dim_name = depth_name,
+         grouping_level = 'AUTO',
+         target_arrows = 300,
+         block_average = block_average,
+         title = 'ArrowChart',
+         var_label='Velocidad (m/s)',
+         time_dim_name = time_dim_name,
+         dim_constraints = dim_constraints,
+         log_stream=log_stream,
+         verbose=True)
+       chart_builder.build(success_callback=self.success_build_callback, failure_callback=self.failure_build_callback)
+       chart_builder.wait() 
+       self.assertTrue(self.process_ok)
+
+     print('Finishing test.', file=sys.stderr)
+     time_end = time.time()
+     print(f'----> Time elapsed: {time_end - time_start}s.', file=sys.stderr)
+
 class TestRegionMap(ChartBuilderTestCase):
   def test_images(self):
     self.process_ok = False
@@ -274,6 +335,47 @@ class TestHeatMap(ChartBuilderTestCase):
     print(f'----> Time elapsed: {time_end - time_start}s.', file=sys.stderr)
 
 
+  def test_vector_images(self):
+    self.process_ok = False
+    print('\n--- Starting heatmap vector images test. ---',
+      file=sys.stderr)
+    time_start = time.time()
+    dataset_path = pathlib.Path(
+      DATA_DIR,
+      DATASET_NAME_1)
+    dataset = xr.open_dataset(dataset_path)
+
+    dim_constraints = {
+      time_dim_name: ['2022-10-11'],
+      depth_name: [0.49402499198913574]
+    }
+    for extension in ['svg', 'pdf']:
+      print(f'-> Heatmap {extension} image with rasterized data layer.',
+        file=sys.stderr)
+      self.chart_filepath = pathlib.Path(VISUALIZATIONS_DIR, f'heatmap-{plot_titles["thetao"]}.{extension}')
+      chart_builder = level_chart.StaticHeatMapBuilder(
+        dataset=dataset,
+        var_name='thetao',
+        title=plot_titles['thetao'],
+        var_label=plot_measure_label['thetao'],
+        dim_constraints=dim_constraints,
+        lat_dim_name=lat_dim_name,
+        lon_dim_name= lon_dim_name,
+        color_palette=palette_colors['thetao'],
+        rasterize_data=True,
+        raster_dpi=150,
+        log_stream=log_stream,
+        verbose=True)
+      chart_builder.build(success_callback=self.success_build_callback, failure_callback=self.failure_build_callback)
+      chart_builder.wait()
+      self.assertTrue(self.process_ok)
+
+    print(f'Images stored in: {VISUALIZATIONS_DIR}', file=sys.stderr)
+    print('Finishing test.', file=sys.stderr)
+    time_end = time.time()
+    print(f'----> Time elapsed: {time_end - time_start}s.', file=sys.stderr)
+
+
   def test_gifs(self):
     self.process_ok = False
     print('\n--- Starting heatmap gifs test. ---', file=sys.stderr)
@@ -318,6 +420,195 @@ class TestHeatMap(ChartBuilderTestCase):
     print(f'----> Time elapsed: {time_end - time_start}s.', file=sys.stderr)
 
 
+class TestBatchHeatMap(unittest.TestCase):
+  def test_images(self):
+    print('\n--- Starting batch heatmap images test. ---',
+      file=sys.stderr)
+    time_start = time.time()
+    dataset_path = pathlib.Path(
+      DATA_DIR,
+      DATASET_NAME_1)
+    dataset = xr.open_dataset(dataset_path)
+    depths = dataset[depth_name].data[:3].tolist()
+    specs = []
+    for variable in variables:
+      var_depths = [None] if variable == 'zos' else depths
+      for depth in var_depths:
+        spec = {
+          'name': f'batch-heatmap-{variable}' if depth is None else f'batch-heatmap-{variable}-{depth:.2f}',
+          'var_name': variable,
+          'title': plot_titles[variable],
+          'var_label': plot_measure_label[variable],
+          'color_palette': palette_colors[variable]
+        }
+        if depth is not None:
+          spec['dim_constraints'] = {depth_name: depth}
+        specs.append(spec)
+    chart_builder = BatchHeatMapBuilder(
+      dataset=dataset,
+      lat_dim_name=lat_dim_name,
+      lon_dim_name=lon_dim_name,
+      specs=specs,
+      dim_constraints={time_dim_name: ['2022-10-11']},
+      log_stream=log_stream,
+      verbose=True)
+    chart_builder.build().result()
+    chart_builder.save_all(VISUALIZATIONS_DIR)
+    self.assertEqual(len(chart_builder.charts), len(specs))
+    chart_builder.close()
+    print(f'Images stored in: {VISUALIZATIONS_DIR}', file=sys.stderr)
+    time_end = time.time()
+    print(f'----> Time elapsed: {time_end - time_start}s.', file=sys.stderr)
+
+
+  def test_invalid_specs(self):
+    with self.assertRaises(RuntimeError):
+      BatchHeatMapBuilder(
+        dataset=None,
+        lat_dim_name=lat_dim_name,
+        lon_dim_name=lon_dim_name,
+        specs=[{'name': 'a', 'var_name': 'thetao'}, {'name': 'a', 'var_name': 'so'}])
+    with self.assertRaises(RuntimeError):
+      BatchHeatMapBuilder(
+        dataset=None,
+        lat_dim_name=lat_dim_name,
+        lon_dim_name=lon_dim_name,
+        specs=[{'name': 'a', 'var_name': 'thetao', 'dim_constraints': {lat_dim_name: 10}}])
+
+
+class TestBatchOutputs(unittest.TestCase):
+  def setUp(self) -> None:
+    lon = np.arange(-90., -80., 1.)
+    lat = np.arange(10., 20., 1.)
+    time_values = np.array(['2020-01-01', '2020-01-02'], dtype='datetime64[ns]')
+    self.dataset = xr.Dataset(
+      {'thetao': (('time', 'latitude', 'longitude'), np.ones((2, lat.size, lon.size)))},
+      coords={'time': time_values, 'latitude': lat, 'longitude': lon})
+
+
+  def make_builder(self, **kwargs) -> BatchHeatMapBuilder:
+    return BatchHeatMapBuilder(
+      dataset=self.dataset,
+      lat_dim_name='latitude',
+      lon_dim_name='longitude',
+      specs=[{'name': 'temperature', 'var_name': 'thetao'}],
+      **kwargs)
+
+
+  def test_unconstrained_frame(self):
+    with self.assertRaises(RuntimeError):
+      self.make_builder().sync_build()
+
+
+  def test_save_all(self):
+    chart_builder = self.make_builder(encoder='PNG_FAST')
+    img_buff = io.BytesIO()
+    Image.new('RGB', (10, 10), 'red').save(img_buff, format='PNG')
+    chart_builder.charts = {'temperature': ChartImage(img_source=img_buff)}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      chart_builder.save_all(tmp_dir)
+      self.assertEqual(Image.open(pathlib.Path(tmp_dir, 'temperature.png')).format, 'PNG')
+      chart_builder.save_all(tmp_dir, encoder='WEBP')
+      self.assertEqual(Image.open(pathlib.Path(tmp_dir, 'temperature.webp')).format, 'WEBP')
+      # As any builder, saved to a path: the directory of the charts.
+      chart_builder.save(pathlib.Path(tmp_dir, 'batch'))
+      self.assertEqual(Image.open(pathlib.Path(tmp_dir, 'batch', 'temperature.png')).format, 'PNG')
+    chart_builder.close()
+
+
+class TestHeatMapTiles(ChartBuilderTestCase):
+  def test_tiles(self):
+    self.process_ok = False
+    print('\n--- Starting heatmap tile pyramid test. ---',
+      file=sys.stderr)
+    time_start = time.time()
+    dataset_path = pathlib.Path(
+      DATA_DIR,
+      DATASET_NAME_1)
+    dataset = xr.open_dataset(dataset_path)
+
+    dim_constraints = {
+      time_dim_name: ['2022-10-11'],
+      depth_name: [0.49402499198913574]
+    }
+    self.chart_filepath = pathlib.Path(VISUALIZATIONS_DIR, 'heatmap-tiles-Temperature')
+    chart_builder = level_chart.HeatMapTilesBuilder(
+      dataset=dataset,
+      var_name='thetao',
+      dim_constraints=dim_constraints,
+      lat_dim_name=lat_dim_name,
+      lon_dim_name=lon_dim_name,
+      zoom_levels=[3, 4, 5],
+      color_palette=palette_colors['thetao'],
+      log_stream=log_stream,
+      verbose=True)
+    chart_builder.build(success_callback=self.success_build_callback, failure_callback=self.failure_build_callback)
+    chart_builder.wait()
+
+    self.assertTrue(self.process_ok)
+    self.assertTrue(any(pathlib.Path(self.chart_filepath, '3').iterdir()))
+    print(f'Tiles stored in: {self.chart_filepath}', file=sys.stderr)
+    print('Finishing test.', file=sys.stderr)
+    time_end = time.time()
+    print(f'----> Time elapsed: {time_end - time_start}s.', file=sys.stderr)
+
+
+class TestTilePyramid(unittest.TestCase):
+  def make_tiles(self, offset: float = 0) -> tile_pyramid.HeatMapTiles:
+    lon = np.arange(-20., 20., 0.5)
+    lat = np.arange(-10., 10., 0.5)
+    data = np.add.outer(lat, lon) + offset
+    return tile_pyramid.HeatMapTiles(
+      data=data, lon_data=lon, lat_data=lat, vmin=-30, vmax=40, zoom_levels=[2, 3])
+
+
+  def test_skip_existing(self):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      tiles = self.make_tiles()
+      tiles.save(tmp_dir)
+      tile_path = next(pathlib.Path(tmp_dir, '3').rglob('*.png'))
+      mtime = tile_path.stat().st_mtime_ns
+      rendered = []
+      render_tile = tiles.render_tile
+      tiles.render_tile = lambda *tile: rendered.append(tile) or render_tile(*tile)
+      tiles.save(tmp_dir)
+      # Same pyramid key: only the empty tiles are tried again.
+      self.assertNotIn(tuple(int(part) for part in tile_path.with_suffix('').parts[-3:]), rendered)
+      self.assertEqual(tile_path.stat().st_mtime_ns, mtime)
+      # Other data: every tile is written again.
+      other_tiles = self.make_tiles(offset=5)
+      before = tile_path.read_bytes()
+      other_tiles.save(tmp_dir)
+      self.assertNotEqual(tile_path.read_bytes(), before)
+
+
+  def test_builder_frames(self):
+    values = np.arange(2 * 8 * 10, dtype=float).reshape(2, 8, 10)
+    dataset = xr.Dataset(
+      {'thetao': (('time', 'latitude', 'longitude'), values)},
+      coords={'time': [0, 1], 'latitude': np.linspace(-10, 10, 8), 'longitude': np.linspace(-20, 20, 10)})
+    tiles_params = {'var_name': 'thetao', 'lat_dim_name': 'latitude', 'lon_dim_name': 'longitude', 'zoom_levels': [0]}
+    chart_builder = level_chart.HeatMapTilesBuilder(dataset=dataset, **tiles_params)
+    with self.assertRaises(RuntimeError):
+      chart_builder.sync_build()
+    # Latitude last in the data, as it comes in some files.
+    chart_builder = level_chart.HeatMapTilesBuilder(
+      dataset=dataset.transpose('time', 'longitude', 'latitude'),
+      dim_constraints={'time': [1]},
+      **tiles_params)
+    _, subset = chart_builder.sync_build()
+    self.assertEqual(subset.dims, ('latitude', 'longitude'))
+    self.assertEqual((chart_builder._chart.vmin, chart_builder._chart.vmax), (80, 159))
+    chart_builder.close()
+
+
+  def test_preview(self):
+    tiles = self.make_tiles()
+    preview = tiles.get_preview()
+    self.assertEqual(preview.width % tiles.tile_size, 0)
+    self.assertTrue(np.asarray(preview)[..., 3].any())
+
+
 class TestContourMap(ChartBuilderTestCase):
   def test_images(self):
     self.process_ok = False
@@ -756,6 +1047,733 @@ class TestVerticalSlice(ChartBuilderTestCase):
     print(f'----> Time elapsed: {time_end - time_start}s.', file=sys.stderr)
 
 
+class TestTransect(ChartBuilderTestCase):
+  def test_static(self):
+    self.process_ok = False
+    print('\n--- Starting transect for static image. ---',
+      file=sys.stderr)
+    time_start = time.time()
+    dataset_path = pathlib.Path(
+      DATA_DIR,
+      DATASET_NAME_2)
+    dataset = xr.open_dataset(dataset_path)
+
+    date = '2020-01-01'
+    waypoints = [(15, -87), (20, -85), (24, -80)]
+    for variable in variables:
+      dim_constraints = {
+        time_dim_name: date
+      }
+      if variable == 'zos':
+        continue
+      print(f'-> Static transect for "{variable}" variable.',
+        file=sys.stderr)
+      chart_builder = level_chart.StaticTransectBuilder(
+        dataset=dataset,
+        var_name=variable,
+        waypoints=waypoints,
+        y_dim_name=depth_name,
+        lat_dim_name=lat_dim_name,
+        lon_dim_name=lon_dim_name,
+        title=f'{plot_titles[variable]} on {date}',
+        var_label=plot_measure_label[variable],
+        y_label='Depth (m)',
+        dim_constraints=dim_constraints,
+        verbose=True)
+      self.chart_filepath = pathlib.Path(VISUALIZATIONS_DIR,f'transect-{plot_titles[variable]}')
+      chart_builder.build(success_callback=self.success_build_callback, failure_callback=self.failure_build_callback)
+      chart_builder.wait()
+    
+    self.assertTrue(self.process_ok)
+    print(f'Images stored in: {VISUALIZATIONS_DIR}', file=sys.stderr)
+    print('Finishing test.', file=sys.stderr)
+    time_end = time.time()
+    print(f'----> Time elapsed: {time_end - time_start}s.', file=sys.stderr)
+
+
+class TestTransectPaths(unittest.TestCase):
+  def setUp(self) -> None:
+    lon = np.arange(-180., 180., 1.)
+    lat = np.arange(-10., 11., 1.)
+    depth = np.array([0., 10.])
+    time_values = np.array(['2020-01-01', '2020-01-02'], dtype='datetime64[ns]')
+    values = np.broadcast_to(np.cos(np.radians(lon)), (2, 2, lat.size, lon.size))
+    self.dataset = xr.Dataset(
+      {'thetao': (('time', 'depth', 'latitude', 'longitude'), values.copy())},
+      coords={'time': time_values, 'depth': depth, 'latitude': lat, 'longitude': lon})
+
+
+  def make_builder(self, waypoints, dim_constraints, **kwargs):
+    return level_chart.StaticTransectBuilder(
+      dataset=self.dataset,
+      var_name='thetao',
+      waypoints=waypoints,
+      y_dim_name='depth',
+      lat_dim_name='latitude',
+      lon_dim_name='longitude',
+      title='Transect',
+      var_label='T',
+      y_label='Depth (m)',
+      num_points=21,
+      dim_constraints=dim_constraints,
+      **kwargs)
+
+
+  def test_antimeridian(self):
+    builder = self.make_builder([(0, 170), (0, -170)], {'time': ['2020-01-01']})
+    builder.sync_build()
+    chart = builder._chart
+    # The short way, about 20 degrees along the equator.
+    self.assertAlmostEqual(chart.x_values[-1], 2224, delta=5)
+    self.assertEqual(chart.z_values.shape, (2, 21))
+    self.assertTrue(np.all(chart.path_lon >= 170) and np.all(chart.path_lon <= 190))
+    # cos(lon) is close to -1 all along the path.
+    self.assertLess(np.nanmax(chart.z_values), -0.9)
+
+
+  def test_base_parameters(self):
+    cache = ChartCache()
+    builder = self.make_builder(
+      [(0, 0), (5, 5)], {'time': ['2020-01-01']},
+      lazy=False, cache=cache, priority='HIGH', submitter='tests', encoder='PNG_FAST')
+    self.assertFalse(builder.lazy)
+    self.assertIs(builder.cache, cache)
+    self.assertEqual((builder.priority, builder.submitter, builder.encoder), ('HIGH', 'tests', 'PNG_FAST'))
+    builder.sync_build()
+    self.assertTrue(builder._chart.is_built())
+    builder.close()
+
+
+  def test_unconstrained_dimension(self):
+    builder = self.make_builder([(0, 0), (5, 5)], {})
+    with self.assertRaises(RuntimeError):
+      builder.sync_build()
+
+
+class TestLazyCharts(unittest.TestCase):
+  def make_wind_rose(self):
+    rng = np.random.default_rng(0)
+    return level_chart_charts.WindRose(
+      speed=rng.uniform(0, 2, 500),
+      direction=rng.uniform(0, 360, 500),
+      title='Lazy windrose',
+      bin_range=np.arange(0, 2, 0.5),
+      nsector=16,
+      build_on_create=False)
+
+
+  def test_figure_built_on_demand(self):
+    chart = self.make_wind_rose()
+    self.assertFalse(chart.is_built())
+    img_buff = chart.get_buffer()
+    self.assertTrue(chart.is_built())
+    self.assertGreater(len(img_buff.getvalue()), 0)
+    chart.close()
+    self.assertFalse(chart.is_built())
+
+
+  def test_builder_save_builds_chart(self):
+    chart_builder = ChartBuilder(dataset=None)
+    chart_builder._chart = self.make_wind_rose()
+    self.assertTrue(chart_builder.lazy)
+    self.assertFalse(chart_builder._chart.is_built())
+    general_utils.mkdir_r(VISUALIZATIONS_DIR)
+    chart_builder.save(pathlib.Path(VISUALIZATIONS_DIR, 'lazy-windrose.png'))
+    self.assertTrue(chart_builder._chart.is_built())
+    chart_builder.close()
+
+
+class SyntheticWindRoseBuilder(ChartBuilder):
+  """
+  Builds a wind rose from random values, so no dataset files are needed.
+  """
+  def __init__(
+    self,
+    seed: int = 0,
+    log_stream=sys.stderr,
+    verbose: bool = False,
+    cache: ChartCache = None
+  ) -> None:
+    super().__init__(dataset=None, log_stream=log_stream, verbose=verbose, cache=cache)
+    self.seed = seed
+
+
+  def sync_build(self):
+    rng = np.random.default_rng(self.seed)
+    subset = rng.uniform(0, 2, 200)
+    self._chart = level_chart_charts.WindRose(
+      speed=subset,
+      direction=rng.uniform(0, 360, 200),
+      title=f'Synthetic windrose {self.seed}',
+      bin_range=np.arange(0, 2, 0.5),
+      nsector=16,
+      build_on_create=not self.lazy,
+      log_stream=self.log_stream,
+      verbose=self.verbose)
+    return self, subset
+
+
+class TestBuildFutures(unittest.TestCase):
+  def test_build_future(self):
+    chart_builder = SyntheticWindRoseBuilder()
+    future = chart_builder.build()
+    builder, subset = future.result(timeout=60)
+    self.assertIs(builder, chart_builder)
+    self.assertEqual(len(subset), 200)
+    chart_builder.close()
+
+
+  def test_as_completed(self):
+    chart_builders = [SyntheticWindRoseBuilder(seed=seed) for seed in range(4)]
+    futures = [chart_builder.build() for chart_builder in chart_builders]
+    built = [future.result()[0] for future in as_completed(futures, timeout=60)]
+    self.assertCountEqual(built, chart_builders)
+    for chart_builder in chart_builders:
+      chart_builder.close()
+
+
+  def test_build_future_failure(self):
+    chart_builder = ChartBuilder(dataset=None)
+    future = chart_builder.build()
+    self.assertIsInstance(future.exception(timeout=60), NotImplementedError)
+
+
+class SlowChartBuilder(ChartBuilder):
+  def __init__(self, seconds: float) -> None:
+    super().__init__(dataset=None)
+    self.seconds = seconds
+
+
+  def sync_build(self):
+    time.sleep(self.seconds)
+    return self, None
+
+
+class TestAsyncioBuild(unittest.IsolatedAsyncioTestCase):
+  async def test_build_async(self):
+    chart_builder = SyntheticWindRoseBuilder()
+    builder, subset = await chart_builder.build_async()
+    self.assertIs(builder, chart_builder)
+    self.assertEqual(len(subset), 200)
+    chart_builder.close()
+
+
+  async def test_gather_with_executor(self):
+    chart_builders = [SyntheticWindRoseBuilder(seed=seed) for seed in range(3)]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+      results = await asyncio.gather(*[
+        chart_builder.build_async(executor=executor) for chart_builder in chart_builders])
+    self.assertEqual([result[0] for result in results], chart_builders)
+
+
+  async def test_progress_done(self):
+    reports = []
+    chart_builder = SyntheticWindRoseBuilder()
+    chart_builder.set_progress_callback(reports.append)
+    await chart_builder.build_async()
+    self.assertEqual(reports[-1].stage, 'DONE')
+    chart_builder.close()
+
+
+  async def test_timeout(self):
+    chart_builder = SlowChartBuilder(seconds=0.5)
+    with self.assertRaises(asyncio.TimeoutError):
+      await chart_builder.build_async(timeout=0.05)
+
+
+class SteppedChartBuilder(ChartBuilder):
+  def __init__(self, steps: int, seconds_per_step: float, scheduler: BuildScheduler = None) -> None:
+    super().__init__(dataset=None, scheduler=scheduler)
+    self.steps = steps
+    self.seconds_per_step = seconds_per_step
+    self.completed_steps = 0
+
+
+  def sync_build(self):
+    for _ in range(self.steps):
+      self.check_cancelled()
+      time.sleep(self.seconds_per_step)
+      self.completed_steps += 1
+    return self, None
+
+
+class TestBuildCancellation(unittest.TestCase):
+  def test_cancel_running_build(self):
+    chart_builder = SteppedChartBuilder(steps=100, seconds_per_step=0.01)
+    build_future = chart_builder.build()
+    time.sleep(0.05)
+    chart_builder.cancel()
+    with self.assertRaises(BuildCancelledException):
+      build_future.result(timeout=5)
+    self.assertLess(chart_builder.completed_steps, 100)
+    self.assertTrue(chart_builder.is_cancelled())
+
+
+  def test_cancel_queued_build(self):
+    scheduler = BuildScheduler(max_workers=1)
+    try:
+      blocking_builder = SteppedChartBuilder(steps=10, seconds_per_step=0.02, scheduler=scheduler)
+      queued_builder = SteppedChartBuilder(steps=1, seconds_per_step=0, scheduler=scheduler)
+      blocking_future = blocking_builder.build()
+      queued_future = queued_builder.build()
+      queued_builder.cancel()
+      with self.assertRaises(CancelledError):
+        queued_future.result(timeout=5)
+      blocking_future.result(timeout=5)
+      self.assertEqual(queued_builder.completed_steps, 0)
+    finally:
+      scheduler.shutdown()
+
+
+  def test_rebuild_after_cancel(self):
+    chart_builder = SteppedChartBuilder(steps=3, seconds_per_step=0)
+    chart_builder.cancel()
+    builder, _ = chart_builder.build().result(timeout=5)
+    self.assertEqual(builder.completed_steps, 3)
+
+
+class SyntheticWindRoseGifBuilder(ChartBuilder):
+  def __init__(self, num_frames: int) -> None:
+    super().__init__(dataset=None)
+    self.num_frames = num_frames
+
+
+  def sync_build(self):
+    self.progress.start_stage('PREPARING_DATA')
+    rng = np.random.default_rng(0)
+    chart_list = [
+      level_chart_charts.WindRose(
+        speed=rng.uniform(0, 2, 50),
+        direction=rng.uniform(0, 360, 50),
+        title=f'Frame {i}',
+        bin_range=np.arange(0, 2, 0.5),
+        nsector=8,
+        build_on_create=False)
+      for i in range(self.num_frames)]
+    img_buff = self._make_gif(chart_list)
+    self._chart = ChartImage(img_source=img_buff)
+    return self, None
+
+
+class TestBuildProgress(unittest.TestCase):
+  def test_progress_callback(self):
+    reports = []
+    chart_builder = SyntheticWindRoseGifBuilder(num_frames=3)
+    chart_builder.set_progress_callback(reports.append)
+    chart_builder.build().result(timeout=120)
+    chart_builder.close()
+    stages = [report.stage for report in reports]
+    self.assertEqual(stages[0], 'PREPARING_DATA')
+    self.assertEqual(stages[-1], 'DONE')
+    self.assertIn('ENCODING_GIF', stages)
+    frame_reports = [report for report in reports if report.stage == 'RENDERING_FRAMES']
+    self.assertEqual([report.done for report in frame_reports], [0, 1, 2, 3])
+    self.assertTrue(all(report.total == 3 for report in frame_reports))
+    self.assertEqual(frame_reports[-1].eta, 0)
+    elapsed = [report.elapsed for report in reports]
+    self.assertEqual(elapsed, sorted(elapsed))
+
+
+class CountingChartBuilder(ChartBuilder):
+  runs = 0
+
+  def __init__(
+    self,
+    dataset,
+    dim_constraints: dict = {},
+    fail: bool = False,
+    cache: ChartCache = None
+  ) -> None:
+    super().__init__(dataset=dataset, cache=cache)
+    self.dim_constraints = dim_constraints
+    self.fail = fail
+
+
+  def sync_build(self):
+    CountingChartBuilder.runs += 1
+    time.sleep(0.2)
+    self.check_cancelled()
+    if self.fail:
+      raise RuntimeError('Build failed.')
+    self._chart = ChartImage(img_source=io.BytesIO(b'chart'))
+    return self, self.dataset
+
+
+class TestBuildCoalescing(unittest.TestCase):
+  def setUp(self) -> None:
+    CountingChartBuilder.runs = 0
+    self.dataset = np.arange(10)
+
+
+  def test_build_key(self):
+    constraints = {'depth': [0.5], 'time': slice('2022-10-01', '2022-10-11')}
+    chart_builder = CountingChartBuilder(dataset=self.dataset, dim_constraints=constraints)
+    same_builder = CountingChartBuilder(dataset=self.dataset, dim_constraints=dict(reversed(constraints.items())))
+    other_builder = CountingChartBuilder(dataset=self.dataset, dim_constraints={'depth': [1.5]})
+    same_content_builder = CountingChartBuilder(dataset=np.arange(10), dim_constraints=constraints)
+    other_dataset_builder = CountingChartBuilder(dataset=np.arange(1, 11), dim_constraints=constraints)
+    self.assertEqual(chart_builder.get_build_key(), same_builder.get_build_key())
+    self.assertEqual(chart_builder.get_build_key(), same_content_builder.get_build_key())
+    self.assertNotEqual(chart_builder.get_build_key(), other_builder.get_build_key())
+    self.assertNotEqual(chart_builder.get_build_key(), other_dataset_builder.get_build_key())
+    self.assertIsNone(CountingChartBuilder(dataset=self.dataset, dim_constraints={'depth': object()}).get_build_key())
+
+
+  def test_forwarded_options(self):
+    region_params = {'amplitude': 1, 'lon_dim_min': -10, 'lon_dim_max': 10, 'lat_dim_min': -5, 'lat_dim_max': 5}
+    scheduler = BuildScheduler(max_workers=1)
+    try:
+      chart_builder = line_chart.StaticRegionMapBuilder(
+        **region_params,
+        lazy=False,
+        scheduler=scheduler,
+        priority='HIGH',
+        encoder='PNG_FAST')
+      self.assertFalse(chart_builder.lazy)
+      self.assertIs(chart_builder.scheduler, scheduler)
+      self.assertEqual(chart_builder.priority, 'HIGH')
+      self.assertEqual(chart_builder.encoder, 'PNG_FAST')
+      # Options do not change the chart.
+      self.assertIsNotNone(chart_builder.get_build_key())
+      self.assertEqual(
+        chart_builder.get_build_key(),
+        line_chart.StaticRegionMapBuilder(**region_params).get_build_key())
+    finally:
+      scheduler.shutdown()
+
+
+  def test_identical_builds_run_once(self):
+    chart_builders = [CountingChartBuilder(dataset=self.dataset, dim_constraints={'depth': [0.5]}) for _ in range(3)]
+    futures = [chart_builder.build(coalesce=True) for chart_builder in chart_builders]
+    for chart_builder, future in zip(chart_builders, futures):
+      builder, subset = future.result(timeout=10)
+      self.assertIs(builder, chart_builder)
+      self.assertIs(subset, self.dataset)
+      self.assertEqual(builder._chart.get_buffer().getvalue(), b'chart')
+    self.assertEqual(CountingChartBuilder.runs, 1)
+    # Closing one of them leaves the others usable.
+    chart_builders[0].close()
+    self.assertEqual(chart_builders[1]._chart.get_buffer().getvalue(), b'chart')
+    # Once finished, the same request runs again.
+    chart_builders[0].build(coalesce=True).result(timeout=10)
+    self.assertEqual(CountingChartBuilder.runs, 2)
+
+
+  def test_different_builds_run_apart(self):
+    futures = [
+      CountingChartBuilder(dataset=self.dataset, dim_constraints={'depth': [depth]}).build(coalesce=True)
+      for depth in [0.5, 1.5]]
+    for future in futures:
+      future.result(timeout=10)
+    self.assertEqual(CountingChartBuilder.runs, 2)
+
+
+  def test_shared_failure(self):
+    futures = [
+      CountingChartBuilder(dataset=self.dataset, fail=True).build(coalesce=True)
+      for _ in range(2)]
+    for future in futures:
+      self.assertIsInstance(future.exception(timeout=10), RuntimeError)
+    self.assertEqual(CountingChartBuilder.runs, 1)
+
+
+  def test_cancelled_leader(self):
+    leader = CountingChartBuilder(dataset=self.dataset)
+    follower = CountingChartBuilder(dataset=self.dataset)
+    leader_future = leader.build(coalesce=True)
+    follower_future = follower.build(coalesce=True)
+    leader.cancel()
+    with self.assertRaises(BuildCancelledException):
+      leader_future.result(timeout=10)
+    builder, _ = follower_future.result(timeout=10)
+    self.assertIs(builder, follower)
+    self.assertEqual(builder._chart.get_buffer().getvalue(), b'chart')
+    self.assertEqual(CountingChartBuilder.runs, 2)
+
+
+  def test_shared_figure(self):
+    chart_builders = [SyntheticWindRoseBuilder() for _ in range(2)]
+    futures = [chart_builder.build(coalesce=True) for chart_builder in chart_builders]
+    for future in futures:
+      future.result(timeout=60)
+    leader, follower = chart_builders
+    # The follower gets the rendered figure, not the figure itself.
+    self.assertIsInstance(follower._chart, ChartImage)
+    self.assertEqual(follower._chart.get_buffer().getvalue(), leader._get_rendered_png())
+    leader.close()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      follower.save(pathlib.Path(tmp_dir, 'windrose.png'))
+      follower.save(pathlib.Path(tmp_dir, 'windrose.svg'))
+      self.assertTrue(pathlib.Path(tmp_dir, 'windrose.svg').read_bytes().lstrip().startswith(b'<'))
+    follower.close()
+
+
+class TestMemoryEstimate(unittest.TestCase):
+  def test_figure_size(self):
+    chart_builder = line_chart.StaticRegionMapBuilder(
+      amplitude=1,
+      lon_dim_min=-10,
+      lon_dim_max=10,
+      lat_dim_min=-5,
+      lat_dim_max=5)
+    self.assertEqual(chart_builder.estimate_image_bytes(), 10 * 6 * 300 ** 2 * 4)
+    self.assertEqual(chart_builder.estimate_memory(), 2 * 10 * 6 * 300 ** 2 * 4)
+
+
+  def test_tiles(self):
+    chart_builder = level_chart.HeatMapTilesBuilder(
+      dataset=None,
+      lat_dim_name='latitude',
+      lon_dim_name='longitude',
+      zoom_levels=[0],
+      tile_size=256,
+      max_workers=2)
+    self.assertEqual(chart_builder.estimate_image_bytes(), 2 * 256 ** 2 * 12)
+
+
+class TestChartCache(unittest.TestCase):
+  def setUp(self) -> None:
+    CountingChartBuilder.runs = 0
+
+
+  def test_cache_hit(self):
+    cache = ChartCache()
+    chart_builder = CountingChartBuilder(dataset=np.arange(10), dim_constraints={'depth': [0.5]}, cache=cache)
+    builder, subset = chart_builder.build().result(timeout=10)
+    self.assertIsNotNone(subset)
+    # Stored once the chart is rendered, not by the build.
+    self.assertIsNone(cache.get(chart_builder.get_cache_key()))
+    self.assertEqual(chart_builder.get_buffer().getvalue(), b'chart')
+    # Same content and parameters, on a new builder and dataset object.
+    cached_builder = CountingChartBuilder(dataset=np.arange(10), dim_constraints={'depth': [0.5]}, cache=cache)
+    callback_values = []
+    builder, subset = cached_builder.build(
+      success_callback=lambda *values: callback_values.append(values)).result(timeout=10)
+    # No subset is made for cached charts.
+    self.assertIsNone(subset)
+    self.assertEqual(callback_values, [(cached_builder, None)])
+    self.assertIsInstance(builder._chart, ChartImage)
+    self.assertEqual(builder._chart.get_buffer().getvalue(), b'chart')
+    self.assertEqual(CountingChartBuilder.runs, 1)
+    # Other parameters miss.
+    other_builder = CountingChartBuilder(dataset=np.arange(10), dim_constraints={'depth': [1.5]}, cache=cache)
+    other_builder.build().result(timeout=10)
+    self.assertEqual(CountingChartBuilder.runs, 2)
+
+
+  def test_vector_output_of_cached_chart(self):
+    cache = ChartCache()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      chart_builder = SyntheticWindRoseBuilder(cache=cache)
+      chart_builder.build().result(timeout=60)
+      chart_builder.save(pathlib.Path(tmp_dir, 'windrose.png'))
+      png_bytes = pathlib.Path(tmp_dir, 'windrose.png').read_bytes()
+      self.assertEqual(cache.get(chart_builder.get_cache_key()), png_bytes)
+      chart_builder.close()
+      cached_builder = SyntheticWindRoseBuilder(cache=cache)
+      _, subset = cached_builder.build().result(timeout=60)
+      self.assertIsNone(subset)
+      self.assertEqual(cached_builder.get_buffer().getvalue(), png_bytes)
+      cached_builder.save(pathlib.Path(tmp_dir, 'windrose.svg'))
+      self.assertTrue(pathlib.Path(tmp_dir, 'windrose.svg').read_bytes().lstrip().startswith(b'<'))
+      cached_builder.close()
+
+
+class TestChartResources(unittest.TestCase):
+  def test_shared_resources(self):
+    self.assertIs(resources.get_colormap('plasma'), resources.get_colormap('plasma'))
+    self.assertEqual(resources.get_colormap(None).name, 'viridis')
+    self.assertIs(resources.get_norm(0, 10), resources.get_norm(0.0, 10.0))
+    norm = resources.get_norm(0, 10, levels=np.linspace(0, 10, 6))
+    self.assertIs(norm, resources.get_norm(0, 10, levels=[0, 2, 4, 6, 8, 10]))
+    self.assertEqual(norm(np.array([1.0]))[0], 0)
+
+
+  def test_charts_share_norm(self):
+    rng = np.random.default_rng(0)
+    charts = [
+      level_chart_charts.VerticalSlice(
+        x_values=np.arange(10),
+        y_values=np.arange(5),
+        z_values=rng.uniform(0, 10, (5, 10)),
+        vmin=0,
+        vmax=10,
+        lon_interval=[0, 10],
+        lat_interval=[0, 5],
+        title=f'Frame {i}',
+        z_label='Temperature',
+        y_label='Depth',
+        build_on_create=False)
+      for i in range(2)]
+    norms = []
+    for chart in charts:
+      chart.ensure_built()
+      norms.append(chart._fig.axes[0].collections[0].norm)
+    self.assertIs(norms[0], norms[1])
+    self.assertIs(norms[0], resources.get_norm(0, 10))
+    self.assertEqual((norms[0].vmin, norms[0].vmax), (0, 10))
+    for chart in charts:
+      chart.close()
+    # Colorbars adjust equal limits, so those are not shared.
+    self.assertIsNot(resources.get_norm(5, 5), resources.get_norm(5, 5))
+
+
+  def test_colorbar_image(self):
+    img = resources.get_colorbar_image(color_palette='plasma', vmin=0, vmax=10, label='Temperature', dpi=50)
+    self.assertIs(img, resources.get_colorbar_image(color_palette='plasma', vmin=0, vmax=10, label='Temperature', dpi=50))
+    self.assertEqual(Image.open(io.BytesIO(img)).format, 'PNG')
+
+
+  def test_windrose_default_palette(self):
+    rng = np.random.default_rng(0)
+    chart = level_chart_charts.WindRose(
+      speed=rng.uniform(0, 2, 100),
+      direction=rng.uniform(0, 360, 100),
+      title='Default palette',
+      bin_range=np.arange(0, 2, 0.5),
+      nsector=8,
+      color_palette=None)
+    self.assertGreater(len(chart.get_buffer().getvalue()), 0)
+    chart.close()
+
+
+class TestEncoders(unittest.TestCase):
+  def setUp(self) -> None:
+    rng = np.random.default_rng(0)
+    self.chart = level_chart_charts.WindRose(
+      speed=rng.uniform(0, 2, 100),
+      direction=rng.uniform(0, 360, 100),
+      title='Encoders',
+      bin_range=np.arange(0, 2, 0.5),
+      nsector=8)
+
+
+  def tearDown(self) -> None:
+    self.chart.close()
+
+
+  def test_formats(self):
+    self.assertEqual(self.chart.get_buffer('PNG').getvalue(), self.chart.get_buffer().getvalue())
+    for encoder, img_format in [('PNG_FAST', 'PNG'), ('WEBP', 'WEBP'), ('JPEG', 'JPEG')]:
+      self.assertEqual(Image.open(self.chart.get_buffer(encoder)).format, img_format)
+    with self.assertRaises(RuntimeError):
+      self.chart.get_buffer('BMP_FAST')
+
+
+  def test_save(self):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      webp_path = pathlib.Path(tmp_dir, 'chart.webp')
+      self.chart.save(webp_path, encoder=encoders.webp_encoder(quality=50))
+      self.assertEqual(Image.open(webp_path).format, 'WEBP')
+      # Vector outputs ignore the encoder.
+      svg_path = pathlib.Path(tmp_dir, 'chart.svg')
+      self.chart.save(svg_path, encoder='JPEG')
+      self.assertTrue(svg_path.read_bytes().startswith(b'<?xml'))
+      # Rendered images are encoded again.
+      jpeg_path = pathlib.Path(tmp_dir, 'chart.jpg')
+      ChartImage(img_source=self.chart.get_buffer()).save(jpeg_path, encoder='JPEG')
+      self.assertEqual(Image.open(jpeg_path).format, 'JPEG')
+
+
+  def test_export(self):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      png_path = pathlib.Path(tmp_dir, 'chart.png')
+      svg_path = pathlib.Path(tmp_dir, 'chart.svg')
+      buffers = self.chart.export([
+        {'filepath': png_path},
+        {'encoder': 'WEBP'},
+        {'encoder': 'JPEG', 'max_size': (120, 120)},
+        {'filepath': svg_path}])
+      self.assertEqual(png_path.read_bytes(), buffers[0].getvalue())
+      self.assertTrue(svg_path.read_bytes().startswith(b'<?xml'))
+      # Same pixels as get_buffer.
+      reference = np.asarray(Image.open(self.chart.get_buffer()))
+      self.assertTrue(np.array_equal(np.asarray(Image.open(buffers[0])), reference))
+      self.assertEqual(Image.open(buffers[1]).format, 'WEBP')
+      thumbnail = Image.open(buffers[2])
+      self.assertEqual(thumbnail.format, 'JPEG')
+      self.assertLessEqual(max(thumbnail.size), 120)
+    with self.assertRaises(RuntimeError):
+      self.chart.export([{'filepath': 'chart.bmp'}])
+
+
+  def test_export_drawn_once(self):
+    # A figure inside its edges, cropped from one canvas draw.
+    fig = plt.figure(figsize=(4, 3), dpi=50)
+    fig.add_subplot(111).plot([0, 1, 2], [2, 0, 1])
+    canvas = fig.canvas
+    chart = base_chart.Chart(fig=fig)
+    try:
+      buffers = chart.export([{'encoder': 'PNG'}])
+      self.assertEqual(fig.dpi, 50)
+      self.assertIs(fig.canvas, canvas)
+      exported = np.asarray(Image.open(buffers[0]).convert('RGBA'), dtype=float)
+      reference = np.asarray(Image.open(chart.get_buffer()).convert('RGBA'), dtype=float)
+      self.assertEqual(exported.shape, reference.shape)
+      # Only antialiasing may differ.
+      self.assertLess(np.abs(exported - reference).mean(), 2)
+    finally:
+      chart.close()
+
+
+class TestRawImage(unittest.TestCase):
+  def setUp(self) -> None:
+    self.tmp_dir = tempfile.TemporaryDirectory()
+    self.gif_path = pathlib.Path(self.tmp_dir.name, 'animation.gif')
+    frames = [Image.new('RGB', (20, 20), color) for color in ['red', 'green', 'blue']]
+    frames[0].save(self.gif_path, format='GIF', append_images=frames[1:], save_all=True, duration=100)
+
+
+  def tearDown(self) -> None:
+    self.tmp_dir.cleanup()
+
+
+  def test_passthrough(self):
+    chart_image = ChartImage(img_source=self.gif_path, passthrough=True)
+    saved_path = pathlib.Path(self.tmp_dir.name, 'saved.gif')
+    chart_image.save(saved_path)
+    self.assertEqual(saved_path.read_bytes(), self.gif_path.read_bytes())
+    self.assertEqual(chart_image.get_buffer().getvalue(), self.gif_path.read_bytes())
+    self.assertEqual(chart_image.get_image().n_frames, 3)
+    chart_image.close()
+
+
+  def test_memory_mapped(self):
+    chart_image = ChartImage(img_source=self.gif_path, passthrough=True)
+    img_buff = chart_image.get_buffer()
+    self.assertIsInstance(img_buff, ReadOnlyBuffer)
+    image_copy = copy.copy(chart_image)
+    # PIL reads its own stream.
+    self.assertEqual(chart_image.get_image().n_frames, 3)
+    self.assertEqual(img_buff.tell(), 0)
+    # Buffers are owned by the caller and outlive the image.
+    img_buff.seek(3)
+    chart_image.close()
+    self.assertEqual(img_buff.read(), self.gif_path.read_bytes()[3:])
+    img_buff.close()
+    self.assertEqual(image_copy.get_buffer().getvalue(), self.gif_path.read_bytes())
+    image_copy.close()
+
+
+  def test_own_stream(self):
+    img_buff = io.BytesIO()
+    Image.new('RGB', (20, 20), 'red').save(img_buff, format='PNG')
+    img_buff.seek(5)
+    chart_image = ChartImage(img_source=img_buff)
+    self.assertEqual(chart_image.get_image().size, (20, 20))
+    chart_image.get_buffer(encoder='PNG_FAST')
+    self.assertEqual(img_buff.tell(), 5)
+    chart_image.close()
+
+
+  def test_reencoded(self):
+    # The default, files are decoded into a buffer of their own.
+    chart_image = ChartImage(img_source=self.gif_path)
+    self.assertIsInstance(chart_image.get_buffer(), io.BytesIO)
+    self.assertEqual(Image.open(chart_image.get_buffer()).format, 'GIF')
+    chart_image.close()
+
+
 class TestRestoreChartBuilders(ChartBuilderTestCase):
   def test_restore_chart_builder(self):
     print('\n--- Starting test for builder restoring (png). ---',
@@ -1,12 +1,30 @@
 # Standard
+import io
 import unittest
 import sys
+import threading
+import time
+import pickle
+import tempfile
 from pathlib import Path
+from concurrent.futures import CancelledError
 # Third party
 import xarray as xr
+import numpy as np
 # Own
-from siaplotlib.processing.parallelism import AsyncRunner
+from siaplotlib.processing.parallelism import AsyncRunner, BuildScheduler, preload_plotting_stack
+from siaplotlib.utils.exceptions import SchedulerQueueFullException
 from siaplotlib.processing import wrangling
+from siaplotlib.processing import computations
+from siaplotlib.processing import tiling
+from siaplotlib.utils.progress import ProgressTracker
+from siaplotlib.processing.caching import ChartCache, SubsetCache
+from siaplotlib.processing.fingerprint import fingerprint_dataset
+from siaplotlib.processing.stats_index import StatsIndex
+from siaplotlib.processing import aggregation
+from siaplotlib.processing.derived_fields import DerivedFieldStore
+from siaplotlib.utils.buffers import SpillableBuffer
+from siaplotlib.charts.raw_image import RawImage
 
 # Custom test dependencies
 from lib_utils.general_utils import DATA_DIR
@@ -109,6 +127,261 @@ class TestAsyncRunner(unittest.TestCase):
     self.assertTrue(self.async_process_ok)
 
 
+def split_text(text: str):
+  # Module level so it can be sent to worker processes.
+  return text.split(' ')
+
+
+  def test_async_runner_future(self):
+    async_runner = AsyncRunner(
+      sync_fn=self.sync_fn,
+      sync_fn_kwargs={'text': 'hello, world!'})
+    future = async_runner.run()
+    self.assertEqual(future.result(timeout=10), (['hello,', 'world!'], 2))
+    self.assertFalse(async_runner.still_working())
+
+
+  def test_async_runner_future_failure(self):
+    async_runner = AsyncRunner(
+      sync_fn=self.sync_fn,
+      sync_fn_kwargs={'text': None},
+      failure_callback=self.sync_fn_failure_callback)
+    future = async_runner.run()
+    self.assertIsInstance(future.exception(timeout=10), AttributeError)
+
+
+class TestBuildScheduler(unittest.TestCase):
+  def setUp(self) -> None:
+    self.release = threading.Event()
+
+
+  def blocking_fn(self, value):
+    self.release.wait(timeout=10)
+    return value
+
+
+  def run_in_order(self, scheduler: BuildScheduler, tasks: list[tuple[str, str, str]]) -> list[str]:
+    """
+    Submits (name, priority, submitter) tasks while the only worker is busy
+    and returns the names in the order they ran.
+    """
+    order = []
+    scheduler.submit(self.blocking_fn, {'value': None})
+    futures = [
+      scheduler.submit(lambda name: order.append(name), {'name': name}, priority=priority, submitter=submitter)
+      for name, priority, submitter in tasks]
+    self.release.set()
+    for f in futures:
+      f.result(timeout=10)
+    scheduler.shutdown()
+    return order
+
+
+  def test_results(self):
+    scheduler = BuildScheduler(max_workers=2)
+    futures = [scheduler.submit(self.blocking_fn, {'value': i}) for i in range(5)]
+    self.release.set()
+    self.assertEqual([f.result(timeout=10) for f in futures], list(range(5)))
+    scheduler.shutdown()
+
+
+  def test_queue_depth_and_reject(self):
+    scheduler = BuildScheduler(max_workers=1, max_queue_size=2, full_queue_policy='REJECT')
+    futures = [scheduler.submit(self.blocking_fn, {'value': i}) for i in range(3)]
+    self.assertEqual(scheduler.running_count(), 1)
+    self.assertEqual(scheduler.queue_depth(), 2)
+    with self.assertRaises(SchedulerQueueFullException):
+      scheduler.submit(self.blocking_fn, {'value': 3})
+    self.release.set()
+    for f in futures:
+      f.result(timeout=10)
+    self.assertEqual(scheduler.queue_depth(), 0)
+    scheduler.shutdown()
+
+
+  def test_cancelled_tasks_leave_the_queue(self):
+    scheduler = BuildScheduler(max_workers=1, max_queue_size=2, full_queue_policy='REJECT')
+    running_future = scheduler.submit(self.blocking_fn, {'value': 0})
+    queued_futures = [scheduler.submit(self.blocking_fn, {'value': i}) for i in [1, 2]]
+    for f in queued_futures:
+      self.assertTrue(f.cancel())
+    self.assertEqual(scheduler.queue_depth(), 0)
+    # Their places are free.
+    new_future = scheduler.submit(self.blocking_fn, {'value': 3})
+    self.assertEqual(scheduler.queue_depth(), 1)
+    self.release.set()
+    self.assertEqual(running_future.result(timeout=10), 0)
+    self.assertEqual(new_future.result(timeout=10), 3)
+    scheduler.shutdown()
+
+
+  def test_cancelled_tasks_unblock_submit(self):
+    scheduler = BuildScheduler(max_workers=1, max_queue_size=1, block_timeout=5)
+    scheduler.submit(self.blocking_fn, {'value': 0})
+    queued_future = scheduler.submit(self.blocking_fn, {'value': 1})
+    threading.Timer(0.1, queued_future.cancel).start()
+    start = time.monotonic()
+    new_future = scheduler.submit(self.blocking_fn, {'value': 2})
+    self.assertLess(time.monotonic() - start, 5)
+    self.release.set()
+    self.assertEqual(new_future.result(timeout=10), 2)
+    scheduler.shutdown()
+
+
+  def test_block_timeout(self):
+    scheduler = BuildScheduler(max_workers=1, max_queue_size=1, block_timeout=0.1)
+    scheduler.submit(self.blocking_fn, {'value': 0})
+    scheduler.submit(self.blocking_fn, {'value': 1})
+    with self.assertRaises(SchedulerQueueFullException):
+      scheduler.submit(self.blocking_fn, {'value': 2})
+    self.release.set()
+    scheduler.shutdown()
+
+
+  def test_priorities(self):
+    scheduler = BuildScheduler(max_workers=1)
+    order = self.run_in_order(scheduler, [
+      ('frame-1', 'LOW', 'batch'),
+      ('frame-2', 'LOW', 'batch'),
+      ('heatmap', 'HIGH', 'user'),
+      ('profile', 'NORMAL', 'user')])
+    self.assertEqual(order, ['heatmap', 'profile', 'frame-1', 'frame-2'])
+
+
+  def test_fair_sharing(self):
+    scheduler = BuildScheduler(max_workers=1)
+    order = self.run_in_order(scheduler, [
+      ('a-1', 'NORMAL', 'a'),
+      ('a-2', 'NORMAL', 'a'),
+      ('a-3', 'NORMAL', 'a'),
+      ('b-1', 'NORMAL', 'b')])
+    self.assertEqual(order, ['a-1', 'b-1', 'a-2', 'a-3'])
+
+
+  def test_aging(self):
+    order = []
+    scheduler = BuildScheduler(max_workers=1, aging_seconds=0.05)
+    scheduler.submit(self.blocking_fn, {'value': None})
+    low_future = scheduler.submit(lambda: order.append('frame'), priority='LOW')
+    time.sleep(0.2)
+    high_future = scheduler.submit(lambda: order.append('heatmap'), priority='HIGH')
+    self.release.set()
+    low_future.result(timeout=10)
+    high_future.result(timeout=10)
+    self.assertEqual(order, ['frame', 'heatmap'])
+    scheduler.shutdown()
+
+
+  def test_memory_budget(self):
+    lock = threading.Lock()
+    concurrency = {'current': 0, 'max': 0}
+    def tracked_fn():
+      with lock:
+        concurrency['current'] += 1
+        concurrency['max'] = max(concurrency['max'], concurrency['current'])
+      time.sleep(0.05)
+      with lock:
+        concurrency['current'] -= 1
+    scheduler = BuildScheduler(max_workers=3, memory_budget=100)
+    futures = [scheduler.submit(tracked_fn, memory_estimate=60) for _ in range(3)]
+    self.assertEqual(scheduler.reserved_memory(), 60)
+    self.assertEqual(scheduler.queue_depth(), 2)
+    # Above the budget, but it runs when nothing else does.
+    futures.append(scheduler.submit(tracked_fn, memory_estimate=500))
+    for f in futures:
+      f.result(timeout=10)
+    self.assertEqual(concurrency['max'], 1)
+    self.assertEqual(scheduler.reserved_memory(), 0)
+    scheduler.shutdown()
+
+
+  def test_memory_budget_smaller_tasks_go_ahead(self):
+    scheduler = BuildScheduler(max_workers=3, memory_budget=100)
+    running_future = scheduler.submit(self.blocking_fn, {'value': 'running'}, memory_estimate=80)
+    large_future = scheduler.submit(self.blocking_fn, {'value': 'large'}, memory_estimate=50)
+    small_future = scheduler.submit(lambda: 'small', memory_estimate=10)
+    self.assertEqual(small_future.result(timeout=10), 'small')
+    self.assertFalse(large_future.running())
+    self.release.set()
+    self.assertEqual(running_future.result(timeout=10), 'running')
+    self.assertEqual(large_future.result(timeout=10), 'large')
+    scheduler.shutdown()
+
+
+  def test_memory_budget_no_starvation(self):
+    scheduler = BuildScheduler(max_workers=3, memory_budget=100, aging_seconds=0.05)
+    running_future = scheduler.submit(self.blocking_fn, {'value': None}, memory_estimate=80)
+    large_future = scheduler.submit(lambda: 'large', memory_estimate=50)
+    time.sleep(0.1)
+    # The large task has waited for memory too long, nothing passes it.
+    small_future = scheduler.submit(lambda: 'small', memory_estimate=10)
+    time.sleep(0.1)
+    self.assertFalse(small_future.done())
+    self.release.set()
+    for f in [running_future, large_future, small_future]:
+      f.result(timeout=10)
+    scheduler.shutdown()
+
+
+  def test_failure(self):
+    scheduler = BuildScheduler(max_workers=1)
+    future = scheduler.submit(split_text, {'text': None})
+    self.assertIsInstance(future.exception(timeout=10), AttributeError)
+    scheduler.shutdown()
+
+
+  def test_task_cancelled_by_executor(self):
+    # The initializer keeps the worker busy, so the task is still pending in the executor.
+    scheduler = BuildScheduler(max_workers=1, initializer=time.sleep, initargs=(0.5,))
+    future = scheduler.submit(split_text, {'text': 'hello'})
+    scheduler._get_executor().shutdown(wait=False, cancel_futures=True)
+    with self.assertRaises(CancelledError):
+      future.result(timeout=10)
+    self.assertEqual(scheduler.running_count(), 0)
+
+
+  def test_process_workers(self):
+    scheduler = BuildScheduler(max_workers=2, worker_type='PROCESS')
+    future = scheduler.submit(split_text, {'text': 'hello, world!'})
+    self.assertEqual(future.result(timeout=60), ['hello,', 'world!'])
+    scheduler.shutdown()
+
+
+  def test_prestart_workers(self):
+    started_workers = []
+    scheduler = BuildScheduler(
+      max_workers=3,
+      initializer=lambda: started_workers.append(threading.current_thread().name))
+    scheduler.prestart_workers(timeout=10)
+    self.assertEqual(len(started_workers), 3)
+    scheduler.submit(split_text, {'text': 'hello'}).result(timeout=10)
+    self.assertEqual(len(started_workers), 3)
+    scheduler.shutdown()
+
+
+  def test_preload_failures_are_logged(self):
+    log_stream = io.StringIO()
+    # An extent with no latitudes cannot be loaded.
+    preload_plotting_stack(extents=[[0, 10]], log_stream=log_stream)
+    self.assertIn('could not be loaded', log_stream.getvalue())
+
+
+  def test_async_runner_with_scheduler(self):
+    results = []
+    scheduler = BuildScheduler(max_workers=1)
+    async_runner = AsyncRunner(
+      sync_fn=split_text,
+      sync_fn_kwargs={'text': 'hello, world!'},
+      success_callback=lambda *words: results.append(words),
+      failure_callback=lambda err: results.append(err),
+      scheduler=scheduler)
+    async_runner.run()
+    async_runner.wait()
+    self.assertFalse(async_runner.still_working())
+    self.assertEqual(results, [(['hello,', 'world!'],)])
+    scheduler.shutdown()
+
+
 class TestDatasetTransformations(unittest.TestCase):
   def test_compute_single_velocity(self):
     dataset_path = Path(DATA_DIR, DATASET_NAME_1)
@@ -129,5 +402,479 @@ class TestDatasetTransformations(unittest.TestCase):
     print(dataset, file=sys.stderr)
 
 
+class TestSubsetEstimation(unittest.TestCase):
+  def test_subset_sizes(self):
+    dataset = xr.Dataset(
+      {
+        'thetao': (('time', 'depth', 'latitude', 'longitude'), np.zeros((5, 4, 3, 2), dtype=np.float32)),
+        'zos': (('time', 'latitude', 'longitude'), np.zeros((5, 3, 2)))
+      },
+      coords={
+        'time': np.arange(5),
+        'depth': [0.5, 1.5, 2.5, 3.5],
+        'latitude': [10, 11, 12],
+        'longitude': [20, 21]
+      })
+    dim_constraints = {'time': slice(1, 3), 'depth': [0.5, 2.5]}
+    sizes = wrangling.get_subset_sizes(dataset=dataset, dim_constraints=dim_constraints)
+    self.assertEqual(sizes, {'time': 3, 'depth': 2, 'latitude': 3, 'longitude': 2})
+    self.assertEqual(
+      wrangling.estimate_subset_nbytes(dataset=dataset, dim_constraints=dim_constraints, var='thetao'),
+      wrangling.slice_dice(dataset=dataset, dim_constraints=dim_constraints, var='thetao').nbytes)
+    self.assertEqual(
+      wrangling.estimate_subset_nbytes(dataset=dataset, dim_constraints={'time': 0}),
+      4 * 3 * 2 * 4 + 3 * 2 * 8)
+
+
+class TestArrowThinning(unittest.TestCase):
+  def test_arrow_strides_fit_figure(self):
+    # 4x6 inches at 100 dpi with 50 px spacing: 8 columns and 12 rows at most.
+    y_stride, x_stride = computations.calc_arrow_strides(
+      grid_shape=(1200, 800),
+      figsize=(4, 6),
+      dpi=100,
+      min_arrow_spacing_px=50)
+    self.assertEqual((y_stride, x_stride), (100, 100))
+  
+
+  def test_arrow_strides_small_grid(self):
+    strides = computations.calc_arrow_strides(
+      grid_shape=(5, 5),
+      figsize=(4, 6),
+      dpi=300)
+    self.assertEqual(strides, (1, 1))
+
+
+  def test_arrow_strides_target_arrows(self):
+    y_stride, x_stride = computations.calc_arrow_strides(
+      grid_shape=(1000, 1000),
+      figsize=(4, 4),
+      dpi=300,
+      target_arrows=100)
+    self.assertLessEqual(np.ceil(1000 / y_stride) * np.ceil(1000 / x_stride), 100)
+
+
+  def test_block_average(self):
+    data = np.arange(20, dtype=float).reshape(4, 5)
+    data[0, 0] = np.nan
+    averaged = wrangling.block_average(data, 2, 2)
+    self.assertEqual(averaged.shape, (2, 3))
+    self.assertAlmostEqual(averaged[0, 0], np.mean([1, 5, 6]))
+    self.assertAlmostEqual(averaged[1, 2], np.mean([14, 19]))
+
+
+  def test_block_average_all_nan(self):
+    data = np.full((2, 2), np.nan)
+    averaged = wrangling.block_average(data, 2, 2)
+    self.assertTrue(np.isnan(averaged[0, 0]))
+
+
+class TestPathInterpolation(unittest.TestCase):
+  def test_path_points(self):
+    lat_points, lon_points, distance = computations.calc_path_points(
+      waypoints=[(0, 0), (0, 1), (1, 1)],
+      num_points=5)
+    self.assertEqual(len(lat_points), 5)
+    self.assertEqual((lat_points[0], lon_points[0]), (0, 0))
+    self.assertEqual((lat_points[-1], lon_points[-1]), (1, 1))
+    self.assertAlmostEqual(lat_points[2], 0, places=2)
+    self.assertAlmostEqual(lon_points[2], 1, places=2)
+    # Two segments of one degree, about 111 km each.
+    self.assertAlmostEqual(distance[-1], 222.4, delta=0.5)
+
+
+  def test_antimeridian(self):
+    lon = computations.unwrap_longitudes([170, -170, -160])
+    np.testing.assert_allclose(lon, [170, 190, 200])
+    np.testing.assert_allclose(computations.wrap_longitudes(lon, -180), [170, -170, -160])
+    np.testing.assert_allclose(computations.wrap_longitudes([-10, 350], 0), [350, 350])
+
+
+  def test_bilinear_interpolation(self):
+    lat = np.array([30., 20., 10.])
+    lon = np.array([0., 1., 2., 3.])
+    lon_grid, lat_grid = np.meshgrid(lon, lat)
+    # Linear fields are reproduced exactly by a bilinear interpolation.
+    field = np.stack([lat_grid + 2 * lon_grid, lat_grid - lon_grid])
+    lat_points = np.array([15., 25., 12.5])
+    lon_points = np.array([0.5, 2.25, 3.])
+    weights = computations.calc_bilinear_weights(lat, lon, lat_points, lon_points)
+    result = computations.bilinear_interpolate(field, *weights)
+    self.assertEqual(result.shape, (2, 3))
+    np.testing.assert_allclose(result[0], lat_points + 2 * lon_points)
+    np.testing.assert_allclose(result[1], lat_points - lon_points)
+
+
+  def test_bilinear_interpolation_nan_and_outside(self):
+    lat = np.array([0., 1.])
+    lon = np.array([0., 1.])
+    field = np.array([[1., np.nan], [1., 1.]])
+    weights = computations.calc_bilinear_weights(lat, lon, np.array([0.5, 5.]), np.array([0.5, 0.5]))
+    result = computations.bilinear_interpolate(field, *weights)
+    self.assertAlmostEqual(result[0], 1)
+    self.assertTrue(np.isnan(result[1]))
+
+
+class TestTiling(unittest.TestCase):
+  def test_tile_bounds(self):
+    lon_min, lat_min, lon_max, lat_max = tiling.tile_bounds(0, 0, 0)
+    self.assertEqual((lon_min, lon_max), (-180, 180))
+    self.assertAlmostEqual(lat_max, tiling.MAX_MERCATOR_LAT)
+    self.assertAlmostEqual(lat_min, -tiling.MAX_MERCATOR_LAT)
+    lon_min, lat_min, lon_max, lat_max = tiling.tile_bounds(1, 1, 0)
+    self.assertEqual((lon_min, lat_min, lon_max), (0, 0, 180))
+
+
+  def test_tiles_for_extent(self):
+    tiles = tiling.tiles_for_extent([-90, -80], [10, 30], 3)
+    self.assertEqual(tiles, [(3, 2, 3)])
+    self.assertEqual(len(tiling.tiles_for_extent([-180, 180], [-80, 80], 2)), 16)
+
+
+  def test_tile_pixel_coords(self):
+    lon_pixels, lat_pixels = tiling.tile_pixel_coords(1, 0, 0, tile_size=4)
+    np.testing.assert_allclose(lon_pixels, [-157.5, -112.5, -67.5, -22.5])
+    self.assertTrue(np.all(np.diff(lat_pixels) < 0))
+    self.assertTrue(np.all(lat_pixels > 0))
+
+
+  def test_nearest_indices(self):
+    idx, inside = tiling.nearest_indices(np.array([30., 20., 10.]), np.array([29., 16., 11., 50.]))
+    np.testing.assert_array_equal(idx, [0, 1, 2, 0])
+    np.testing.assert_array_equal(inside, [True, True, True, False])
+
+
+
+class TestProgressTracker(unittest.TestCase):
+  def test_parallel_advance(self):
+    reports = []
+    tracker = ProgressTracker(callback=reports.append)
+    tracker.start_stage('RENDERING_FRAMES', total=400)
+    def advance_many():
+      for _ in range(100):
+        tracker.advance()
+    threads = [threading.Thread(target=advance_many) for _ in range(4)]
+    for th in threads:
+      th.start()
+    for th in threads:
+      th.join()
+    progress = tracker.progress()
+    self.assertEqual(progress.done, 400)
+    self.assertEqual(progress.eta, 0)
+    self.assertEqual(len(reports), 401)
+
+
+  def test_throttling(self):
+    reports = []
+    tracker = ProgressTracker(callback=reports.append, min_interval=60)
+    tracker.start_stage('RENDERING_FRAMES', total=10)
+    for _ in range(10):
+      tracker.advance()
+    # The stage start and the last step.
+    self.assertEqual([report.done for report in reports], [0, 10])
+
+
+  def test_polling(self):
+    tracker = ProgressTracker()
+    tracker.start_stage('RENDERING_FRAMES', total=10)
+    tracker.advance(steps=5)
+    progress = tracker.progress()
+    self.assertEqual(progress.stage, 'RENDERING_FRAMES')
+    self.assertEqual(progress.done, 5)
+    self.assertIsNotNone(progress.eta)
+
+
+
+class TestChartCache(unittest.TestCase):
+  def test_memory_lru(self):
+    cache = ChartCache(memory_max_bytes=10)
+    cache.put('a', b'aaaa')
+    cache.put('b', b'bbbb')
+    cache.get('a')
+    cache.put('c', b'cccc')
+    self.assertEqual(cache.get('a'), b'aaaa')
+    self.assertIsNone(cache.get('b'))
+    self.assertEqual(cache.memory_usage(), 8)
+
+
+  def test_disk_tier(self):
+    with tempfile.TemporaryDirectory() as disk_dir:
+      cache = ChartCache(memory_max_bytes=0, disk_dir=disk_dir, disk_max_bytes=10)
+      cache.put('a', b'aaaa')
+      cache.put('b', b'bbbb')
+      cache.put('c', b'cccc')
+      # The oldest file is removed to stay within the size limit.
+      self.assertIsNone(cache.get('a'))
+      self.assertEqual(cache.get('c'), b'cccc')
+      # A copy sent to another process only keeps the disk tier.
+      worker_cache = pickle.loads(pickle.dumps(cache))
+      self.assertEqual(worker_cache.get('b'), b'bbbb')
+
+
+
+
+class TestFingerprint(unittest.TestCase):
+  def setUp(self) -> None:
+    rng = np.random.default_rng(0)
+    self.dataset = xr.Dataset(
+      {'thetao': (('time', 'latitude', 'longitude'), rng.normal(size=(4, 30, 200)))},
+      coords={'time': np.arange(4), 'latitude': np.arange(30), 'longitude': np.arange(200)})
+
+
+  def test_same_content(self):
+    self.assertEqual(
+      fingerprint_dataset(self.dataset),
+      fingerprint_dataset(self.dataset.copy(deep=True)))
+    self.assertEqual(
+      fingerprint_dataset(self.dataset['thetao']),
+      fingerprint_dataset(self.dataset['thetao'].copy(deep=True)))
+
+
+  def test_changes(self):
+    changed_coords = self.dataset.assign_coords(latitude=np.arange(30) + 0.5)
+    changed_encoding = self.dataset.copy(deep=True)
+    changed_encoding['thetao'].encoding['scale_factor'] = 0.1
+    for changed in [changed_coords, changed_encoding, self.dataset.rename({'thetao': 'so'})]:
+      self.assertNotEqual(fingerprint_dataset(self.dataset), fingerprint_dataset(changed))
+
+
+  def test_strict(self):
+    changed = self.dataset.copy(deep=True)
+    # Between the sampled blocks.
+    changed['thetao'][1, 10, 100] = 100
+    self.assertEqual(fingerprint_dataset(self.dataset), fingerprint_dataset(changed))
+    self.assertNotEqual(
+      fingerprint_dataset(self.dataset, strict=True),
+      fingerprint_dataset(changed, strict=True))
+    self.assertIsNone(fingerprint_dataset(object()))
+
+
+
+class TestSubsetCache(unittest.TestCase):
+  def setUp(self) -> None:
+    rng = np.random.default_rng(0)
+    self.dataset = xr.Dataset(
+      {
+        'thetao': (('time', 'depth', 'latitude'), rng.normal(size=(5, 4, 30))),
+        'so': (('time', 'depth', 'latitude'), rng.normal(size=(5, 4, 30)))
+      },
+      coords={'time': np.arange(5), 'depth': [0.5, 1.5, 2.5, 3.5], 'latitude': np.arange(30)})
+
+
+  def test_hit(self):
+    cache = SubsetCache()
+    dim_constraints = {'time': [2], 'depth': slice(1, 3)}
+    subset = wrangling.slice_dice(dataset=self.dataset, dim_constraints=dim_constraints, var='thetao', cache=cache)
+    cached_subset = wrangling.slice_dice(
+      dataset=self.dataset.copy(deep=True),
+      dim_constraints={'depth': slice(1, 3), 'time': [2]},
+      var='thetao',
+      cache=cache)
+    self.assertTrue(cached_subset.equals(subset))
+    self.assertTrue(np.shares_memory(cached_subset.values, subset.values))
+    self.assertEqual(cache.memory_usage(), subset.nbytes)
+    other_subset = wrangling.slice_dice(dataset=self.dataset, dim_constraints=dim_constraints, var='so', cache=cache)
+    self.assertFalse(np.shares_memory(other_subset.values, subset.values))
+
+
+  def test_bytes_bound(self):
+    subset_nbytes = 4 * 30 * 8
+    cache = SubsetCache(max_bytes=subset_nbytes * 2)
+    for time_index in range(3):
+      wrangling.slice_dice(dataset=self.dataset, dim_constraints={'time': [time_index]}, var='thetao', cache=cache)
+    self.assertEqual(cache.memory_usage(), subset_nbytes * 2)
+
+
+class TestStatsIndex(unittest.TestCase):
+  def setUp(self) -> None:
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(6, 3, 20, 30))
+    values[2, 1] = np.nan
+    values[4, :, :5] = np.nan
+    self.dataset = xr.Dataset(
+      {'thetao': (('time', 'depth', 'latitude', 'longitude'), values)},
+      coords={
+        'time': np.arange(6), 'depth': [0.5, 1.5, 2.5],
+        'latitude': np.arange(20), 'longitude': np.arange(30)})
+    self.map_dims = ['latitude', 'longitude']
+
+
+  def assert_matches_data(self, index: StatsIndex, dim_constraints: dict):
+    subset = wrangling.slice_dice(dataset=self.dataset, dim_constraints=dim_constraints, var='thetao')
+    stats = index.query(var_name='thetao', dim_constraints=dim_constraints)
+    self.assertTrue(stats['exact'])
+    self.assertAlmostEqual(stats['min'], float(subset.min()))
+    self.assertAlmostEqual(stats['max'], float(subset.max()))
+    self.assertAlmostEqual(stats['mean'], float(subset.mean()))
+    self.assertEqual(stats['count'], int(subset.count()))
+
+
+  def test_query(self):
+    index = StatsIndex.build(dataset=self.dataset, map_dims=self.map_dims)
+    for dim_constraints in [{}, {'time': slice(1, 4)}, {'time': [2], 'depth': [0.4]}, {'depth': slice(1, 3)}]:
+      self.assert_matches_data(index, dim_constraints)
+    self.assertIsNone(index.query(var_name='thetao', dim_constraints={'so': slice(0, 5)}))
+    self.assertEqual(index.query(var_name='thetao', dim_constraints={'time': [2], 'depth': [1.5]})['count'], 0)
+
+
+  def test_sidecar(self):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      path = Path(tmp_dir, 'data.nc.stats.npz')
+      index = StatsIndex.load_or_build(dataset=self.dataset, map_dims=self.map_dims, path=path)
+      self.assertTrue(path.exists())
+      loaded = StatsIndex.load_or_build(dataset=self.dataset, map_dims=self.map_dims, path=path)
+      self.assertEqual(loaded.dataset_fingerprint, index.dataset_fingerprint)
+      self.assert_matches_data(loaded, {'time': slice(1, 4), 'depth': [2.5]})
+      self.assert_matches_data(loaded, {'time': [1], 'latitude': slice(0, 40), 'longitude': slice(0, 31)})
+      # Rebuilt when the data changes.
+      changed = self.dataset.assign_coords(depth=[1.0, 2.0, 3.0])
+      rebuilt = StatsIndex.load_or_build(dataset=changed, map_dims=self.map_dims, path=path)
+      self.assertEqual(list(rebuilt.stats['thetao']['depth'].values), [1.0, 2.0, 3.0])
+
+
+  def test_map_blocks(self):
+    index = StatsIndex.build(dataset=self.dataset, map_dims=self.map_dims, block_size=8)
+    # Boxes made of whole blocks, the last ones smaller.
+    self.assert_matches_data(index, {'latitude': slice(0, 7), 'longitude': slice(8, 29)})
+    self.assert_matches_data(index, {'time': slice(3, 5), 'latitude': slice(16, 19)})
+    # Blocks cut by the box give bounds of its values.
+    dim_constraints = {'time': [4], 'latitude': slice(2, 12), 'longitude': slice(3, 20)}
+    subset = wrangling.slice_dice(dataset=self.dataset, dim_constraints=dim_constraints, var='thetao')
+    stats = index.query(var_name='thetao', dim_constraints=dim_constraints)
+    self.assertFalse(stats['exact'])
+    self.assertLessEqual(stats['min'], float(subset.min()))
+    self.assertGreaterEqual(stats['max'], float(subset.max()))
+    self.assertGreaterEqual(stats['count'], int(subset.count()))
+
+
+  def test_min_max(self):
+    index = StatsIndex.build(dataset=self.dataset, map_dims=self.map_dims)
+    dim_constraints = {'time': slice(0, 3)}
+    subset = wrangling.slice_dice(dataset=self.dataset, dim_constraints=dim_constraints, var='thetao')
+    expected = (aggregation.min(subset, rounding_precision=3), aggregation.max(subset, rounding_precision=3))
+    self.assertEqual(aggregation.min_max(
+      dataset=None,
+      rounding_precision=3,
+      stats_index=index,
+      var='thetao',
+      dim_constraints=dim_constraints), expected)
+    # Falls back to the data when the index cannot answer.
+    self.assertEqual(aggregation.min_max(
+      dataset=subset,
+      rounding_precision=3,
+      stats_index=index,
+      var='so',
+      dim_constraints=dim_constraints), expected)
+
+
+  def test_min_max_cut_blocks(self):
+    index = StatsIndex.build(dataset=self.dataset, map_dims=self.map_dims, block_size=8)
+    for dim_constraints in [
+      {'time': [4], 'latitude': slice(2, 12), 'longitude': slice(3, 20)},
+      {'time': slice(0, 3), 'latitude': slice(5, 18)},
+      {'time': [2], 'depth': [1.5], 'longitude': slice(1, 12)}]:
+      subset = wrangling.slice_dice(dataset=self.dataset, dim_constraints=dim_constraints, var='thetao')
+      self.assertFalse(index.query(var_name='thetao', dim_constraints=dim_constraints)['exact'])
+      vmin, vmax = aggregation.min_max(
+        dataset=subset,
+        stats_index=index,
+        var='thetao',
+        dim_constraints=dim_constraints)
+      # Same as a scan of the box.
+      np.testing.assert_equal((vmin, vmax), (float(subset.min()), float(subset.max())))
+
+
+class TestDerivedFieldStore(unittest.TestCase):
+  def setUp(self) -> None:
+    rng = np.random.default_rng(0)
+    shape = (3, 2, 10, 12)
+    self.dataset = xr.Dataset(
+      {
+        'uo': (('time', 'depth', 'latitude', 'longitude'), rng.normal(size=shape)),
+        'vo': (('time', 'depth', 'latitude', 'longitude'), rng.normal(size=shape))
+      },
+      coords={
+        'time': np.arange(3), 'depth': [0.5, 1.5],
+        'latitude': np.arange(10), 'longitude': np.arange(12)})
+    self.tmp_dir = tempfile.TemporaryDirectory()
+    self.store = DerivedFieldStore(root_dir=self.tmp_dir.name)
+
+
+  def tearDown(self) -> None:
+    self.tmp_dir.cleanup()
+
+
+  def test_matches_computations(self):
+    dim_constraints = {'time': [1], 'depth': [0.5]}
+    subset = wrangling.slice_dice(dataset=self.dataset, dim_constraints=dim_constraints)
+    speed = self.store.get_subset(self.dataset, 'uo', 'vo', 'SPEED', dim_constraints)
+    direction = self.store.get_subset(self.dataset, 'uo', 'vo', 'DIRECTION', dim_constraints)
+    np.testing.assert_array_equal(speed, computations.calc_spd(subset, 'uo', 'vo'))
+    np.testing.assert_array_equal(direction, computations.calc_dir(subset, 'uo', 'vo'))
+    with_store = wrangling.calc_unique_velocity(self.dataset.copy(), 'uo', 'vo', 'speed', store=self.store)
+    without_store = wrangling.calc_unique_velocity(self.dataset.copy(), 'uo', 'vo', 'speed')
+    np.testing.assert_array_equal(with_store['speed'].values, without_store['speed'].values)
+
+
+  def test_persisted(self):
+    self.dataset.encoding['source'] = str(Path(self.tmp_dir.name, 'data.nc'))
+    field = self.store.get_field(self.dataset, 'uo', 'vo', 'SPEED')
+    self.assertIsInstance(field.data, np.memmap)
+    paths = list(Path(self.tmp_dir.name).glob('*.npy'))
+    self.assertEqual(len(paths), 1)
+    mtime = paths[0].stat().st_mtime_ns
+    store = pickle.loads(pickle.dumps(self.store))
+    store.get_field(self.dataset.copy(deep=True), 'uo', 'vo', 'SPEED')
+    self.assertEqual(paths[0].stat().st_mtime_ns, mtime)
+    # Changed data replaces the stale entry.
+    changed = self.dataset.assign_coords(depth=[1.0, 2.0])
+    store.get_field(changed, 'uo', 'vo', 'SPEED')
+    new_paths = list(Path(self.tmp_dir.name).glob('*.npy'))
+    self.assertEqual(len(new_paths), 1)
+    self.assertNotEqual(new_paths, paths)
+
+
+  def test_in_memory_datasets_kept_apart(self):
+    other = self.dataset.assign_coords(depth=[1.0, 2.0])
+    self.store.get_field(self.dataset, 'uo', 'vo', 'SPEED')
+    self.store.get_field(other, 'uo', 'vo', 'SPEED')
+    self.assertEqual(len(list(Path(self.tmp_dir.name).glob('*.npy'))), 2)
+
+
+  def test_empty_first_dimension(self):
+    empty = self.dataset.isel(time=slice(0, 0))
+    field = self.store.get_field(empty, 'uo', 'vo', 'SPEED')
+    self.assertEqual(field.shape, (0, 2, 10, 12))
+
+
+class TestSpillableBuffer(unittest.TestCase):
+  def test_in_memory(self):
+    buff = SpillableBuffer(spill_threshold=1024)
+    buff.write(b'a' * 1000)
+    self.assertFalse(buff.is_spilled())
+    self.assertEqual(buff.getvalue(), b'a' * 1000)
+    buff.close()
+
+
+  def test_spill(self):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      buff = SpillableBuffer(spill_threshold=1024, spill_dir=tmp_dir)
+      buff.write(b'a' * 1000)
+      buff.write(b'b' * 1000)
+      self.assertTrue(buff.is_spilled())
+      self.assertEqual(len(list(Path(tmp_dir).iterdir())), 1)
+      self.assertEqual(buff.getbuffer()[998:1002].tobytes(), b'aabb')
+      buff.seek(0)
+      self.assertEqual(buff.read(3), b'aaa')
+      copy = pickle.loads(pickle.dumps(buff))
+      self.assertEqual(copy.getvalue(), buff.getvalue())
+      dest_path = Path(tmp_dir, 'copy.bin')
+      RawImage(img_source=buff).save(dest_path)
+      self.assertEqual(dest_path.read_bytes(), b'a' * 1000 + b'b' * 1000)
+      copy.close()
+      buff.close()
+      self.assertEqual(list(Path(tmp_dir).iterdir()), [dest_path])
+
+
 if __name__ == '__main__':
   unittest.main()